@@ -0,0 +1,391 @@
+# benchmarks/chat_loadtest.py
+"""
+Load generator for the chat API, driven by `python manage.py loadtest`.
+
+Virtual users log in through /login/api/ (FixHR login against the stub,
+benchmarks/fixhr_stub.py) and send a weighted mix of chat messages:
+
+    leave        apply leave, leave balance, my leaves, pending approvals
+    gatepass     apply gatepass, my gatepasses, pending approvals
+    missed_punch apply missed punch, my missed punches, pending approvals
+    attendance   attendance reports
+    faq          holidays, privacy policy, small talk
+
+Apply/report texts come from core/dataset; list and FAQ texts are fixed
+phrases. Two load shapes:
+
+  closed loop : --concurrency workers, each sends its next message as soon
+                as the last one is answered;
+  open loop   : --rate messages/second with Poisson arrivals. Latency is
+                measured from the scheduled arrival, so a backed-up server
+                shows up as latency rather than as a slower send rate.
+
+Requests go through the whole Django stack: in-process via the test Client
+(middleware, sessions, views, DB; on a temporary database and chat
+history, see isolate_state), or over HTTP to a running server with
+--target. Each reply's Server-Timing header (core/stage_timing.py) gives
+the per-stage breakdown.
+"""
+
+import json
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.inference_bench import percentile
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATASET_DIR = ROOT_DIR / "core" / "dataset"
+
+# category -> [(intent, dataset file or fixed phrases)]
+MIX = {
+    "leave": [
+        ("apply_leave", "apply_leave.json"),
+        ("leave_balance", "leave_balance.json"),
+        ("my_leaves", ["show my leaves", "my leave requests this month", "show my approved leaves"]),
+        ("pending_leave", ["show pending leave requests", "pending leave approvals"]),
+    ],
+    "gatepass": [
+        ("apply_gatepass", "gatepass_apply.json"),
+        ("my_gatepass", ["show my gatepasses", "my gatepass requests this month"]),
+        ("pending_gatepass", ["show pending gatepass requests", "gatepass approvals pending"]),
+    ],
+    "missed_punch": [
+        ("apply_missed_punch", "missed_punch.json"),
+        ("my_missed_punch", ["show my missed punch requests", "my pending missed punch"]),
+        ("pending_missed_punch", ["show pending missed punch requests"]),
+    ],
+    "attendance": [
+        ("attendance_report", "attendance_report.json"),
+    ],
+    "faq": [
+        ("holiday_list", "holiday_list.json"),
+        ("privacy_policy", "privacy_policy.json"),
+        ("general", ["hello", "how are you", "what can you do", "thank you"]),
+    ],
+}
+DEFAULT_WEIGHTS = {"leave": 30, "gatepass": 15, "missed_punch": 15, "attendance": 25, "faq": 15}
+STAGES = ("intent", "datetime", "chat_model", "fixhr", "db")
+DEGRADED_PREFIXES = ("⚠️", "❌")
+
+Message = namedtuple("Message", "category intent text")
+Result = namedtuple("Result", "category intent latency status error degraded reply_type stages")
+
+
+def parse_weights(text):
+    """"leave=3,faq=1" -> {"leave": 3.0, "faq": 1.0}; unknown categories raise ValueError."""
+    if not text:
+        return dict(DEFAULT_WEIGHTS)
+    weights = {}
+    for item in text.split(","):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in MIX:
+            raise ValueError(f"Unknown category {name!r}, expected one of {', '.join(MIX)}")
+        weights[name] = float(value or 1)
+    return weights
+
+
+class MessageMix:
+    def __init__(self, weights, per_intent=200, seed=11):
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.categories = [c for c, w in weights.items() if w > 0]
+        self.weights = [weights[c] for c in self.categories]
+        self.texts = {}
+        for category in self.categories:
+            for intent, source in MIX[category]:
+                self.texts[(category, intent)] = self._texts(source, per_intent)
+
+    @staticmethod
+    def _texts(source, limit):
+        if not isinstance(source, str):
+            return list(source)
+        with open(DATASET_DIR / source, "r", encoding="utf-8") as f:
+            return [item["text"] for item in json.load(f) if item.get("text")][:limit]
+
+    def labels(self):
+        """text -> intent, for the oracle classifier."""
+        return {text: intent for (_, intent), texts in self.texts.items() for text in texts}
+
+    def pick(self):
+        with self._lock:
+            category = self.rng.choices(self.categories, weights=self.weights)[0]
+            intent = self.rng.choice([intent for intent, _ in MIX[category]])
+            return Message(category, intent, self.rng.choice(self.texts[(category, intent)]))
+
+
+def isolate_state(state_dir=None):
+    """
+    Give an in-process run throwaway state: a freshly migrated SQLite
+    database and a chat history file in `state_dir` (a new temporary
+    directory by default), so sessions, stored requests and general-chat
+    transcripts never land in db.sqlite3 or core/chat_history.json.
+    Call before the first request; returns the directory.
+    """
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+
+    state_dir = state_dir or tempfile.mkdtemp(prefix="fixhr_loadtest_")
+    history_file = os.path.join(state_dir, "chat_history.json")
+    os.environ["FIXHR_CHAT_HISTORY_FILE"] = history_file
+    if "core.model_inference2" in sys.modules:
+        sys.modules["core.model_inference2"].HISTORY_FILE = history_file
+
+    connections.close_all()
+    settings.DATABASES["default"]["NAME"] = os.path.join(state_dir, "db.sqlite3")
+    # skip_checks: the URL check would import core.views (and load Phi-3) before the classifier is chosen
+    call_command("migrate", verbosity=0, interactive=False, skip_checks=True)
+    return state_dir
+
+
+def use_oracle_classifier(labels, model_dir=None):
+    """
+    Skip the Phi-3 intent model: intent_model_call answers from the mix's
+    labels, so runs measure routing, FixHR and the DB without a GPU.
+    Only for in-process runs.
+
+    core.views loads both Phi-3 checkpoints when it is imported, so unless
+    FIXHR_INTENT_MODEL_DIR / FIXHR_CHAT_MODEL_DIR are already set they are
+    pointed at the tiny stand-in checkpoint (benchmarks/tiny_phi3.py, built
+    in `model_dir` on first use). General-chat replies then come from that
+    random model: their chat_model stage is not representative.
+    """
+    if "core.views" not in sys.modules and not (
+        os.environ.get("FIXHR_INTENT_MODEL_DIR") and os.environ.get("FIXHR_CHAT_MODEL_DIR")
+    ):
+        from benchmarks.tiny_phi3 import build_tiny_phi3
+
+        tiny_dir = build_tiny_phi3(model_dir or os.path.join(tempfile.gettempdir(), "fixhr_tiny_phi3"))
+        os.environ.setdefault("FIXHR_INTENT_MODEL_DIR", tiny_dir)
+        os.environ.setdefault("FIXHR_CHAT_MODEL_DIR", tiny_dir)
+
+    from core import views
+
+    def oracle(message):
+        return labels.get(message, "general"), 1.0, "", "", "", "", "", {}
+
+    views.intent_model_call = oracle
+
+
+def _reply_fields(body):
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return None, False
+    if not isinstance(data, dict):
+        return None, False
+    reply = data.get("reply")
+    degraded = isinstance(reply, str) and reply.strip().startswith(DEGRADED_PREFIXES)
+    return data.get("reply_type"), degraded
+
+
+class InProcessUser:
+    """One virtual user on django.test.Client: the real middleware/URL/view stack, no sockets."""
+
+    def __init__(self, email, password="loadtest"):
+        from django.test import Client
+
+        self.email = email
+        self.password = password
+        self.client = Client(HTTP_HOST="127.0.0.1")
+
+    def login(self):
+        r = self.client.post("/login/api/", json.dumps({"email": self.email, "password": self.password}),
+                             content_type="application/json")
+        return r.status_code, r.headers.get("Server-Timing"), r.content
+
+    def chat(self, path, text):
+        r = self.client.post(path, json.dumps({"message": text}), content_type="application/json")
+        return r.status_code, r.headers.get("Server-Timing"), r.content
+
+
+class HttpUser:
+    """One virtual user against a running server (--target), with its own cookies and CSRF token."""
+
+    def __init__(self, base_url, email, password="loadtest", timeout=120):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def login(self):
+        self.session.get(f"{self.base_url}/login/", timeout=self.timeout)
+        r = self.session.post(
+            f"{self.base_url}/login/api/",
+            json={"email": self.email, "password": self.password},
+            headers={"X-CSRFToken": self.session.cookies.get("csrftoken", ""), "Referer": f"{self.base_url}/login/"},
+            timeout=self.timeout,
+        )
+        return r.status_code, r.headers.get("Server-Timing"), r.content
+
+    def chat(self, path, text):
+        r = self.session.post(f"{self.base_url}{path}", json={"message": text}, timeout=self.timeout)
+        return r.status_code, r.headers.get("Server-Timing"), r.content
+
+
+class LoadTest:
+    def __init__(self, users, mix, path="/api/chat/"):
+        self.users = users
+        self.mix = mix
+        self.path = path
+        self.results = []
+        self.login_results = []
+        self._lock = threading.Lock()
+
+    def _record(self, results, message, started, call):
+        from core.stage_timing import parse_header
+
+        try:
+            status, timing, body = call()
+        except Exception:
+            latency = time.perf_counter() - started
+            result = Result(message.category, message.intent, latency, None, True, False, None, {})
+        else:
+            latency = time.perf_counter() - started
+            reply_type, degraded = _reply_fields(body)
+            result = Result(message.category, message.intent, latency, status, status >= 400, degraded, reply_type,
+                            parse_header(timing))
+        with self._lock:
+            results.append(result)
+
+    def login_all(self, concurrency):
+        login = Message("login", "login", "")
+
+        def run(user):
+            self._record(self.login_results, login, time.perf_counter(), user.login)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            list(pool.map(run, self.users))
+
+    def warmup(self, messages):
+        """Send `messages` unrecorded messages first (lazy imports, caches, first DB connections)."""
+        for i in range(messages):
+            self._send(self.users[i % len(self.users)], time.perf_counter())
+        with self._lock:
+            self.results.clear()
+
+    def _send(self, user, started):
+        message = self.mix.pick()
+        self._record(self.results, message, started, lambda: user.chat(self.path, message.text))
+
+    def run_closed(self, concurrency, messages, duration=None):
+        """`concurrency` workers, each owning a slice of the users, until `messages` are sent or `duration` ends."""
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = [messages]
+        counter_lock = threading.Lock()
+
+        def take():
+            with counter_lock:
+                if remaining[0] <= 0 or (deadline and time.perf_counter() >= deadline):
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def worker(index):
+            mine = self.users[index::concurrency] or [self.users[index % len(self.users)]]
+            turn = 0
+            while take():
+                self._send(mine[turn % len(mine)], time.perf_counter())
+                turn += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        return time.perf_counter() - start
+
+    def run_open(self, rate, messages, duration=None, max_workers=64, seed=13):
+        """Poisson arrivals at `rate`/s; each arrival waits for an idle user and a worker."""
+        rng = random.Random(seed)
+        idle = queue.Queue()
+        for user in self.users:
+            idle.put(user)
+
+        def arrival(scheduled):
+            user = idle.get()
+            try:
+                self._send(user, scheduled)
+            finally:
+                idle.put(user)
+
+        start = time.perf_counter()
+        deadline = start + duration if duration else None
+        next_at = start
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for _ in range(messages):
+                next_at += rng.expovariate(rate)
+                if deadline and next_at >= deadline:
+                    break
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(arrival, next_at)
+        return time.perf_counter() - start
+
+
+def _row(name, results, wall=None):
+    latencies = [r.latency for r in results]
+    errors = sum(r.error for r in results)
+    row = {
+        "name": name,
+        "requests": len(results),
+        "errors": errors,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "degraded": sum(r.degraded for r in results),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "stages_ms": {},
+    }
+    timed = [r.stages for r in results if r.stages]
+    if timed:
+        means = {s: sum(t.get(s, 0.0) for t in timed) / len(timed) for s in STAGES}
+        total = sum(t.get("total", 0.0) for t in timed) / len(timed)
+        means["other"] = max(0.0, total - sum(means.values()))
+        means["server"] = total
+        row["stages_ms"] = {k: round(v, 1) for k, v in means.items()}
+    if wall:
+        row["throughput_rps"] = round(len(results) / wall, 2)
+    return row
+
+
+def summarize(test, wall):
+    results = test.results
+    by_category = defaultdict(list)
+    by_intent = defaultdict(list)
+    for r in results:
+        by_category[r.category].append(r)
+        by_intent[(r.category, r.intent)].append(r)
+    return {
+        "wall_seconds": round(wall, 2),
+        "overall": _row("all", results, wall),
+        "login": _row("login", test.login_results),
+        "categories": [_row(c, rs) for c, rs in sorted(by_category.items())],
+        "intents": [_row(f"{c}/{i}", rs) for (c, i), rs in sorted(by_intent.items())],
+        "reply_types": dict(Counter(r.reply_type or "-" for r in results)),
+    }
+
+
+def format_table(rows):
+    header = (f"{'name':<34} {'req':>5} {'err%':>6} {'degr':>5} {'p50':>8} {'p95':>8} {'p99':>8}"
+              + "".join(f" {s:>10}" for s in (*STAGES, "other")))
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        stages = row["stages_ms"]
+        lines.append(
+            f"{row['name']:<34} {row['requests']:>5} {row['error_rate'] * 100:>5.1f}% {row['degraded']:>5}"
+            f" {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8}"
+            + "".join(f" {stages.get(s, '-'):>10}" for s in (*STAGES, "other"))
+        )
+    return "\n".join(lines)
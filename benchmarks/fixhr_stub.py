@@ -0,0 +1,502 @@
+# benchmarks/fixhr_stub.py
+"""
+Offline stand-in for the FixHR API, so load tests and benchmarks never hit
+dev.fixhr.app.
+
+Routes come from core.fixhr_client.ENDPOINTS (same paths and methods as
+the real client), answered one of three ways:
+
+  synthetic : deterministic data generated from --seed at the requested
+              size (--employees, --requests, --team-size). Applies and
+              approvals change it, so reads after writes look real.
+  replay    : responses recorded earlier (--replay DIR), matched on
+              endpoint and query, else the endpoint's first recording.
+  record    : proxy to --upstream and save every response to DIR.
+
+Every request can be slowed or broken on purpose: --latency-ms with
+--jitter-ms (per endpoint with --endpoint-latency attendance=400),
+--error-rate (HTTP 500/503), --timeout-rate (hangs for --timeout-seconds,
+longer than the client's read timeout). Faults use a seeded RNG.
+
+Usage (from the repo root):
+    python manage.py fixhr_stub --port 8765 --employees 500 --latency-ms 80 --jitter-ms 30
+    FIXHR_BASE_URL=http://127.0.0.1:8765 python manage.py runserver
+
+Logins: any password. The email picks the employee and role: "emp17@..."
+is employee 17, "manager" or "admin" in the address gives that role.
+
+GET /__stub__/stats returns request and fault counts per endpoint;
+POST /__stub__/reset clears them and regenerates the synthetic data.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from calendar import monthrange
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from core.fixhr_client import ENDPOINTS
+
+FIRST_NAMES = ["Aarav", "Priya", "Rohit", "Sneha", "Vikram", "Anjali", "Karan", "Neha", "Arjun", "Pooja",
+               "Rahul", "Divya", "Amit", "Kavya", "Suresh", "Meera"]
+LAST_NAMES = ["Sharma", "Verma", "Gupta", "Singh", "Patel", "Iyer", "Reddy", "Nair", "Joshi", "Mehta"]
+LEAVE_CATEGORIES = ["CL", "SL", "EL"]
+STATUS_COLORS = {"Requested": "#f0ad4e", "Approved": "#5cb85c", "Rejected": "#d9534f"}
+PROTECTED = {"login"}
+
+
+class Faults:
+    """Injected latency and failures. All rates are probabilities per request."""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, timeout_rate=0.0, timeout_seconds=30.0,
+                 endpoint_latency=None, seed=7):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.endpoint_latency = endpoint_latency or {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self, name):
+        """(delay seconds, fault) for one request; fault is None, "error" or "timeout"."""
+        with self._lock:
+            base = self.endpoint_latency.get(name, self.latency_ms)
+            delay = max(0.0, self._rng.gauss(base, self.jitter_ms)) / 1000 if base or self.jitter_ms else 0.0
+            roll = self._rng.random()
+        if name in PROTECTED:
+            return delay, None
+        if roll < self.timeout_rate:
+            return self.timeout_seconds, "timeout"
+        if roll < self.timeout_rate + self.error_rate:
+            return delay, "error"
+        return delay, None
+
+    def error_status(self):
+        with self._lock:
+            return self._rng.choice((500, 503))
+
+
+def _page(rows, query, rows_key="data"):
+    """Laravel-style page of `rows` for the page/limit query params."""
+    limit = max(int(query.get("limit") or 50), 1)
+    page = max(int(query.get("page") or 1), 1)
+    last_page = max((len(rows) + limit - 1) // limit, 1)
+    return {
+        "status": True,
+        "result": {
+            rows_key: rows[(page - 1) * limit:page * limit],
+            "current_page": page,
+            "per_page": limit,
+            "total": len(rows),
+            "last_page": last_page,
+        },
+    }
+
+
+def _status(name):
+    return [{"name": name, "other": [{"color": STATUS_COLORS.get(name, "#777777")}]}]
+
+
+def _fmt(day):
+    return day.strftime("%d %b, %Y")
+
+
+class SyntheticFixHR:
+    """Deterministic fake FixHR data: employees, their requests, attendance, balances and holidays."""
+
+    def __init__(self, employees=200, requests=6, team_size=25, seed=7, today=None):
+        self.size = employees
+        self.requests_per_employee = requests
+        self.team_size = team_size
+        self.seed = seed
+        self.today = today or date.today()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.employees = {emp_id: self._employee(emp_id) for emp_id in range(1, self.size + 1)}
+            self.requests = {"leave": {}, "gatepass": {}, "missed_punch": {}}
+            self._next_id = {"leave": 10_000, "gatepass": 20_000, "missed_punch": 30_000}
+            for emp_id in self.employees:
+                self._seed_requests(emp_id)
+
+    # ---------------- people ----------------
+    def _employee(self, emp_id):
+        rng = random.Random(self.seed * 100_003 + emp_id)
+        return {
+            "emp_id": emp_id,
+            "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "email": f"emp{emp_id}@stub.fixhr",
+            "business_id": 1,
+            "branch_id": 1 + emp_id % 3,
+            "emp_d_id": 500_000 + emp_id,
+        }
+
+    def employee_for_email(self, email):
+        match = re.search(r"(\d+)", email or "")
+        if match:
+            emp_id = (int(match.group(1)) - 1) % self.size + 1
+        else:
+            emp_id = int(hashlib.md5((email or "").encode()).hexdigest(), 16) % self.size + 1
+        return self.employees[emp_id]
+
+    def login(self, form):
+        email = (form.get("email") or "").lower()
+        emp = self.employee_for_email(email)
+        role = "Admin" if "admin" in email else "Manager" if "manager" in email else "Employee"
+        token = f"stub-{emp['emp_id']}-{role.lower()}"
+        return {
+            "success": True,
+            "data": {
+                "token": token,
+                "user": {**emp, "role": {"role_name": role, "role_id": {"Admin": 1, "Manager": 2}.get(role, 3)}},
+            },
+        }
+
+    @staticmethod
+    def caller(token):
+        """(emp_id, role) from a stub token; (None, None) when it is not one of ours."""
+        match = re.match(r"stub-(\d+)-(\w+)", token or "")
+        return (int(match.group(1)), match.group(2)) if match else (None, None)
+
+    def team(self, emp_id, role):
+        """Employees `emp_id` can see: everyone for admins, self plus the next team_size for managers."""
+        if role == "admin":
+            return list(self.employees)
+        if role == "manager":
+            return [e for e in range(emp_id, emp_id + 1 + self.team_size) if e in self.employees]
+        return []
+
+    # ---------------- requests ----------------
+    def _seed_requests(self, emp_id):
+        rng = random.Random(self.seed * 7_919 + emp_id)
+        for _ in range(self.requests_per_employee):
+            kind = rng.choice(("leave", "gatepass", "missed_punch"))
+            day = self.today - timedelta(days=rng.randint(-10, 60))
+            status = rng.choice(("Requested", "Requested", "Approved", "Rejected"))
+            self._add(kind, emp_id, day, status, rng)
+
+    def _add(self, kind, emp_id, day, status="Requested", rng=None, fields=None):
+        rng = rng or random.Random()
+        emp = self.employees[emp_id]
+        request_id = self._next_id[kind]
+        self._next_id[kind] += 1
+        common = {"emp_id": emp_id, "emp_name": emp["name"], "emp_d_id": emp["emp_d_id"]}
+        if kind == "leave":
+            days = rng.randint(0, 2)
+            row = {**common, "leave_id": request_id, "start_date": _fmt(day), "end_date": _fmt(day + timedelta(days=days)),
+                   "reason": rng.choice(["Family function", "Fever", "Personal work", "Travel"]),
+                   "leave_status": _status(status), "leave_am_id": 11, "leave_module_id": 3,
+                   "leave_category": [{"category": {"name": rng.choice(LEAVE_CATEGORIES)}}]}
+        elif kind == "gatepass":
+            hour = rng.randint(10, 16)
+            row = {**common, "id": request_id, "date": _fmt(day), "out_time": f"{hour:02d}:00",
+                   "in_time": f"{hour + 1:02d}:00", "reason": rng.choice(["Bank", "Doctor", "Client visit"]),
+                   "destination": "Office", "status": _status(status), "am_id": 12, "module_id": 4}
+        else:
+            row = {**common, "id": request_id, "date": day.isoformat(), "in_time": "09:30", "out_time": "18:30",
+                   "custom_reason": "", "reason": [{"name": "Forgot to punch"}], "type_id": [{"name": "Both"}],
+                   "status": _status(status), "am_id": 13, "module_id": 5, "is_request_deletable": status == "Requested",
+                   "next_approver_details": {"approver_name": "Stub Manager", "message": ""}}
+        row.update(fields or {})
+        self.requests[kind][request_id] = row
+        return row
+
+    def _rows(self, kind, emp_ids, pending_only=False):
+        status_key = "leave_status" if kind == "leave" else "status"
+        with self._lock:
+            rows = [r for r in self.requests[kind].values() if r["emp_id"] in emp_ids
+                    and (not pending_only or r[status_key][0]["name"] == "Requested")]
+        return sorted(rows, key=lambda r: -(r.get("leave_id") or r.get("id")))
+
+    def apply(self, kind, emp_id, form):
+        from core.attendance_store import parse_day
+
+        day = parse_day(form.get("leave_start_date") or form.get("date")) or self.today
+        with self._lock:
+            if kind == "leave":
+                row = self._add(kind, emp_id, day, fields={
+                    "end_date": _fmt(parse_day(form.get("leave_end_date")) or day), "reason": form.get("reason", "")})
+            elif kind == "gatepass":
+                row = self._add(kind, emp_id, day, fields={k: form[k] for k in ("out_time", "in_time", "reason")
+                                                           if k in form})
+            else:
+                row = self._add(kind, emp_id, day, fields={"custom_reason": form.get("custom_reason", "")})
+        return {"status": True, "message": "Request submitted successfully", "result": {"id": row.get("leave_id") or row["id"]}}
+
+    def decide(self, form):
+        """approval_handler: approve or reject the request it names."""
+        request_id = form.get("data[request_id]")
+        kind = {"LEAVE_REQUEST_APPROVAL": "leave", "GATEPASS_REQUEST_APPROVAL": "gatepass",
+                "MISPUNCH_REQUEST_APPROVAL": "missed_punch"}.get(form.get("POST_TYPE"))
+        name = "Approved" if str(form.get("data[approval_type]")) == "1" else "Rejected"
+        with self._lock:
+            rows = self.requests.get(kind, {})
+            row = rows.get(int(request_id)) if str(request_id or "").isdigit() else None
+            if row is None and kind == "gatepass":
+                # gatepass approvals only send the md5 of the id
+                row = next((r for r in rows.values()
+                            if hashlib.md5(str(r["id"]).encode()).hexdigest() == form.get("data[gtp_id]")), None)
+            if row is None:
+                return {"status": False, "message": "Request not found"}
+            row["leave_status" if kind == "leave" else "status"] = _status(name)
+        return {"status": True, "message": f"Request {name.lower()} successfully"}
+
+    # ---------------- attendance, balances, holidays ----------------
+    def attendance(self, emp_ids, query):
+        year = int(query.get("year") or self.today.year)
+        month = int(query.get("month") or self.today.month)
+        first = date(year, month, 1)
+        last = date(year, month, monthrange(year, month)[1])
+        try:
+            first = max(first, date.fromisoformat(query["start_date"]))
+            last = min(last, date.fromisoformat(query["end_date"]))
+        except (KeyError, ValueError):
+            pass
+        last = min(last, self.today)
+
+        employees = []
+        for emp_id in emp_ids:
+            emp = self.employees[emp_id]
+            days = []
+            day = first
+            while day <= last:
+                rng = random.Random(hash((self.seed, emp_id, day.toordinal())))
+                if day.weekday() == 6:
+                    days.append({"date": day.isoformat(), "status": "WO"})
+                else:
+                    status = rng.choices(["P", "A", "L", "HD"], weights=[88, 4, 5, 3])[0]
+                    late = status == "P" and rng.random() < 0.12
+                    minute = rng.randint(31, 59) if late else rng.randint(0, 29)
+                    days.append({"date": day.isoformat(), "status": status,
+                                 "in_time": f"09:{minute:02d}" if status in ("P", "HD") else "",
+                                 "out_time": "18:30" if status == "P" else "14:00" if status == "HD" else "",
+                                 "work_hrs": "9:00" if status == "P" else "", "is_late": late})
+                day += timedelta(days=1)
+            employees.append({"emp_id": emp_id, "emp_name": emp["name"], "days": days})
+        return {"status": True, "result": {"data": employees}}
+
+    def leave_balance(self, emp_id):
+        rng = random.Random(self.seed * 31 + emp_id)
+        result = []
+        for name in LEAVE_CATEGORIES:
+            allotted = rng.choice([6, 8, 12])
+            taken = rng.randint(0, allotted)
+            result.append({"category_master_detail": [{"name": name, "description": f"{name} leave"}],
+                           "total_alloted_leave": allotted, "total_taken_leave": taken,
+                           "total_balance_remaining_leave": allotted - taken, "total_carried_forward": 0})
+        return {"status": True, "result": result}
+
+    def holidays(self):
+        year = self.today.year
+        fixed = [("New Year", 1, 1), ("Republic Day", 1, 26), ("Holi", 3, 14), ("Independence Day", 8, 15),
+                 ("Gandhi Jayanti", 10, 2), ("Diwali", 10, 20), ("Christmas", 12, 25)]
+        return {"status": True, "result": [
+            {"phl_name": name, "phl_start_date": _fmt(date(year, m, d)), "phl_end_date": _fmt(date(year, m, d))}
+            for name, m, d in fixed
+        ]}
+
+    # ---------------- routing ----------------
+    def handle(self, name, token, query, form):
+        """(status, body) for one call to endpoint `name`."""
+        if name == "login":
+            return 200, self.login(form)
+        emp_id, role = self.caller(token)
+        if emp_id is None:
+            return 401, {"status": False, "message": "Unauthenticated."}
+
+        if name == "leave_list":
+            if query.get("self"):
+                return 200, _page(self._rows("leave", {emp_id}), query)
+            return 200, _page(self._rows("leave", set(self.team(emp_id, role)) - {emp_id}, pending_only=True), query)
+        if name == "gatepass_list":
+            return 200, _page(self._rows("gatepass", {emp_id}), query)
+        if name == "gatepass_approval_list":
+            return 200, _page(self._rows("gatepass", set(self.team(emp_id, role)) - {emp_id}, pending_only=True), query)
+        if name == "missed_punch_list":
+            return 200, _page(self._rows("missed_punch", {emp_id}), query, rows_key="missed_punch_list")
+        if name == "missed_punch_approval_list":
+            return 200, _page(self._rows("missed_punch", set(self.team(emp_id, role)) - {emp_id}, pending_only=True), query)
+        if name in ("leave_apply", "gatepass_apply", "missed_punch_apply"):
+            return 200, self.apply(name.rsplit("_", 1)[0], emp_id, form)
+        if name == "approval_check":
+            return 200, {"status": True, "result": [
+                {"pa_status_id": 141, "pa_type": 1, "pa_sequence": 1, "pa_am_id": 11, "pa_is_last": 1}]}
+        if name == "approval_handler":
+            return 200, self.decide({**query, **form})
+        if name == "attendance":
+            emp_ids = self.team(emp_id, role) if role != "employee" else [emp_id]
+            return 200, self.attendance(emp_ids or [emp_id], query)
+        if name == "leave_balance":
+            return 200, self.leave_balance(emp_id)
+        if name == "holiday":
+            return 200, self.holidays()
+        if name == "get_in_out_time":
+            return 200, {"status": True, "result": {"in_time": "09:30", "out_time": "18:30"}}
+        return 200, {"status": True, "result": {"data": []}, "message": "stub"}
+
+
+class Fixtures:
+    """Recorded responses, one JSON file per endpoint: [{"query", "status", "body"}, ...]."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._entries = defaultdict(list)
+        self._lock = threading.Lock()
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                if filename.endswith(".json"):
+                    with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                        self._entries[filename[:-5]] = json.load(f)
+
+    @staticmethod
+    def _query_key(query):
+        return "&".join(f"{k}={query[k]}" for k in sorted(query))
+
+    def lookup(self, name, query):
+        entries = self._entries.get(name) or []
+        key = self._query_key(query)
+        for entry in entries:
+            if entry.get("query") == key:
+                return entry["status"], entry["body"]
+        return (entries[0]["status"], entries[0]["body"]) if entries else None
+
+    def save(self, name, query, status, body):
+        with self._lock:
+            self._entries[name].append({"query": self._query_key(query), "status": status, "body": body})
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(self._entries[name], f, indent=1)
+
+
+class FixHRStub:
+    """WSGI app: routes FixHR paths to synthetic data, fixtures or an upstream, with fault injection."""
+
+    def __init__(self, data=None, faults=None, replay=None, record=None, upstream=None):
+        self.data = data or SyntheticFixHR()
+        self.faults = faults or Faults()
+        self.replay = Fixtures(replay) if replay else None
+        self.record = Fixtures(record) if record else None
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.routes = {(ep.method, ep.path): name for name, ep in ENDPOINTS.items()}
+        self.stats = defaultdict(Counter)
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, field):
+        with self._stats_lock:
+            self.stats[name][field] += 1
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        path = environ.get("PATH_INFO") or "/"
+        query = {k: v[-1] for k, v in parse_qs(environ.get("QUERY_STRING", "")).items()}
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        raw = environ["wsgi.input"].read(length) if length else b""
+
+        if path.startswith("/__stub__/"):
+            status, body = self._control(method, path)
+            return self._respond(start_response, status, body)
+
+        name = self.routes.get((method, path))
+        if name is None:
+            return self._respond(start_response, 404, {"status": False, "message": f"No stub for {method} {path}"})
+
+        self._count(name, "requests")
+        delay, fault = self.faults.draw(name)
+        if delay:
+            time.sleep(delay)
+        if fault:
+            self._count(name, fault)
+            if fault == "error":
+                return self._respond(start_response, self.faults.error_status(),
+                                     {"status": False, "message": "Injected stub error"})
+
+        token = (environ.get("HTTP_AUTHORIZATION") or "").removeprefix("Bearer ").strip()
+        form = self._form(raw)
+        if self.record is not None:
+            status, body = self._proxy(method, path, environ, raw)
+            self.record.save(name, query, status, body)
+        elif self.replay is not None:
+            status, body = self.replay.lookup(name, query) or (404, {"status": False, "message": "Not recorded"})
+        else:
+            status, body = self.data.handle(name, token, query, form)
+        return self._respond(start_response, status, body)
+
+    @staticmethod
+    def _form(raw):
+        text = raw.decode("utf-8", errors="replace")
+        if text.lstrip().startswith("{"):
+            try:
+                return {k: str(v) for k, v in json.loads(text).items()}
+            except ValueError:
+                pass
+        return {k: v[-1] for k, v in parse_qs(text).items()}
+
+    def _proxy(self, method, path, environ, raw):
+        import requests
+
+        headers = {"Accept": "application/json"}
+        for key in ("HTTP_AUTHORIZATION", "CONTENT_TYPE"):
+            if environ.get(key):
+                headers["Authorization" if key == "HTTP_AUTHORIZATION" else "Content-Type"] = environ[key]
+        url = f"{self.upstream}{path}"
+        if environ.get("QUERY_STRING"):
+            url += "?" + environ["QUERY_STRING"]
+        r = requests.request(method, url, data=raw or None, headers=headers, timeout=60)
+        try:
+            return r.status_code, r.json()
+        except ValueError:
+            return r.status_code, {"status": False, "message": r.text[:500]}
+
+    def _control(self, method, path):
+        if path == "/__stub__/stats":
+            with self._stats_lock:
+                return 200, {name: dict(counts) for name, counts in sorted(self.stats.items())}
+        if path == "/__stub__/reset" and method == "POST":
+            with self._stats_lock:
+                self.stats.clear()
+            self.data.reset()
+            return 200, {"status": True}
+        return 404, {"status": False}
+
+    @staticmethod
+    def _respond(start_response, status, body):
+        payload = json.dumps(body).encode()
+        reason = {200: "OK", 401: "Unauthorized", 404: "Not Found", 500: "Internal Server Error",
+                  503: "Service Unavailable"}.get(status, "Status")
+        start_response(f"{status} {reason}", [("Content-Type", "application/json"),
+                                              ("Content-Length", str(len(payload)))])
+        return [payload]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def make_stub_server(stub, host="127.0.0.1", port=8765):
+    """A threaded WSGI server for `stub` (port 0 picks a free port)."""
+    return make_server(host, port, stub, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+
+
+def start_in_thread(stub, host="127.0.0.1", port=0):
+    """Serve `stub` from a daemon thread; returns (server, base_url)."""
+    server = make_stub_server(stub, host, port)
+    threading.Thread(target=server.serve_forever, name="fixhr-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
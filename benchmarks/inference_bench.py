@@ -0,0 +1,181 @@
+# benchmarks/inference_bench.py
+"""
+Repeatable latency benchmark for the Phi-3 inference paths.
+
+Builds a tiny random Phi-3 checkpoint (benchmarks/tiny_phi3.py), points
+phi3_inference_v3 / model_inference2 at it and drives the real code:
+
+    intent : make_prompt -> generate_json -> extract_fields
+    chat   : generate_response
+
+over a fixed message corpus drawn from core/dataset. Reports p50/p95/p99
+latency, throughput at several concurrency levels and peak memory.
+Works offline on CPU.
+
+Usage (from the repo root):
+    python -m benchmarks.inference_bench
+    python -m benchmarks.inference_bench --paths intent --messages 100 --concurrency 1,4,8
+    python -m benchmarks.inference_bench --json bench_output.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATASET_DIR = ROOT_DIR / "core" / "dataset"
+
+# general_data.json is a merge of the per-intent files, skip the duplicate
+CORPUS_FILES = [
+    "apply_leave.json",
+    "gatepass_apply.json",
+    "missed_punch.json",
+    "attendance_report.json",
+    "leave_balance.json",
+    "holiday_list.json",
+    "payslip.json",
+    "privacy_policy.json",
+]
+
+
+def load_corpus(size):
+    """Round-robin over the intent files so every run sees the same messages."""
+    per_file = []
+    for name in CORPUS_FILES:
+        with open(DATASET_DIR / name, "r", encoding="utf-8") as f:
+            per_file.append([item["text"] for item in json.load(f) if item.get("text")])
+
+    corpus = []
+    index = 0
+    while len(corpus) < size:
+        for texts in per_file:
+            if index < len(texts) and len(corpus) < size:
+                corpus.append(texts[index])
+        index += 1
+    return corpus
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_level(fn, corpus, concurrency):
+    latencies = []
+
+    def timed(msg):
+        start = time.perf_counter()
+        fn(msg)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, corpus))
+    wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(corpus),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "throughput_rps": round(len(corpus) / wall, 2) if wall else 0.0,
+    }
+
+
+def load_paths(model_dir):
+    """Import the inference modules against the stand-in checkpoint."""
+    os.environ["FIXHR_INTENT_MODEL_DIR"] = model_dir
+    os.environ["FIXHR_CHAT_MODEL_DIR"] = model_dir
+    sys.path.insert(0, str(ROOT_DIR))
+
+    from core import inference_telemetry
+    from core import phi3_inference_v3 as intent_mod
+    from core import model_inference2 as chat_mod
+
+    def intent_path(msg):
+        prompt = intent_mod.make_prompt(msg)
+        raw, stats = intent_mod.generate_json_with_stats(intent_mod.TOKENIZER, intent_mod.MODEL, prompt, intent_mod.DEVICE)
+        fields = intent_mod.extract_fields(raw)
+        inference_telemetry.record(stats, intent=fields[0] or "unparsed")
+        return fields
+
+    def chat_path(msg):
+        reply, stats = chat_mod.generate_response_with_stats(chat_mod.TOKENIZER, chat_mod.MODEL, chat_mod.DEVICE, msg)
+        inference_telemetry.record(stats, intent="general")
+        return reply
+
+    return {"intent": intent_path, "chat": chat_path}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Phi-3 inference paths with a tiny stand-in model")
+    parser.add_argument("--messages", type=int, default=40, help="corpus size per concurrency level")
+    parser.add_argument("--concurrency", default="1,2,4", help="comma separated thread counts")
+    parser.add_argument("--paths", default="intent,chat", help="intent, chat or both")
+    parser.add_argument("--model-dir", default=os.path.join(tempfile.gettempdir(), "fixhr_tiny_phi3"),
+                        help="where the tiny checkpoint is built/reused")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--json", dest="json_out", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+    from benchmarks.tiny_phi3 import build_tiny_phi3
+
+    model_dir = build_tiny_phi3(args.model_dir)
+    paths = load_paths(model_dir)
+    corpus = load_corpus(args.messages)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    from core import inference_telemetry
+
+    inference_telemetry.reset()
+    results = {"model_dir": model_dir, "messages": len(corpus), "paths": {}}
+    for name in [p.strip() for p in args.paths.split(",") if p.strip()]:
+        fn = paths[name]
+        for msg in corpus[:args.warmup]:
+            fn(msg)
+
+        rows = [run_level(fn, corpus, level) for level in levels]
+        results["paths"][name] = {"levels": rows, "peak_rss_mb": peak_rss_mb()}
+
+        print(f"\n=== {name} ===")
+        print(f"{'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+        for row in rows:
+            print(f"{row['concurrency']:>5} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['throughput_rps']:>8}")
+        print(f"peak RSS: {results['paths'][name]['peak_rss_mb']} MB")
+
+    try:
+        import torch
+        if torch.cuda.is_available():
+            results["cuda_peak_mb"] = round(torch.cuda.max_memory_allocated() / (1024 * 1024), 1)
+    except ImportError:
+        pass
+
+    results["telemetry"] = inference_telemetry.snapshot()["models"]
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json_out}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/tiny_phi3.py
+"""
+Build a tiny, randomly initialised Phi-3-architecture checkpoint + tokenizer
+on local disk, so the real inference code paths can be exercised offline on
+CPU without the merged_phi3 / merged_phi3_intent weights.
+
+The tokenizer is a byte-level BPE trained on the messages in core/dataset,
+with the Phi-3 special tokens and chat template.
+"""
+
+import json
+from pathlib import Path
+
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import Phi3Config, Phi3ForCausalLM, PreTrainedTokenizerFast
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATASET_DIR = ROOT_DIR / "core" / "dataset"
+
+SPECIAL_TOKENS = ["<unk>", "<s>", "<|endoftext|>", "</s>", "<|system|>", "<|user|>", "<|assistant|>", "<|end|>"]
+
+PHI3_CHAT_TEMPLATE = (
+    "{% for message in messages %}"
+    "{% if message['role'] == 'system' %}{{'<|system|>\n' + message['content'] + '<|end|>\n'}}"
+    "{% elif message['role'] == 'user' %}{{'<|user|>\n' + message['content'] + '<|end|>\n'}}"
+    "{% elif message['role'] == 'assistant' %}{{'<|assistant|>\n' + message['content'] + '<|end|>\n'}}"
+    "{% endif %}{% endfor %}"
+    "{% if add_generation_prompt %}{{ '<|assistant|>\n' }}{% else %}{{ eos_token }}{% endif %}"
+)
+
+TINY_CONFIG = {
+    "hidden_size": 64,
+    "intermediate_size": 128,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 4,
+    "num_key_value_heads": 4,
+    "max_position_embeddings": 4096,
+}
+
+
+def training_texts():
+    texts = []
+    for path in sorted(DATASET_DIR.glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            texts.extend(item["text"] for item in json.load(f) if item.get("text"))
+    return texts
+
+
+def build_tokenizer(texts, vocab_size=2000):
+    tok = Tokenizer(models.BPE())
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=SPECIAL_TOKENS,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False,
+    )
+    tok.train_from_iterator(texts, trainer=trainer)
+
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tok,
+        unk_token="<unk>",
+        bos_token="<s>",
+        eos_token="<|endoftext|>",
+        pad_token="<|endoftext|>",
+        additional_special_tokens=["</s>", "<|system|>", "<|user|>", "<|assistant|>", "<|end|>"],
+    )
+    tokenizer.chat_template = PHI3_CHAT_TEMPLATE
+    return tokenizer
+
+
+def build_model(tokenizer, seed=0, **overrides):
+    torch.manual_seed(seed)
+    config = Phi3Config(
+        vocab_size=len(tokenizer),
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+        **{**TINY_CONFIG, **overrides},
+    )
+    model = Phi3ForCausalLM(config)
+    model.generation_config.pad_token_id = tokenizer.pad_token_id
+    model.eval()
+    return model
+
+
+def build_tiny_phi3(output_dir, vocab_size=2000, seed=0, **overrides):
+    """Write a loadable tiny checkpoint to output_dir and return its path."""
+    output_dir = Path(output_dir)
+    if (output_dir / "config.json").exists():
+        return str(output_dir)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = build_tokenizer(training_texts(), vocab_size=vocab_size)
+    model = build_model(tokenizer, seed=seed, **overrides)
+    tokenizer.save_pretrained(output_dir)
+    model.save_pretrained(output_dir)
+    return str(output_dir)
@@ -0,0 +1,362 @@
+# core/apply_queue.py
+"""
+Write-behind queue for applies (leave, gatepass, missed punch).
+
+The apply handlers used to hold the chat request on FixHR's POST, and a
+user who retried after a slow answer got a second, duplicate request.
+Now the handler builds its payload and calls ``submit``:
+
+    data = apply_queue.submit("leave", payload, token, employee_id, business_id)
+
+The job is stored in ApplyJob (db.sqlite3) under an idempotency key made
+from the employee, the kind and the normalized payload, so the same apply
+sent twice while the first is queued, running or recently done returns
+the existing job instead of a new one. ``submit`` returns at once with
+``{"status": True, "queued": True, "job": {...}}`` and worker threads post
+the job to FixHR.
+
+The bearer token is never written to the database: it is kept in the
+memory of the process that queued the job, and only that process's
+workers submit it. A job still queued ORPHAN_SECONDS after it was due
+(its process restarted) fails without being sent.
+
+Only failures where the request cannot have reached FixHR are retried,
+with exponential backoff up to FIXHR_APPLY_MAX_ATTEMPTS: no connection
+could be opened, the breaker is open, or FixHR answered 503. Anything that
+may have happened after the body was sent (a read timeout, a dropped
+connection, 502/504 from the gateway), or a job found "running" after a
+restart, ends as "unknown": FixHR may have saved it, so it is not sent
+again. A FixHR "status": false answer fails the job with its message.
+
+The chat page polls ``/api/apply-jobs/<id>/`` (``job_status``) for the
+outcome. Callbacks registered with ``on_success(kind, fn)`` run after a
+job is accepted by FixHR (the leave one refreshes the leave balance).
+
+FIXHR_APPLY_QUEUE=0 keeps the idempotency check but submits inline, once,
+inside the chat request.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from core import leave_balance_cache
+from core.fixhr_client import ENDPOINTS, fixhr
+from core.fixhr_resilience import FixHRUnavailable
+
+logger = logging.getLogger(__name__)
+
+QUEUE_ENABLED = os.environ.get("FIXHR_APPLY_QUEUE", "1") == "1"
+WORKERS = int(os.environ.get("FIXHR_APPLY_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.environ.get("FIXHR_APPLY_MAX_ATTEMPTS", "5"))
+RETRY_SECONDS = float(os.environ.get("FIXHR_APPLY_RETRY_SECONDS", "2"))
+# A finished apply with the same key after this long is a new request
+DEDUP_HOURS = float(os.environ.get("FIXHR_APPLY_DEDUP_HOURS", "24"))
+POLL_SECONDS = 1.0
+
+QUEUED, RUNNING, DONE, FAILED, UNKNOWN = "queued", "running", "done", "failed", "unknown"
+FINISHED = (DONE, FAILED, UNKNOWN)
+
+# kind -> FixHR endpoint name (core.fixhr_client.ENDPOINTS)
+KINDS = {
+    "leave": "leave_apply",
+    "gatepass": "gatepass_apply",
+    "missed_punch": "missed_punch_apply",
+}
+# A job still "running" after this long belongs to a worker that died
+LEASE_SECONDS = max(60, 2 * max(ENDPOINTS[name].timeout for name in KINDS.values()))
+# A due job nobody claimed for this long lost its token with its process
+ORPHAN_SECONDS = int(os.environ.get("FIXHR_APPLY_ORPHAN_SECONDS", str(10 * LEASE_SECONDS)))
+# FixHR says it did not process the request; 502/504 come from the gateway and may follow a save
+RETRY_STATUSES = {503}
+# Requests that never left this process because they were malformed
+INVALID_REQUEST_ERRORS = (
+    requests.exceptions.InvalidURL,
+    requests.exceptions.MissingSchema,
+    requests.exceptions.InvalidSchema,
+    requests.exceptions.InvalidHeader,
+)
+LABELS = {"leave": "Leave", "gatepass": "Gatepass", "missed_punch": "Missed punch"}
+
+_callbacks = defaultdict(list)
+
+
+def on_success(kind, fn):
+    """Run ``fn(job, token)`` after FixHR accepts a job of `kind`."""
+    _callbacks[kind].append(fn)
+
+
+on_success("leave", lambda job, token: leave_balance_cache.on_leave_applied(token, job.employee_id, job.business_id))
+
+
+def _normalize(value):
+    return " ".join(str(value).split()).casefold()
+
+
+def idempotency_key(employee_id, kind, payload):
+    """Same employee, kind and payload (ignoring case, spacing and empty fields) -> same key."""
+    fields = {k: _normalize(v) for k, v in payload.items() if v not in (None, "")}
+    raw = json.dumps([str(employee_id), kind, fields], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def not_sent(exc):
+    """True if `exc` means the request never reached FixHR, so sending it again cannot duplicate it."""
+    if isinstance(exc, (FixHRUnavailable, requests.ConnectTimeout)):
+        return True
+    if isinstance(exc, requests.ConnectionError) and exc.args:
+        # connect/DNS failures arrive as MaxRetryError(reason=NewConnectionError)
+        return isinstance(getattr(exc.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+def accepted(data):
+    return data.get("status") in (True, "success") or data.get("success") in (True, "success")
+
+
+def parse_response(response):
+    """FixHR's JSON answer, or a status-false dict with a readable message for non-JSON bodies."""
+    try:
+        return response.json()
+    except ValueError:
+        text = (response.text or "").lower()
+        if "unauthorized" in text or response.status_code == 401:
+            message = "Unauthorized - check token"
+        elif "forbidden" in text or response.status_code == 403:
+            message = "Forbidden - insufficient permissions"
+        elif "error" in text:
+            message = "API returned an error"
+        else:
+            message = "Invalid FixHR response"
+        return {"status": False, "message": message, "http_status": response.status_code}
+
+
+def job_dict(job):
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "finished": job.status in FINISHED,
+        "attempts": job.attempts,
+        "message": job.message,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+def job_reply(job):
+    """One chat line for the job's current state."""
+    label = LABELS.get(job.kind, job.kind)
+    if job.status == DONE:
+        return f"✅ {label} submitted to FixHR."
+    if job.status == FAILED:
+        return f"⚠️ {label} failed. {job.message}".strip()
+    if job.status == UNKNOWN:
+        return f"⚠️ {label}: FixHR did not confirm it. Please check your requests before applying again."
+    if job.attempts:
+        return f"⏳ {label} is being submitted (attempt {job.attempts})…"
+    return f"⏳ {label} request received, submitting to FixHR…"
+
+
+class ApplyQueue:
+    def __init__(self, workers=WORKERS, max_attempts=MAX_ATTEMPTS, retry_seconds=RETRY_SECONDS):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self._wake = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        # job pk -> bearer token, for jobs this process queued; never persisted
+        self._tokens = {}
+
+    # ---------------- submitting ----------------
+    def submit(self, kind, payload, token, employee_id, business_id=None):
+        """
+        Queue one apply. Returns a FixHR-shaped dict: ``status`` (accepted
+        for submission, or FixHR's answer when the queue is off),
+        ``message``, ``queued``, ``duplicate`` and ``job`` (job_dict).
+        """
+        from django.db import transaction
+        from django.utils import timezone
+
+        from core.models import ApplyJob
+
+        now = timezone.now()
+        key = idempotency_key(employee_id, kind, payload)
+        fields = {
+            "kind": kind,
+            "employee_id": str(employee_id or ""),
+            "business_id": str(business_id or ""),
+            "payload": payload,
+            "status": QUEUED,
+            "attempts": 0,
+            "message": "",
+            "response": None,
+            "next_attempt_at": now,
+        }
+        with transaction.atomic():
+            job, created = ApplyJob.objects.get_or_create(idempotency_key=key, defaults=fields)
+        if not created:
+            stale = job.status in (FAILED, UNKNOWN) or (
+                job.status == DONE and job.updated_at < now - timedelta(hours=DEDUP_HOURS)
+            )
+            # Conditional update: of two identical retries only one requeues the job
+            if not stale or not ApplyJob.objects.filter(pk=job.pk, status=job.status).update(updated_at=now, **fields):
+                job.refresh_from_db()
+                if job.status == QUEUED and token:
+                    # the same user asking again can hand a job back its token
+                    self._tokens[job.pk] = token
+                logger.info("Duplicate %s apply for %s -> job %s (%s)", kind, employee_id, job.pk, job.status)
+                return {"status": True, "message": job_reply(job), "queued": job.status == QUEUED,
+                        "duplicate": True, "job": job_dict(job)}
+            job.refresh_from_db()
+
+        self._tokens[job.pk] = token or ""
+        if not QUEUE_ENABLED:
+            if ApplyJob.objects.filter(pk=job.pk, status=QUEUED).update(status=RUNNING, attempts=1, updated_at=now):
+                job.refresh_from_db()
+                self._attempt(job, retry=False)
+            return {**(job.response or {"status": False, "message": job.message}), "queued": False,
+                    "duplicate": False, "job": job_dict(job)}
+
+        self.start()
+        self._wake.set()
+        return {"status": True, "message": job_reply(job), "queued": True, "duplicate": False, "job": job_dict(job)}
+
+    def status(self, job_id, employee_id):
+        """job_dict plus ``reply`` for `employee_id`'s job, or None."""
+        from core.models import ApplyJob
+
+        self.start()
+        job = ApplyJob.objects.filter(pk=job_id, employee_id=str(employee_id or "")).first()
+        if job is None:
+            return None
+        return {**job_dict(job), "reply": job_reply(job)}
+
+    # ---------------- worker ----------------
+    def start(self):
+        """Start the worker threads once per process; they pick up jobs left queued by earlier runs."""
+        if not QUEUE_ENABLED:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"apply-queue-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        from django.db import close_old_connections
+
+        while True:
+            job = None
+            try:
+                close_old_connections()
+                job = self._claim()
+                if job is not None:
+                    self._attempt(job)
+            except Exception:
+                logger.exception("Apply queue worker error")
+            if job is None:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+    def _claim(self):
+        from django.db.models import F
+        from django.utils import timezone
+
+        from core.models import ApplyJob
+
+        now = timezone.now()
+        self._abandon_interrupted(now)
+        mine = list(self._tokens)
+        if not mine:
+            return None
+        due = ApplyJob.objects.filter(status=QUEUED, next_attempt_at__lte=now, pk__in=mine).order_by("next_attempt_at", "pk")
+        for job in due[:5]:
+            claimed = ApplyJob.objects.filter(pk=job.pk, status=QUEUED).update(
+                status=RUNNING, attempts=F("attempts") + 1, updated_at=now
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+        return None
+
+    def _abandon_interrupted(self, now):
+        """
+        A job left running by a dead worker may already be in FixHR: don't
+        resend it. A job left queued by a dead process has no token: fail it.
+        """
+        from core.models import ApplyJob
+
+        ApplyJob.objects.filter(status=RUNNING, updated_at__lt=now - timedelta(seconds=LEASE_SECONDS)).update(
+            status=UNKNOWN, message="Interrupted while submitting", updated_at=now
+        )
+        ApplyJob.objects.filter(status=QUEUED, next_attempt_at__lt=now - timedelta(seconds=ORPHAN_SECONDS)).exclude(
+            pk__in=list(self._tokens)
+        ).update(status=FAILED, message="Not submitted before the server restarted. Please apply again.", updated_at=now)
+
+    def _attempt(self, job, retry=True):
+        token = self._tokens.get(job.pk, "")
+        try:
+            response = fixhr.post(KINDS[job.kind], token=token, data=job.payload, form=True)
+        except requests.RequestException as e:
+            if not_sent(e):
+                self._retry_or_fail(job, str(e), retry)
+            elif isinstance(e, INVALID_REQUEST_ERRORS):
+                self._finish(job, FAILED, str(e))
+            else:
+                # The request may have reached FixHR; it may or may not have been saved
+                logger.warning("Apply job %s got no answer from FixHR: %s", job.pk, e)
+                lost = "FixHR did not answer in time" if isinstance(e, requests.Timeout) else "Connection to FixHR was lost"
+                self._finish(job, UNKNOWN, lost)
+            return
+
+        if response.status_code in RETRY_STATUSES:
+            self._retry_or_fail(job, f"FixHR returned {response.status_code}", retry)
+            return
+        if response.status_code in (502, 504):
+            self._finish(job, UNKNOWN, f"FixHR returned {response.status_code}")
+            return
+        data = parse_response(response)
+        if accepted(data):
+            for fn in _callbacks[job.kind]:
+                try:
+                    fn(job, token)
+                except Exception:
+                    logger.exception("Apply job %s success callback failed", job.pk)
+            self._finish(job, DONE, data.get("message") or "", data)
+        else:
+            self._finish(job, FAILED, data.get("message") or "Unknown error", data)
+
+    def _retry_or_fail(self, job, message, retry=True):
+        from django.utils import timezone
+
+        if not retry or job.attempts >= self.max_attempts:
+            self._finish(job, FAILED, message)
+            return
+        delay = self.retry_seconds * (2 ** (job.attempts - 1))
+        logger.warning("Apply job %s failed (%s), retry %d/%d in %.1fs",
+                       job.pk, message, job.attempts, self.max_attempts - 1, delay)
+        job.status = QUEUED
+        job.message = message
+        job.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        job.save(update_fields=["status", "message", "next_attempt_at", "updated_at"])
+
+    def _finish(self, job, status, message, response=None):
+        job.status = status
+        job.message = message
+        job.response = response
+        job.save(update_fields=["status", "message", "response", "updated_at"])
+        self._tokens.pop(job.pk, None)
+
+
+apply_queue = ApplyQueue()
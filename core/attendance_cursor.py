@@ -0,0 +1,184 @@
+# core/attendance_cursor.py
+"""
+Cursor pages over an attendance register.
+
+A report used to stop at 250 rows. Now its filtered rows are sorted by
+(employee, date), the chat reply carries the first page and the rest is
+kept for CURSOR_TTL seconds under a random cursor id, so the chat page
+can pull the next pages from /api/attendance/page/?cursor=... as the
+register is scrolled without going back to FixHR or the store.
+
+Rows are stored as tuples of FIELDS rather than dicts. A page ends on an
+employee boundary, so an employee's days are never split across pages.
+Like core.list_cursor, a cursor is "<id>:<offset>", is bound to the token
+that created it and lives in the response cache backend, so with
+FIXHR_CACHE_BACKEND=django any worker can serve the next page. The rows
+are split into entries of CHUNK_ROWS, so no cache entry holds more than
+that and a page only loads the chunks it covers. With the local backend
+cursors stay in the worker, in an LRU bounded by entries and total rows.
+"""
+
+import os
+import secrets
+import time
+from collections import namedtuple
+
+from core.fixhr_cache import DjangoCacheBackend, LocalLRUBackend, build_backend, token_scope
+
+CURSOR_TTL = int(os.environ.get("FIXHR_ATTENDANCE_CURSOR_TTL", "300"))
+# Rows per cache entry
+CHUNK_ROWS = int(os.environ.get("FIXHR_ATTENDANCE_CURSOR_CHUNK", "1000"))
+# Local backend only: cache entries and rows kept across all cursors of this process
+CURSOR_ENTRIES = int(os.environ.get("FIXHR_ATTENDANCE_CURSOR_ENTRIES", "1024"))
+CURSOR_ROWS = int(os.environ.get("FIXHR_ATTENDANCE_CURSOR_ROWS", "200000"))
+
+FIELDS = (
+    "employee_id", "employee_name", "date", "status", "in_time", "out_time", "work_hours", "late", "overtime", "remark",
+)
+
+Page = namedtuple("Page", "rows offset total next_cursor context")
+
+
+
+class _CursorStore(LocalLRUBackend):
+    """
+    LocalLRUBackend that also evicts the oldest chunks once they hold more
+    than max_rows rows. Those are the pages already served, so a register
+    bigger than max_rows can still be scrolled forwards.
+    """
+
+    def __init__(self, max_entries, max_rows):
+        super().__init__(max_entries=max_entries)
+        self.max_rows = max_rows
+        self.rows = 0
+
+    @staticmethod
+    def _size(value):
+        return len(value) if isinstance(value, list) else 0
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.rows -= self._size(old[0])
+            self._data[key] = (value, time.time() + timeout if timeout else None)
+            self.rows += self._size(value)
+            while len(self._data) > self.max_entries:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.rows -= self._size(evicted)
+            for old_key in list(self._data):
+                if self.rows <= self.max_rows or old_key == key:
+                    break
+                size = self._size(self._data[old_key][0])
+                if size:
+                    del self._data[old_key]
+                    self.rows -= size
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] is not None and item[1] < time.time():
+                del self._data[key]
+                self.rows -= self._size(item[0])
+                return None
+        return super().get(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.rows = 0
+
+
+def _build_store():
+    backend = build_backend()
+    return backend if isinstance(backend, DjangoCacheBackend) else _CursorStore(CURSOR_ENTRIES, CURSOR_ROWS)
+
+
+_store = _build_store()
+
+
+class _StoredRows:
+    """The rows of a stored register, read from the store a chunk at a time; KeyError if a chunk is gone."""
+
+    def __init__(self, cursor_id, total):
+        self.cursor_id = cursor_id
+        self.total = total
+        self._chunks = {}
+
+    def __len__(self):
+        return self.total
+
+    def _chunk(self, number):
+        if number not in self._chunks:
+            chunk = _store.get(f"fixhr:attendance-cursor:{self.cursor_id}:{number}")
+            if chunk is None:
+                raise KeyError(number)
+            self._chunks[number] = chunk
+        return self._chunks[number]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.total))]
+        return self._chunk(index // CHUNK_ROWS)[index % CHUNK_ROWS]
+
+
+def _employee_key(row):
+    emp_id = row[0] if isinstance(row, tuple) else row["employee_id"]
+    if emp_id not in (None, ""):
+        return str(emp_id)
+    return f"name:{row[1] if isinstance(row, tuple) else row['employee_name']}"
+
+
+def ordered(rows):
+    """Rows as FIELDS tuples in (employee, date) order; employees keep the order they first appear in."""
+    first_seen = {}
+    packed = []
+    for row in rows:
+        first_seen.setdefault(_employee_key(row), len(first_seen))
+        packed.append(tuple(row[f] for f in FIELDS))
+    # stable: months come in date order, so each employee's days stay sorted
+    packed.sort(key=lambda row: first_seen[_employee_key(row)])
+    return packed
+
+
+def _page(packed, offset, page_rows, context, cursor_id):
+    end = min(offset + page_rows, len(packed))
+    last_employee = _employee_key(packed[end - 1]) if end > offset else None
+    while end < len(packed) and _employee_key(packed[end]) == last_employee:
+        end += 1
+    rows = [dict(zip(FIELDS, row)) for row in packed[offset:end]]
+    next_cursor = f"{cursor_id}:{end}" if cursor_id and end < len(packed) else None
+    return Page(rows, offset, len(packed), next_cursor, context)
+
+
+def first_page(rows, context, token, page_rows):
+    """
+    The first page of ``rows`` (row dicts from core.attendance_store).
+    When more remain, the ordered rows and ``context`` (whatever the
+    caller needs to render later pages) are kept behind ``next_cursor``.
+    """
+    packed = ordered(rows)
+    cursor_id = None
+    if len(packed) > page_rows:
+        cursor_id = secrets.token_urlsafe(12)
+        for start in range(0, len(packed), CHUNK_ROWS):
+            _store.set(f"fixhr:attendance-cursor:{cursor_id}:{start // CHUNK_ROWS}",
+                       packed[start:start + CHUNK_ROWS], CURSOR_TTL)
+        _store.set(f"fixhr:attendance-cursor:{cursor_id}", (token_scope(token), context, len(packed)), CURSOR_TTL)
+    return _page(packed, 0, page_rows, context, cursor_id)
+
+
+def next_page(cursor, token, page_rows):
+    """The page a cursor points at, or None if it expired or belongs to another user."""
+    cursor_id, _, offset = (cursor or "").partition(":")
+    entry = _store.get(f"fixhr:attendance-cursor:{cursor_id}") if cursor_id and offset.isdigit() else None
+    if entry is None:
+        return None
+    owner, context, total = entry
+    if owner != token_scope(token) or int(offset) >= total:
+        return None
+    try:
+        return _page(_StoredRows(cursor_id, total), int(offset), page_rows, context, cursor_id)
+    except KeyError:
+        # a chunk was evicted before the cursor itself
+        return None
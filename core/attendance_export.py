@@ -0,0 +1,174 @@
+# core/attendance_export.py
+"""
+Streaming attendance register exports (CSV and XLSX).
+
+The chat reply shows a bounded register; /api/attendance/export/ returns
+the whole one as a file. Rows come from AttendanceStore.iter_rows, which
+loads one month at a time and yields its rows as it goes, and the writers
+below turn them into chunks of at most CHUNK_ROWS rows for
+StreamingHttpResponse. Nothing holds the full register, so under WSGI a
+2,000 employee month exports in the memory of one month's MonthGrid.
+Under ASGI, Django buffers a synchronous streaming body
+(sync_to_async(list)) before sending it, so the file is held whole there.
+
+Cells are written as text: missing values (None, or MonthGrid's "-")
+are blank, and text starting with = + - @ (or a tab / carriage return)
+gets a leading apostrophe so a spreadsheet does not evaluate a remark as
+a formula.
+
+XLSX is written without a spreadsheet library: the workbook is a zip of
+a few fixed XML parts and one worksheet, and the worksheet is streamed
+into a zipfile entry whose compressed output is handed on as it is
+produced (zipfile writes data descriptors when the target is not
+seekable).
+"""
+
+import csv
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+CHUNK_ROWS = 500
+
+COLUMNS = (
+    ("Employee ID", "employee_id"),
+    ("Employee", "employee_name"),
+    ("Date", "date"),
+    ("Status", "status"),
+    ("In", "in_time"),
+    ("Out", "out_time"),
+    ("Hours", "work_hours"),
+    ("Late", "late"),
+    ("Overtime", "overtime"),
+    ("Remark", "remark"),
+)
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# MonthGrid's placeholder for a field FixHR left empty
+MISSING = "-"
+
+
+def _cell(value):
+    if value is None or value == MISSING:
+        return ""
+    text = str(value)
+    return "'" + text if text.startswith(FORMULA_PREFIXES) else text
+
+
+def _values(row):
+    return [("Yes" if row[key] else "No") if key == "late" else _cell(row[key]) for _, key in COLUMNS]
+
+
+def csv_chunks(rows):
+    """UTF-8 CSV (with a BOM, so Excel reads Hindi names correctly), CHUNK_ROWS rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow([title for title, _ in COLUMNS])
+    count = 0
+    for row in rows:
+        writer.writerow(_values(row))
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+class _Pipe:
+    """Write-only, unseekable file that collects what zipfile writes until drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Attendance" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(number, values):
+    cells = "".join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+        for value in values
+    )
+    return f'<row r="{number}">{cells}</row>'
+
+
+def xlsx_chunks(rows):
+    """An .xlsx workbook with one "Attendance" sheet, streamed CHUNK_ROWS rows at a time."""
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, "w", zipfile.ZIP_DEFLATED) as workbook:
+        for name, xml in _XLSX_PARTS.items():
+            workbook.writestr(name, xml)
+        yield pipe.drain()
+
+        with workbook.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(1, [title for title, _ in COLUMNS]).encode())
+            number = 1
+            for row in rows:
+                number += 1
+                sheet.write(_xlsx_row(number, _values(row)).encode())
+                if number % CHUNK_ROWS == 0:
+                    yield pipe.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield pipe.drain()
+
+
+WRITERS = {"csv": csv_chunks, "xlsx": xlsx_chunks}
@@ -0,0 +1,466 @@
+# core/attendance_store.py
+"""
+Month-granular attendance store.
+
+Attendance is kept per (business, view, year, month) as a MonthGrid: the
+employees of the month, a status dictionary and an employee × day array
+of status codes, with the other day fields (in/out time, hours, overtime,
+remark) stored the same way as dictionary-coded columns.
+
+  - Closed months (ended more than FIXHR_ATTENDANCE_CLOSE_AFTER_DAYS ago)
+    are fetched once and persisted compressed in AttendanceMonth, then
+    served from there for good.
+  - Open months (the current one, or one that just ended) live in memory.
+    After FIXHR_ATTENDANCE_REFRESH_SECONDS only the last
+    REFETCH_OVERLAP_DAYS up to today are refetched and merged in.
+
+Both are kept in memory in LRUs of FIXHR_ATTENDANCE_MEMORY_MONTHS months
+each; an evicted closed month is reloaded from the DB, an evicted open
+one is fetched again.
+
+A report spanning several months (a week across a month boundary, a
+quarter, a custom range) loads its months concurrently, at most
+FIXHR_ATTENDANCE_FANOUT at a time, and filters the merged rows to the
+range.
+
+``view`` is the user the months were fetched for ("emp:<id>"): FixHR
+returns a different employee set depending on the token (a manager only
+sees their team), so months are never shared between users.
+"""
+
+import asyncio
+import base64
+import calendar
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import dateparser
+
+from core.employee_directory import employee_directory
+from core.fixhr_cache import LocalLRUBackend
+from core.fixhr_client import afixhr, fixhr
+from core.fixhr_resilience import inherit_budget
+
+logger = logging.getLogger(__name__)
+
+CLOSE_AFTER_DAYS = int(os.environ.get("FIXHR_ATTENDANCE_CLOSE_AFTER_DAYS", "3"))
+REFRESH_SECONDS = int(os.environ.get("FIXHR_ATTENDANCE_REFRESH_SECONDS", "300"))
+# Punches for the last couple of days can still change, refetch them too
+REFETCH_OVERLAP_DAYS = 2
+# Closed and open months kept in memory, each
+MEMORY_MONTHS = int(os.environ.get("FIXHR_ATTENDANCE_MEMORY_MONTHS", "64"))
+# Months fetched at once for a report spanning several months
+FANOUT = int(os.environ.get("FIXHR_ATTENDANCE_FANOUT", "4"))
+
+TEXT_FIELDS = ("in_time", "out_time", "work_hours", "overtime", "remark")
+
+
+# ---------------- FixHR payload helpers ----------------
+def extract_employees(payload):
+    """Employee list from the monthly-attendance-detail payload, wherever it is nested."""
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict):
+        if "original" in payload:
+            return extract_employees(payload["original"])
+        if "data" in payload:
+            return extract_employees(payload["data"])
+        if "result" in payload:
+            return extract_employees(payload["result"])
+    return []
+
+
+def parse_day(value):
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value[:10]).date()
+    except ValueError:
+        parsed = dateparser.parse(value)
+        return parsed.date() if parsed else None
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def is_closed(year, month, today=None):
+    today = today or date.today()
+    return month_bounds(year, month)[1] + timedelta(days=CLOSE_AFTER_DAYS) < today
+
+
+# ---------------- Columnar month ----------------
+class MonthGrid:
+    def __init__(self, year, month):
+        self.year = year
+        self.month = month
+        self.days = calendar.monthrange(year, month)[1]
+        self.employees = []            # [emp_id, name] per row
+        self._index = {}               # employee key -> row
+        self.status_values = [""]      # code 0 = no entry for that day
+        self.statuses = bytearray()    # len(employees) * days
+        self.late = bytearray()
+        self.text_values = {f: ["-"] for f in TEXT_FIELDS}
+        self.text_codes = {f: array("H") for f in TEXT_FIELDS}
+        self._codes = {"status": {"": 0}}
+        self._codes.update({f: {"-": 0} for f in TEXT_FIELDS})
+
+    def __len__(self):
+        return len(self.employees)
+
+    def _code(self, field, values, value):
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = len(values)
+            values.append(value)
+            codes[value] = code
+        return code
+
+    def _row(self, emp_id, name):
+        key = str(emp_id) if emp_id not in (None, "") else f"name:{name}"
+        row = self._index.get(key)
+        if row is None:
+            row = len(self.employees)
+            self._index[key] = row
+            self.employees.append([emp_id, name])
+            self.statuses.extend(bytes(self.days))
+            self.late.extend(bytes(self.days))
+            for f in TEXT_FIELDS:
+                self.text_codes[f].extend([0] * self.days)
+        elif name and not self.employees[row][1]:
+            self.employees[row][1] = name
+        return row
+
+    def merge(self, payload, first=None, last=None):
+        """Write the payload's day entries that fall in [first, last] (whole month by default)."""
+        month_first, month_last = month_bounds(self.year, self.month)
+        first, last = max(first or month_first, month_first), min(last or month_last, month_last)
+
+        for emp in extract_employees(payload):
+            if not isinstance(emp, dict):
+                continue
+            name = (emp.get("emp_name") or emp.get("name") or "").strip()
+            emp_id = emp.get("emp_id") or emp.get("employee_id") or ""
+            row = None
+
+            for day in emp.get("days") or emp.get("attendance") or []:
+                day_date = parse_day(day.get("date") or day.get("attendance_date"))
+                if not day_date or day_date < first or day_date > last:
+                    continue
+                if row is None:
+                    row = self._row(emp_id, name)
+
+                cell = row * self.days + day_date.day - 1
+                status = (day.get("status") or "-").upper()
+                self.statuses[cell] = self._code("status", self.status_values, status)
+                self.late[cell] = 1 if (day.get("is_late") or str(day.get("late", "")).lower() == "yes") else 0
+                fields = {
+                    "in_time": day.get("in_time"),
+                    "out_time": day.get("out_time"),
+                    "work_hours": day.get("work_hrs") or day.get("work_hours"),
+                    "overtime": day.get("overtime_hours") or day.get("ot"),
+                    "remark": day.get("remark") or day.get("remarks"),
+                }
+                for f in TEXT_FIELDS:
+                    self.text_codes[f][cell] = self._code(f, self.text_values[f], str(fields[f] or "-"))
+
+    def rows(self, first=None, last=None, predicate=None, ids=None):
+        """
+        Row dicts (employee order, then day) for days that have an entry.
+        ``ids`` (employee IDs) selects rows through the index instead of
+        testing every employee with ``predicate``.
+        """
+        month_first, month_last = month_bounds(self.year, self.month)
+        first, last = max(first or month_first, month_first), min(last or month_last, month_last)
+        if first > last:
+            return
+
+        if ids is not None:
+            selected = sorted(self._index[key] for key in {str(i) for i in ids} if key in self._index)
+        else:
+            selected = range(len(self.employees))
+        for row in selected:
+            emp_id, name = self.employees[row]
+            if predicate and not predicate(name, emp_id):
+                continue
+            base = row * self.days
+            for d in range(first.day, last.day + 1):
+                cell = base + d - 1
+                code = self.statuses[cell]
+                if not code:
+                    continue
+                yield {
+                    "employee_name": name or f"Emp #{emp_id}",
+                    "employee_id": emp_id,
+                    "date": date(self.year, self.month, d).isoformat(),
+                    "status": self.status_values[code],
+                    "in_time": self.text_values["in_time"][self.text_codes["in_time"][cell]],
+                    "out_time": self.text_values["out_time"][self.text_codes["out_time"][cell]],
+                    "work_hours": self.text_values["work_hours"][self.text_codes["work_hours"][cell]],
+                    "late": bool(self.late[cell]),
+                    "overtime": self.text_values["overtime"][self.text_codes["overtime"][cell]],
+                    "remark": self.text_values["remark"][self.text_codes["remark"][cell]],
+                }
+
+    def to_bytes(self):
+        doc = {
+            "year": self.year,
+            "month": self.month,
+            "employees": self.employees,
+            "status_values": self.status_values,
+            "statuses": base64.b64encode(bytes(self.statuses)).decode(),
+            "late": base64.b64encode(bytes(self.late)).decode(),
+            "text_values": self.text_values,
+            "text_codes": {f: base64.b64encode(self.text_codes[f].tobytes()).decode() for f in TEXT_FIELDS},
+        }
+        return zlib.compress(json.dumps(doc, separators=(",", ":")).encode(), 6)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        doc = json.loads(zlib.decompress(blob))
+        grid = cls(doc["year"], doc["month"])
+        grid.employees = doc["employees"]
+        grid._index = {
+            (str(emp_id) if emp_id not in (None, "") else f"name:{name}"): row
+            for row, (emp_id, name) in enumerate(grid.employees)
+        }
+        grid.status_values = doc["status_values"]
+        grid.statuses = bytearray(base64.b64decode(doc["statuses"]))
+        grid.late = bytearray(base64.b64decode(doc["late"]))
+        grid.text_values = doc["text_values"]
+        for f in TEXT_FIELDS:
+            codes = array("H")
+            codes.frombytes(base64.b64decode(doc["text_codes"][f]))
+            grid.text_codes[f] = codes
+        grid._codes = {"status": {v: i for i, v in enumerate(grid.status_values)}}
+        grid._codes.update({f: {v: i for i, v in enumerate(grid.text_values[f])} for f in TEXT_FIELDS})
+        return grid
+
+
+# ---------------- Store ----------------
+class _OpenMonth:
+    __slots__ = ("grid", "synced_at", "through")
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.synced_at = 0.0
+        self.through = None
+
+
+class AttendanceStore:
+    def __init__(self, client=fixhr, async_client=afixhr):
+        self.client = client
+        self.async_client = async_client
+        self._open = LocalLRUBackend(max_entries=MEMORY_MONTHS)
+        self._closed = LocalLRUBackend(max_entries=MEMORY_MONTHS)
+        # only while someone holds a key's lock
+        self._locks = weakref.WeakValueDictionary()
+        # asyncio locks belong to one event loop
+        self._async_locks = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=FANOUT, thread_name_prefix="attendance")
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _async_key_lock(self, key):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            locks = self._async_locks.setdefault(loop, weakref.WeakValueDictionary())
+            lock = locks.get(key)
+            if lock is None:
+                lock = locks[key] = asyncio.Lock()
+            return lock
+
+    @staticmethod
+    def _params(year, month, first, last):
+        return {"month": month, "year": year, "start_date": first.isoformat(), "end_date": last.isoformat()}
+
+    # Closed months: memory, then DB, then one full fetch
+    def _load_closed(self, key):
+        from core.models import AttendanceMonth
+
+        business_id, view, year, month = key
+        blob = (
+            AttendanceMonth.objects.filter(business_id=business_id, view=view, year=year, month=month)
+            .values_list("payload", flat=True)
+            .first()
+        )
+        return MonthGrid.from_bytes(bytes(blob)) if blob is not None else None
+
+    def _save_closed(self, key, grid):
+        from core.models import AttendanceMonth
+
+        business_id, view, year, month = key
+        AttendanceMonth.objects.update_or_create(
+            business_id=business_id, view=view, year=year, month=month,
+            defaults={"payload": grid.to_bytes(), "employee_count": len(grid)},
+        )
+
+    def _plan(self, key, today):
+        """Return (grid, None) when servable, else (open_entry_or_None, (first, last)) to fetch."""
+        _, _, year, month = key
+        first, last = month_bounds(year, month)
+        grid = self._closed.get(key)
+        if grid is not None:
+            return grid, None
+        if is_closed(year, month, today):
+            return None, (first, last)
+
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is None:
+                entry = _OpenMonth(MonthGrid(year, month))
+                self._open.set(key, entry)
+        if first > today:
+            return entry.grid, None
+        if entry.through is not None and time.time() - entry.synced_at < REFRESH_SECONDS:
+            return entry.grid, None
+        fetch_first = first if entry.through is None else max(first, entry.through - timedelta(days=REFETCH_OVERLAP_DAYS))
+        return entry, (fetch_first, min(last, today))
+
+    def _apply(self, key, entry, payload, fetch_range, today):
+        business_id, _, year, month = key
+        if entry is None:
+            grid = MonthGrid(year, month)
+            grid.merge(payload)
+            self._closed.set(key, grid)
+            employee_directory.observe(business_id, grid.employees)
+            return grid
+        entry.grid.merge(payload, *fetch_range)
+        entry.through = fetch_range[1]
+        entry.synced_at = time.time()
+        employee_directory.observe(business_id, entry.grid.employees)
+        return entry.grid
+
+    def _keep_stored(self, key, stored):
+        self._closed.set(key, stored)
+        employee_directory.observe(key[0], stored.employees)
+        return stored
+
+    def month(self, token, business_id, view, year, month, today=None):
+        today = today or date.today()
+        key = (str(business_id or ""), view, int(year), int(month))
+        grid, fetch_range = self._plan(key, today)
+        if fetch_range is None:
+            return grid
+
+        with self._key_lock(key):
+            grid, fetch_range = self._plan(key, today)
+            if fetch_range is None:
+                return grid
+            if grid is None:
+                stored = self._load_closed(key)
+                if stored is not None:
+                    return self._keep_stored(key, stored)
+
+            # this store is the attendance cache; always read through
+            res = self.client.get(
+                "attendance", token=token, params=self._params(year, month, *fetch_range), use_cache=False
+            )
+            print("📡 Attendance API Status:", res.status_code, "range:", fetch_range)
+            res.raise_for_status()
+            result = self._apply(key, grid, res.json() if res.content else {}, fetch_range, today)
+            if grid is None:
+                self._save_closed(key, result)
+            return result
+
+    async def amonth(self, token, business_id, view, year, month, today=None):
+        from asgiref.sync import sync_to_async
+
+        today = today or date.today()
+        key = (str(business_id or ""), view, int(year), int(month))
+        grid, fetch_range = self._plan(key, today)
+        if fetch_range is None:
+            return grid
+
+        async with self._async_key_lock(key):
+            grid, fetch_range = self._plan(key, today)
+            if fetch_range is None:
+                return grid
+            if grid is None:
+                stored = await sync_to_async(self._load_closed, thread_sensitive=False)(key)
+                if stored is not None:
+                    return self._keep_stored(key, stored)
+
+            res = await self.async_client.get(
+                "attendance", token=token, params=self._params(year, month, *fetch_range), use_cache=False
+            )
+            print("📡 Attendance API Status:", res.status_code, "range:", fetch_range)
+            res.raise_for_status()
+            result = self._apply(key, grid, res.json() if res.content else {}, fetch_range, today)
+            if grid is None:
+                await sync_to_async(self._save_closed, thread_sensitive=False)(key, result)
+            return result
+
+    @staticmethod
+    def months_between(first, last):
+        year, month = first.year, first.month
+        while (year, month) <= (last.year, last.month):
+            yield year, month
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    def grids(self, token, business_id, view, first, last):
+        """MonthGrids covering [first, last]; the months are loaded concurrently, FANOUT at a time."""
+        months = list(self.months_between(first, last))
+        if len(months) == 1:
+            return [self.month(token, business_id, view, *months[0])]
+        load = inherit_budget(lambda ym: self._month_in_worker(token, business_id, view, *ym))
+        return list(self._executor.map(load, months))
+
+    def _month_in_worker(self, token, business_id, view, year, month):
+        from django.db import close_old_connections
+
+        try:
+            return self.month(token, business_id, view, year, month)
+        finally:
+            close_old_connections()
+
+    async def agrids(self, token, business_id, view, first, last):
+        limit = asyncio.Semaphore(FANOUT)
+
+        async def load(year, month):
+            async with limit:
+                return await self.amonth(token, business_id, view, year, month)
+
+        return await asyncio.gather(*(load(year, month) for year, month in self.months_between(first, last)))
+
+    def iter_rows(self, token, business_id, view, first, last, predicate=None, ids=None):
+        """Rows for [first, last], loading each month only when the previous one's rows are used up (exports)."""
+        for year, month in self.months_between(first, last):
+            yield from self.month(token, business_id, view, year, month).rows(first, last, predicate, ids)
+
+    @staticmethod
+    def rows_of(grids, first, last, predicate=None, ids=None):
+        rows = []
+        for grid in grids:
+            rows.extend(grid.rows(first, last, predicate, ids))
+        return rows
+
+    def rows(self, token, business_id, view, first, last, predicate=None, ids=None):
+        return self.rows_of(self.grids(token, business_id, view, first, last), first, last, predicate, ids)
+
+    async def arows(self, token, business_id, view, first, last, predicate=None, ids=None):
+        return self.rows_of(await self.agrids(token, business_id, view, first, last), first, last, predicate, ids)
+
+    def clear(self):
+        with self._lock:
+            self._open.clear()
+            self._closed.clear()
+
+
+attendance_store = AttendanceStore()
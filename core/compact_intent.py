@@ -0,0 +1,119 @@
+# core/compact_intent.py
+"""
+Compact output format for the Phi-3 intent model.
+
+The JSON schema the model was first trained on costs 60–120 decoded tokens
+even when every slot is empty. The compact format is one line:
+
+    intent|key=value|key=value
+
+Empty slots are omitted, so the common case is just the label:
+
+    apply_leave|date=kal|reason=ghar jana hai
+    leave_balance
+
+Known slot keys map to the JSON "slots" fields; any other key is put in
+"other_entities" (e.g. leave_type=half). An optional "confidence=" field
+is accepted but the format does not require it.
+"""
+
+import re
+
+SLOT_KEYS = ["date", "date_range", "time", "time_range", "reason"]
+
+# Every intent the model may emit; training data must stay inside this list
+INTENTS = ["apply_leave", "apply_miss_punch", "apply_gate_pass", "attendance_report", "payslip", "general"]
+
+COMPACT_SYSTEM_PROMPT = f"""
+You are an NLU engine. Reply with ONE line and nothing else:
+intent|key=value|key=value
+Omit empty keys. Keys: date, date_range, time, time_range, reason, leave_type.
+Copy date/time/reason text exactly as the user wrote it.
+Use a specific intent only when the user is REQUESTING that action; questions about it are "general".
+Intents: {", ".join(INTENTS)}
+"""
+
+_INTENT_RE = re.compile(r"^[a-z][a-z0-9_]*$")
+_SPECIAL_TOKENS_RE = re.compile(r"<\|[a-z]+\|>|</s>|<s>")
+
+
+def format_prompt(system_prompt, user_msg):
+    """Prompt layout shared by inference (make_prompt) and the fine-tune."""
+    return f"<|system|>\n{system_prompt}\n</s>\n<|user|>\n{user_msg}\n</s>\n<|assistant|>"
+
+
+def _clean_value(value):
+    # '|' separates fields and newlines end the record
+    return re.sub(r"\s+", " ", str(value).replace("|", "/")).strip()
+
+
+def encode_compact(data):
+    """Turn a JSON-format intent dict into its compact line."""
+    intent = (data.get("intent") or "general").strip()
+    slots = data.get("slots") or {}
+
+    parts = [intent]
+    for key in SLOT_KEYS:
+        value = _clean_value(slots.get(key) or "")
+        if value:
+            parts.append(f"{key}={value}")
+
+    other = slots.get("other_entities") or {}
+    if isinstance(other, dict):
+        for key, value in other.items():
+            value = _clean_value(value if not isinstance(value, (list, tuple)) else ", ".join(map(str, value)))
+            if value and key not in SLOT_KEYS:
+                parts.append(f"{key}={value}")
+
+    return "|".join(parts)
+
+
+def looks_compact(text):
+    if not text:
+        return False
+    first = _SPECIAL_TOKENS_RE.sub("", text).strip().split("\n", 1)[0].strip()
+    return bool(first) and not first.startswith("{") and bool(_INTENT_RE.match(first.split("|", 1)[0].strip()))
+
+
+def parse_compact(text):
+    """
+    Parse a compact line into the same dict shape the JSON path yields:
+    {"intent", "confidence", "slots": {..., "other_entities": {}}}
+    """
+    result = {
+        "intent": "",
+        "confidence": 0.0,
+        "slots": {key: "" for key in SLOT_KEYS},
+    }
+    result["slots"]["other_entities"] = {}
+
+    line = _SPECIAL_TOKENS_RE.sub("", text or "").strip().split("\n", 1)[0].strip()
+    if not line:
+        return result
+
+    fields = [f.strip() for f in line.split("|")]
+    intent = fields[0].lower()
+    if not _INTENT_RE.match(intent):
+        return result
+
+    result["intent"] = intent
+    result["confidence"] = 1.0
+
+    for field in fields[1:]:
+        if "=" not in field:
+            continue
+        key, value = field.split("=", 1)
+        key, value = key.strip().lower(), value.strip()
+        if not key or not value:
+            continue
+        if key == "confidence":
+            try:
+                result["confidence"] = float(value)
+            except ValueError:
+                pass
+        elif key in SLOT_KEYS:
+            result["slots"][key] = value
+        else:
+            result["slots"]["other_entities"][key] = value
+
+    return result
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Convert intent training data to the compact "intent|key=value" format.
+
+Accepted input records (JSON list or JSONL):
+  - {"messages": [..., {"role": "user"}, {"role": "assistant", "content": "<json>"}]}
+  - {"input"/"instruction"/"prompt": msg, "output"/"response"/"completion": <json str or dict>}
+  - {"text": msg, "label": intent}          (core/dataset style, no slots)
+
+Label-only records carry no slots, so they are only used with --teacher:
+the current JSON intent model is run on each message and its real output
+(slots included) is converted, provided its intent agrees with the label.
+Without --teacher they are skipped. Intents outside compact_intent.INTENTS
+are mapped through LABEL_ALIAS or dropped.
+
+Output is JSONL with {"user": msg, "output": compact_line}, which
+train_phi3_intent_compact.py turns into prompts via compact_intent.format_prompt.
+--tokenizer reports decoded-token savings against those real JSON outputs.
+
+Usage:
+  python core/convert_intent_dataset_compact.py core/dataset/*.json -o dataset/intent_compact.jsonl --teacher core/merged_phi3_intent
+  python core/convert_intent_dataset_compact.py data.jsonl -o out.jsonl --tokenizer core/merged_phi3_intent
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.compact_intent import INTENTS, encode_compact  # noqa: E402
+
+# Labels used by the BERT datasets → intent names the Phi-3 model emits.
+# Holiday, balance and policy questions reach their handlers as "general".
+LABEL_ALIAS = {
+    "apply_gatepass": "apply_gate_pass",
+    "apply_missed_punch": "apply_miss_punch",
+    "holiday_list": "general",
+    "leave_balance": "general",
+    "privacy_policy": "general",
+}
+
+USER_KEYS = ["input", "instruction", "prompt", "user", "text"]
+OUTPUT_KEYS = ["output", "response", "completion", "assistant"]
+
+
+def load_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("train") or data.get("data") or []
+    return data if isinstance(data, list) else []
+
+
+def parse_output(value):
+    if isinstance(value, dict):
+        return value
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def prompt_intent(label):
+    """Map a dataset label to an intent from INTENTS, or None."""
+    intent = LABEL_ALIAS.get((label or "").strip().lower(), (label or "").strip().lower())
+    return intent if intent in INTENTS else None
+
+
+def compact_from_output(data):
+    """Compact line for a JSON model output, or None if its intent is unknown."""
+    intent = prompt_intent(data.get("intent"))
+    if not intent:
+        return None
+    return encode_compact({**data, "intent": intent})
+
+
+def convert_record(record):
+    """
+    Return (user_msg, old_output_text, compact_line) for records that carry
+    a real model output, ("label", user_msg, intent) for label-only ones,
+    or None.
+    """
+    if "messages" in record:
+        user = next((m["content"] for m in reversed(record["messages"]) if m.get("role") == "user"), "")
+        old = next((m["content"] for m in reversed(record["messages"]) if m.get("role") == "assistant"), "")
+        data = parse_output(old)
+        compact = compact_from_output(data) if isinstance(data, dict) else None
+        if user and compact:
+            return user, old, compact
+        return None
+
+    if "label" in record and "text" in record:
+        intent = prompt_intent(record["label"])
+        if record["text"] and intent:
+            return "label", record["text"], intent
+        return None
+
+    user = next((record[k] for k in USER_KEYS if record.get(k)), "")
+    raw = next((record[k] for k in OUTPUT_KEYS if record.get(k)), None)
+    data = parse_output(raw)
+    compact = compact_from_output(data) if isinstance(data, dict) else None
+    if user and compact:
+        old = raw if isinstance(raw, str) else json.dumps(raw, indent=2)
+        return user, old, compact
+    return None
+
+
+def teacher_outputs(model_dir, labelled):
+    """
+    Run the JSON intent model in model_dir over (user_msg, intent) pairs and
+    yield (user_msg, raw_output, compact_line) where it agrees with the label.
+    """
+    os.environ["FIXHR_INTENT_MODEL_DIR"] = model_dir
+    os.environ["FIXHR_INTENT_FORMAT"] = "json"
+    from core import phi3_inference_v3 as teacher
+
+    for user, intent in labelled:
+        raw = teacher.generate_json(teacher.TOKENIZER, teacher.MODEL, teacher.make_prompt(user, "json"), teacher.DEVICE)
+        data = teacher.fix_json_string(raw)
+        compact = compact_from_output(data) if isinstance(data, dict) else None
+        if compact and compact.split("|", 1)[0] == intent:
+            yield user, raw, compact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert intent data to the compact output format")
+    parser.add_argument("inputs", nargs="+")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--tokenizer", help="report decoded-token savings with this tokenizer")
+    parser.add_argument("--teacher", help="JSON intent model used to fill slots for label-only records")
+    args = parser.parse_args()
+
+    rows, labelled, skipped, seen = [], [], 0, set()
+
+    def add(user, old, compact):
+        key = (user.strip().lower(), compact)
+        if key not in seen:
+            seen.add(key)
+            rows.append((user, old, compact))
+
+    for path in args.inputs:
+        for record in load_records(path):
+            converted = convert_record(record)
+            if not converted:
+                skipped += 1
+            elif converted[0] == "label":
+                labelled.append(converted[1:])
+            else:
+                add(*converted)
+
+    if labelled and args.teacher:
+        kept = 0
+        for row in teacher_outputs(args.teacher, labelled):
+            add(*row)
+            kept += 1
+        print(f"🧑‍🏫 Teacher agreed with {kept}/{len(labelled)} label-only records")
+        skipped += len(labelled) - kept
+    elif labelled:
+        print(f"⚠️ Skipped {len(labelled)} label-only records (no slots); pass --teacher to use them")
+        skipped += len(labelled)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        for user, _, compact in rows:
+            f.write(json.dumps({"user": user, "output": compact}, ensure_ascii=False) + "\n")
+
+    print(f"✅ Wrote {len(rows)} records to {args.output} ({skipped} skipped)")
+
+    tokenizer_dir = args.tokenizer or args.teacher
+    if tokenizer_dir and rows:
+        from transformers import AutoTokenizer
+        tok = AutoTokenizer.from_pretrained(tokenizer_dir, trust_remote_code=True)
+        old_tokens = sum(len(tok(old)["input_ids"]) for _, old, _ in rows) / len(rows)
+        new_tokens = sum(len(tok(compact)["input_ids"]) for _, _, compact in rows) / len(rows)
+        print(f"📉 Avg output tokens: {old_tokens:.1f} (json) → {new_tokens:.1f} (compact)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# core/cpu_tuning.py
+"""
+Startup CPU threading auto-tuner for torch inference.
+
+Every Django worker loads its own copy of the Phi-3 models. With torch's
+default intra-op thread count each worker tries to use every core, so
+N workers on one box oversubscribe the CPU and `generate` gets slower.
+
+autotune() runs a short calibration generate at a few thread settings,
+keeps the fastest one for this worker's share of the cores and can
+optionally pin the worker to a disjoint core set.
+
+Environment knobs:
+    FIXHR_CPU_AUTOTUNE   "0" disables tuning (default on for CPU inference)
+    FIXHR_WORKERS        worker processes on this box (falls back to WEB_CONCURRENCY)
+    FIXHR_WORKER_INDEX   explicit worker slot, otherwise a free slot is claimed
+    FIXHR_CPU_PIN        "1" pins this worker to its own core set
+    FIXHR_CPU_THREADS    force an intra-op thread count and skip calibration
+"""
+
+import os
+import time
+import tempfile
+
+import torch
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes
+    fcntl = None
+
+
+CALIBRATION_ROUNDS = 2
+
+# Chosen configuration, reported by model_status_api
+CPU_CONFIG = {
+    "tuned": False,
+    "reason": "not run",
+}
+
+# Keeps the worker slot lock alive for the lifetime of the process
+_SLOT_HANDLE = None
+
+
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def available_cores():
+    """Cores this process may run on (respects cgroup / taskset limits)."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def detect_worker_count():
+    return max(1, _env_int("FIXHR_WORKERS", _env_int("WEB_CONCURRENCY", 1)))
+
+
+def claim_worker_slot(worker_count):
+    """
+    Return this worker's index in [0, worker_count).
+
+    Gunicorn/uvicorn do not hand workers an index, so each worker grabs the
+    first free lock file in the temp dir and holds it until it exits.
+    """
+    global _SLOT_HANDLE
+
+    explicit = _env_int("FIXHR_WORKER_INDEX")
+    if explicit is not None:
+        return explicit % worker_count
+
+    if fcntl is None:
+        return os.getpid() % worker_count
+
+    for slot in range(worker_count):
+        path = os.path.join(tempfile.gettempdir(), f"fixhr_cpu_slot_{slot}.lock")
+        handle = open(path, "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _SLOT_HANDLE = handle
+        return slot
+
+    return os.getpid() % worker_count
+
+
+def worker_core_set(cores, worker_count, slot):
+    """Split the available cores into disjoint, contiguous per-worker sets."""
+    cores = sorted(cores)
+    per_worker = max(1, len(cores) // worker_count)
+    start = (slot * per_worker) % len(cores)
+    return cores[start:start + per_worker] or cores[:per_worker]
+
+
+def candidate_thread_counts(per_worker):
+    counts = {per_worker, max(1, per_worker // 2), max(1, per_worker - 1), 1}
+    return sorted(counts, reverse=True)
+
+
+def _set_interop_threads(count):
+    """
+    torch only allows the inter-op pool size to be set before any
+    inter-op work has started, so this is best effort and done once.
+    """
+    try:
+        torch.set_num_interop_threads(count)
+        return count
+    except RuntimeError:
+        return torch.get_num_interop_threads()
+
+
+def _time_call(run_once):
+    best = None
+    for _ in range(CALIBRATION_ROUNDS):
+        start = time.perf_counter()
+        run_once()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def autotune(run_once, label="model"):
+    """
+    Pick intra-op/inter-op thread counts for this worker.
+
+    `run_once` is a zero-argument callable doing one short generate; it is
+    timed for every candidate and the fastest setting is kept.
+    """
+    if os.environ.get("FIXHR_CPU_AUTOTUNE", "1") == "0":
+        CPU_CONFIG.update({"tuned": False, "reason": "disabled"})
+        return CPU_CONFIG
+
+    cores = available_cores()
+    worker_count = detect_worker_count()
+    slot = claim_worker_slot(worker_count)
+    per_worker = max(1, len(cores) // worker_count)
+
+    pinned = []
+    if os.environ.get("FIXHR_CPU_PIN") == "1" and hasattr(os, "sched_setaffinity"):
+        pinned = worker_core_set(cores, worker_count, slot)
+        try:
+            os.sched_setaffinity(0, pinned)
+        except OSError as exc:
+            print(f"!! [cpu_tuning] Could not pin worker {slot} to {pinned}: {exc}")
+            pinned = []
+
+    interop = _set_interop_threads(1 if per_worker <= 4 else 2)
+
+    forced = _env_int("FIXHR_CPU_THREADS")
+    timings = {}
+    if forced:
+        best_threads = forced
+    else:
+        for threads in candidate_thread_counts(per_worker):
+            torch.set_num_threads(threads)
+            try:
+                timings[threads] = round(_time_call(run_once), 4)
+            except Exception as exc:
+                print(f"!! [cpu_tuning] Calibration failed at {threads} threads: {exc}")
+        best_threads = min(timings, key=timings.get) if timings else per_worker
+
+    torch.set_num_threads(best_threads)
+
+    CPU_CONFIG.clear()
+    CPU_CONFIG.update({
+        "tuned": True,
+        "reason": "forced" if forced else "calibrated",
+        "model": label,
+        "cores_detected": len(cores),
+        "workers": worker_count,
+        "worker_slot": slot,
+        "intra_op_threads": best_threads,
+        "inter_op_threads": interop,
+        "pinned_cores": pinned,
+        "calibration_seconds": timings,
+    })
+    print(f">> [cpu_tuning] {label}: {best_threads} intra-op / {interop} inter-op threads "
+          f"(worker {slot + 1}/{worker_count}, {len(cores)} cores)")
+    return CPU_CONFIG
+
+
+def get_cpu_config():
+    return dict(CPU_CONFIG)
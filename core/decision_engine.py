@@ -11,7 +11,8 @@ Full AI Engine Pack for FixHR-GPT:
 from datetime import datetime, timedelta
 import re
 import dateparser
-import requests
+from core.fixhr_client import endpoint_url
+from core.apply_queue import apply_queue
 import json
 import logging
 
@@ -387,11 +388,10 @@ def smart_range_normalizer(message: str):
 # ----------------------------
 # 4) Safe apply_leave_nlp
 # ----------------------------
-# Requires LEAVE_APPLY_URL to be set in your views module or environment.
-# It POSTs form-encoded data to the FixHR API (same as your previous implementation).
-LEAVE_APPLY_URL = "https://dev.fixhr.app/api/admin/attendance/employee_leave"
+# Hands the payload to core.apply_queue, which POSTs it through the shared client.
+LEAVE_APPLY_URL = endpoint_url("leave_apply")
 
-def apply_leave_nlp(info: dict, token: str, user_id=None, user_message="") -> dict:
+def apply_leave_nlp(info: dict, token: str, user_id=None, user_message="", business_id=None) -> dict:
     """
     Safely apply leave using LLM-decoded info + smart date extractor.
     """
@@ -454,20 +454,8 @@ def apply_leave_nlp(info: dict, token: str, user_id=None, user_message="") -> di
         "reason": reason,
     }
 
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "authorization": f"Bearer {token}"
-    }
-
-    try:
-        r = requests.post(LEAVE_APPLY_URL, headers=headers, data=payload, timeout=15)
-        try:
-            data = r.json()
-        except:
-            data = {"status": False, "message": r.text}
-    except Exception as e:
-        data = {"status": False, "message": str(e)}
+    # Queued; core.apply_queue posts it and refreshes the balance
+    data = apply_queue.submit("leave", payload, token, user_id, business_id)
 
     # 6) SAVE MEMORY
     if user_id:
@@ -480,6 +468,7 @@ def apply_leave_nlp(info: dict, token: str, user_id=None, user_message="") -> di
     return {
         "ok": bool(data.get("status")),
         "api_raw": data,
+        "job": data.get("job"),
         "date": f"{start_date} → {end_date}",
         "leave_type": leave_type,
         "reason": reason
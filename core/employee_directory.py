@@ -0,0 +1,227 @@
+# core/employee_directory.py
+"""
+Per-business employee directory for resolving names in chat messages.
+
+"attendance of priya" used to become a substring test against every
+employee row of every report. Now the names FixHR sends us (attendance
+months as core.attendance_store loads them, pending leave lists) are
+indexed once per business:
+
+  - a trie over normalized name tokens, so each query token is an O(k)
+    walk to the exact or prefix-matching employee IDs;
+  - a trigram index over the same tokens for typos ("priay", "sharmaa"),
+    scored by Dice similarity against FIXHR_NAME_MATCH_THRESHOLD.
+
+``resolve(business_id, phrase)`` intersects the ID sets of the phrase's
+tokens (a name word that rules out everyone the others matched means no
+match, not a dropped word) and returns a Resolution with the employee IDs, how they matched
+and, when several people match, the names to pick from. Reports then
+select rows by ID (MonthGrid.rows(ids=...)) instead of scanning names.
+
+Filler words and period words ("for", "this month", "november") are
+ignored, so "attendance for november" is not a name filter at all.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict, namedtuple
+
+MATCH_THRESHOLD = float(os.environ.get("FIXHR_NAME_MATCH_THRESHOLD", "0.5"))
+# Fuzzy candidates scoring this close to the best one are kept as alternatives
+FUZZY_MARGIN = 0.1
+MIN_TOKEN = 2
+
+STOPWORDS = {
+    "a", "an", "and", "the", "for", "of", "to", "in", "on", "at", "by", "from", "me", "my", "show", "get", "give",
+    "all", "everyone", "team", "whole", "entire", "full", "company", "sabhi", "poore", "employees",
+    "employee", "emp", "staff", "attendance", "report", "register", "details", "detail", "summary", "data",
+    "this", "last", "next", "previous", "current", "month", "week", "year", "quarter", "today", "yesterday",
+    "till", "until", "upto", "between", "mahine", "hafte", "ka", "ki", "ke", "ko", "dikhao", "batao", "nikal",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+    "november", "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+
+Resolution = namedtuple("Resolution", "ids method matches query")
+# query: the name words used; method: "exact", "prefix", "fuzzy", "none" (no employee matched) or "empty" (no name words at all)
+
+
+def normalize_name(value):
+    """Casefolded, accent-free, punctuation-free name with single spaces."""
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return " ".join(re.sub(r"[^\w]+|_", " ", text).split())
+
+
+def name_tokens(value):
+    return [t for t in normalize_name(value).split() if not t.isdigit()]
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Node:
+    __slots__ = ("children", "exact", "below")
+
+    def __init__(self):
+        self.children = {}
+        self.exact = set()   # IDs with a token ending here
+        self.below = set()   # IDs with a token in this subtree (prefix matches)
+
+
+class EmployeeDirectory:
+    def __init__(self):
+        self.names = {}                      # emp_id -> display name
+        self._tokens = {}                    # emp_id -> tuple of tokens
+        self._root = _Node()
+        self._grams = defaultdict(set)       # trigram -> tokens
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, emp_id, name):
+        """Index one employee; a changed name replaces the old one. Returns True if anything changed."""
+        emp_id = str(emp_id or "").strip()
+        tokens = tuple(name_tokens(name))
+        if not emp_id or not tokens:
+            return False
+        with self._lock:
+            if self._tokens.get(emp_id) == tokens:
+                return False
+            if emp_id in self._tokens:
+                self._remove(emp_id)
+            self.names[emp_id] = " ".join(str(name).split())
+            self._tokens[emp_id] = tokens
+            for token in set(tokens):
+                node = self._root
+                for ch in token:
+                    node = node.children.setdefault(ch, _Node())
+                    node.below.add(emp_id)
+                node.exact.add(emp_id)
+                for gram in trigrams(token):
+                    self._grams[gram].add(token)
+            return True
+
+    def _remove(self, emp_id):
+        for token in set(self._tokens.pop(emp_id)):
+            node = self._root
+            for ch in token:
+                node = node.children.get(ch)
+                if node is None:
+                    break
+                node.below.discard(emp_id)
+            else:
+                node.exact.discard(emp_id)
+        self.names.pop(emp_id, None)
+
+    def _node(self, token):
+        node = self._root
+        for ch in token:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def _fuzzy(self, token):
+        """{emp_id: score} for indexed tokens similar to `token`."""
+        grams = trigrams(token)
+        shared = defaultdict(int)
+        for gram in grams:
+            for candidate in self._grams.get(gram, ()):
+                shared[candidate] += 1
+        scored = {}
+        for candidate, common in shared.items():
+            score = 2 * common / (len(grams) + len(trigrams(candidate)))
+            if score >= MATCH_THRESHOLD:
+                for emp_id in self._node(candidate).exact:
+                    scored[emp_id] = max(scored.get(emp_id, 0.0), score)
+        return scored
+
+    def _token_ids(self, token):
+        """(ids, method) for one query token: exact, else prefix, else fuzzy."""
+        node = self._node(token)
+        if node is not None and node.exact:
+            return set(node.exact), "exact"
+        if node is not None and node.below and len(token) >= 3:
+            return set(node.below), "prefix"
+        scored = self._fuzzy(token)
+        if scored:
+            best = max(scored.values())
+            return {e for e, s in scored.items() if s >= best - FUZZY_MARGIN}, "fuzzy"
+        return set(), "none"
+
+    def resolve(self, phrase):
+        words = [t for t in name_tokens(phrase) if len(t) >= MIN_TOKEN and t not in STOPWORDS]
+        query = " ".join(words)
+        if not words:
+            return Resolution(frozenset(), "empty", [], query)
+        rank = {"exact": 0, "prefix": 1, "fuzzy": 2}
+        ids, method = None, "exact"
+        with self._lock:
+            for word in words:
+                found, how = self._token_ids(word)
+                if not found:
+                    # not a name anyone here has (e.g. a stray verb)
+                    continue
+                narrowed = found if ids is None else ids & found
+                if not narrowed and how != "fuzzy":
+                    # "priya singh" with no Priya Singh: maybe a typo of another
+                    # word of the same people, otherwise nobody matches
+                    narrowed = ids & set(self._fuzzy(word))
+                    how = "fuzzy"
+                if not narrowed:
+                    return Resolution(frozenset(), "none", [], query)
+                ids = narrowed
+                method = max(method, how, key=rank.get)
+            if not ids:
+                return Resolution(frozenset(), "none", [], query)
+            # "raj" -> Raj Kumar rather than Rajesh, when both exist
+            exact_words = [w for w in words if (node := self._node(w)) is not None and node.exact]
+            exact = {e for e in ids if all(w in self._tokens[e] for w in exact_words)} if exact_words else set()
+            if exact:
+                ids = exact
+            matches = sorted(((e, self.names[e]) for e in ids), key=lambda m: (m[1].casefold(), m[0].zfill(12)))
+        return Resolution(frozenset(ids), method, matches, query)
+
+
+class DirectoryRegistry:
+    """One EmployeeDirectory per business, filled from FixHR payloads as they pass through."""
+
+    def __init__(self):
+        self._directories = {}
+        self._lock = threading.Lock()
+
+    def for_business(self, business_id):
+        key = str(business_id or "")
+        with self._lock:
+            directory = self._directories.get(key)
+            if directory is None:
+                directory = self._directories[key] = EmployeeDirectory()
+            return directory
+
+    def observe(self, business_id, employees):
+        """Index (emp_id, name) pairs, e.g. MonthGrid.employees."""
+        directory = self.for_business(business_id)
+        for emp_id, name in employees:
+            directory.add(emp_id, name)
+
+    def observe_rows(self, business_id, rows):
+        """Index FixHR list rows that carry an employee id and name (rows without an id are skipped)."""
+        self.observe(business_id, (
+            (row.get("emp_id") or row.get("employee_id"), row.get("emp_name") or row.get("employee_name"))
+            for row in rows if isinstance(row, dict)
+        ))
+
+    def resolve(self, business_id, phrase):
+        return self.for_business(business_id).resolve(phrase)
+
+    def clear(self):
+        with self._lock:
+            self._directories.clear()
+
+
+employee_directory = DirectoryRegistry()
@@ -0,0 +1,54 @@
+# core/fast_json.py
+"""
+JSON responses for large payloads (attendance registers).
+
+JsonResponse goes through the stdlib encoder with ", "/": " separators
+and ASCII escaping of every Hindi name. FastJsonResponse encodes with
+orjson when it is installed (stdlib json with compact separators
+otherwise) and gzips the body when the client sends
+``Accept-Encoding: gzip`` and the body is at least
+FIXHR_GZIP_MIN_BYTES long:
+
+    return FastJsonResponse(request, payload)
+"""
+
+import json
+import os
+import re
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is used instead
+    orjson = None
+
+GZIP_MIN_BYTES = int(os.environ.get("FIXHR_GZIP_MIN_BYTES", "1024"))
+_ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+
+def dumps(obj):
+    """UTF-8 JSON bytes without whitespace."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def accepts_gzip(request):
+    return bool(_ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", "")))
+
+
+class FastJsonResponse(HttpResponse):
+    def __init__(self, request, data, content_type="application/json", **kwargs):
+        body = dumps(data)
+        gzipped = False
+        if len(body) >= GZIP_MIN_BYTES and accepts_gzip(request):
+            compressed = compress_string(body)
+            if len(compressed) < len(body):
+                body, gzipped = compressed, True
+        super().__init__(content=body, content_type=content_type, **kwargs)
+        patch_vary_headers(self, ("Accept-Encoding",))
+        if gzipped:
+            self["Content-Encoding"] = "gzip"
@@ -0,0 +1,258 @@
+# core/fixhr_cache.py
+"""
+TTL response cache for FixHR read endpoints, used by core.fixhr_client.
+
+Each cacheable endpoint has a CachePolicy: ``ttl`` seconds fresh, then
+``stale_ttl`` more seconds during which the cached response is still
+served while one background refresh runs (stale-while-revalidate).
+
+Keys are ``fixhr:<endpoint>:<scope>:v<version>:<params hash>``. The scope is
+a hash of the bearer token by default; callers can pass an explicit scope
+such as ``emp:<employee_id>:biz:<business_id>``. Invalidation bumps the
+version of an (endpoint, scope) pair, which works the same on both
+backends:
+
+    FIXHR_CACHE_BACKEND=local   in-process LRU (default)
+    FIXHR_CACHE_BACKEND=django  django.core.cache (FIXHR_CACHE_ALIAS, default "default"),
+                                shared across workers with Redis/Memcached
+    FIXHR_CACHE_BACKEND=off     no caching
+
+Per-endpoint hit rates are available from ``response_cache.stats()``.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+
+import requests
+
+CachePolicy = namedtuple("CachePolicy", ["ttl", "stale_ttl"])
+
+# Read endpoints only; seconds fresh / extra seconds served stale
+CACHE_POLICIES = {
+    "leave_balance": CachePolicy(60, 300),
+    "holiday": CachePolicy(6 * 3600, 24 * 3600),
+    "leave_list": CachePolicy(30, 120),
+    "missed_punch_list": CachePolicy(30, 120),
+    "gatepass_approval_list": CachePolicy(15, 60),
+    "missed_punch_approval_list": CachePolicy(15, 60),
+}
+
+# Successful writes drop the caller's cached reads that they change
+WRITE_INVALIDATES = {
+    "leave_apply": ["leave_list", "leave_balance"],
+    "missed_punch_apply": ["missed_punch_list"],
+    "approval_handler": ["leave_list", "gatepass_approval_list", "missed_punch_approval_list"],
+}
+
+LOCAL_CACHE_SIZE = int(os.environ.get("FIXHR_CACHE_SIZE", "2048"))
+
+
+class CachedResponse:
+    """The part of the requests/httpx Response API the handlers use."""
+
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = dict(headers or {})
+
+    @classmethod
+    def from_response(cls, response):
+        return cls(response.status_code, response.content, response.headers)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error (cached)")
+
+
+class LocalLRUBackend:
+    def __init__(self, max_entries=LOCAL_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + timeout if timeout else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def incr(self, key):
+        with self._lock:
+            value, _ = self._data.get(key, (0, None))
+            self._data[key] = (value + 1, None)
+            self._data.move_to_end(key)
+            return value + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    def __init__(self, alias=None):
+        self.alias = alias or os.environ.get("FIXHR_CACHE_ALIAS", "default")
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, timeout)
+
+    def incr(self, key):
+        cache = self.cache
+        cache.add(key, 0, None)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+            return 1
+
+    def clear(self):
+        self.cache.clear()
+
+
+def token_scope(token):
+    # Never put the raw bearer token in a cache key
+    return "tok:" + hashlib.sha256((token or "").encode()).hexdigest()[:16]
+
+
+def _params_digest(params):
+    if not params:
+        return "-"
+    items = sorted((str(k), str(v)) for k, v in dict(params).items())
+    return hashlib.sha1(json.dumps(items).encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    def __init__(self, backend=None, policies=None):
+        self.backend = backend
+        self.policies = CACHE_POLICIES if policies is None else policies
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0})
+
+    def enabled_for(self, name):
+        return self.backend is not None and name in self.policies
+
+    def _count(self, name, field):
+        with self._lock:
+            self._stats[name][field] += 1
+
+    def key(self, name, scope, params):
+        version = self.backend.get(f"fixhr:ver:{name}:{scope}") or 0
+        return f"fixhr:{name}:{scope}:v{version}:{_params_digest(params)}"
+
+    def lookup(self, name, key):
+        """Return (state, response): state is "fresh", "stale" or "miss"."""
+        entry = self.backend.get(key)
+        if entry is None:
+            self._count(name, "misses")
+            return "miss", None
+
+        stored_at, response = entry
+        if time.time() - stored_at < self.policies[name].ttl:
+            self._count(name, "hits")
+            return "fresh", response
+        self._count(name, "stale_hits")
+        return "stale", response
+
+    def store(self, name, key, response):
+        """Cache 200 responses; returns the cached copy (or the response as is)."""
+        if response.status_code != 200:
+            return response
+        cached = CachedResponse.from_response(response)
+        policy = self.policies[name]
+        self.backend.set(key, (time.time(), cached), policy.ttl + policy.stale_ttl)
+        return cached
+
+    def claim_refresh(self, key):
+        """True if the caller should run the background refresh for `key`."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def finish_refresh(self, name, key, ok):
+        with self._lock:
+            self._refreshing.discard(key)
+            self._stats[name]["refreshes" if ok else "refresh_errors"] += 1
+
+    def invalidate(self, name, scope):
+        if self.backend is not None:
+            self.backend.incr(f"fixhr:ver:{name}:{scope}")
+
+    def generation(self, group):
+        """Counter callers fold into their scope to invalidate a whole group."""
+        if self.backend is None:
+            return 0
+        return self.backend.get(f"fixhr:gen:{group}") or 0
+
+    def bump_generation(self, group):
+        if self.backend is not None:
+            self.backend.incr(f"fixhr:gen:{group}")
+
+    def invalidate_after_write(self, name, scope):
+        for target in WRITE_INVALIDATES.get(name, []):
+            if target in self.policies:
+                self.invalidate(target, scope)
+
+    def stats(self):
+        with self._lock:
+            rows = {name: dict(values) for name, values in self._stats.items()}
+        for values in rows.values():
+            lookups = values["hits"] + values["stale_hits"] + values["misses"]
+            values["hit_rate"] = round((values["hits"] + values["stale_hits"]) / lookups, 3) if lookups else 0.0
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "endpoints": rows,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def build_backend(kind=None):
+    kind = (kind or os.environ.get("FIXHR_CACHE_BACKEND", "local")).lower()
+    if kind == "off":
+        return None
+    if kind == "django":
+        return DjangoCacheBackend()
+    return LocalLRUBackend()
+
+
+response_cache = ResponseCache(build_backend())
@@ -0,0 +1,490 @@
+# core/fixhr_client.py
+"""
+Shared FixHR HTTP client.
+
+One pooled requests.Session per process (keep-alive, so dev.fixhr.app only
+pays the TCP/TLS handshake once per connection), one registry of endpoint
+URLs, per-endpoint timeouts, auth headers built in one place and retries
+with jittered exponential backoff for idempotent endpoints only.
+
+    from core.fixhr_client import fixhr
+
+    r = fixhr.get("leave_balance", token=token)
+    r = fixhr.post("leave_apply", token=token, data=payload, form=True)
+
+Both return the plain requests.Response, so handlers keep their
+status/JSON handling.
+
+AsyncFixHRClient (``afixhr``) is the httpx-based twin used by the async
+chat view on ASGI: same endpoints, headers and retry policy, one pooled
+httpx.AsyncClient per event loop, closed when that loop shuts down.
+
+    r = await afixhr.get("leave_balance", token=token)
+
+List endpoints are paginated (FixHR/Laravel ``result.data`` plus
+``total``/``last_page``). ``get_all_pages`` reads page 1, works out the page
+count and fetches the remaining pages concurrently, PAGE_FANOUT at a time:
+
+    rows, total = fixhr.get_all_pages("leave_list", token=token)
+
+It stops after FIXHR_MAX_PAGES pages; ``total`` is still what FixHR
+reports, so ``len(rows) < total`` means the list was cut short and the
+caller has to say so.
+
+Every call goes through core.fixhr_resilience: a per-endpoint circuit
+breaker, hedged idempotent GETs and the caller's latency budget.
+
+Read endpoints listed in core.fixhr_cache.CACHE_POLICIES are served from
+the TTL response cache (pass ``use_cache=False`` to bypass it, ``scope=``
+to key by employee/business instead of the token). Successful writes
+invalidate the caller's affected reads.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+import weakref
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.fixhr_cache import response_cache, token_scope
+from core.fixhr_resilience import budget_allows, call_timeout, inherit_budget, no_budget, resilience
+from core.stage_timing import timed_stage
+
+logger = logging.getLogger(__name__)
+
+FIXHR_BASE_URL = os.environ.get("FIXHR_BASE_URL", "https://dev.fixhr.app").rstrip("/")
+
+CONNECT_TIMEOUT = 3.05
+POOL_SIZE = int(os.environ.get("FIXHR_POOL_SIZE", "20"))
+ASYNC_POOL_SIZE = int(os.environ.get("FIXHR_ASYNC_POOL_SIZE", "200"))
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.3
+RETRY_STATUSES = {502, 503, 504}
+# List endpoints: rows per page, pages fetched at once, and a hard stop
+PAGE_LIMIT = int(os.environ.get("FIXHR_PAGE_LIMIT", "50"))
+PAGE_FANOUT = int(os.environ.get("FIXHR_PAGE_FANOUT", "4"))
+MAX_PAGES = int(os.environ.get("FIXHR_MAX_PAGES", "20"))
+
+Endpoint = namedtuple("Endpoint", ["path", "method", "timeout", "idempotent"])
+
+# name -> (path, method, read timeout seconds, safe to retry)
+ENDPOINTS = {
+    "login": Endpoint("/api/auth/login", "POST", 15, False),
+    "gatepass_apply": Endpoint("/api/admin/attendance/gate_pass", "POST", 15, False),
+    "gatepass_list": Endpoint("/api/admin/attendance/gate_pass", "GET", 15, True),
+    "gatepass_approval_list": Endpoint("/api/admin/attendance/gate_pass_approval", "GET", 15, True),
+    "approval_check": Endpoint("/api/admin/approval/approval_check", "POST", 15, False),
+    "approval_handler": Endpoint("/api/admin/approval/approval_handler", "POST", 15, False),
+    "leave_apply": Endpoint("/api/admin/attendance/employee_leave", "POST", 15, False),
+    "leave_list": Endpoint("/api/admin/attendance/employee_leave", "GET", 15, True),
+    "missed_punch_list": Endpoint("/api/admin/attendance/mis_punch", "GET", 15, True),
+    "missed_punch_apply": Endpoint("/api/admin/attendance/mis_punch_store", "POST", 15, False),
+    "missed_punch_approval_list": Endpoint("/api/admin/attendance/mis_punch/approval", "GET", 15, True),
+    "get_in_out_time": Endpoint("/api/admin/attendance/get_in_out_time", "GET", 10, True),
+    "leave_balance": Endpoint("/api/admin/attendance/get-leave-balance", "GET", 15, True),
+    "holiday": Endpoint("/api/admin/attendance/get_data_for_type", "GET", 10, True),
+    "attendance": Endpoint("/api/admin/attendance/attendance-report/monthly-attendance-detail", "GET", 20, True),
+    "privacy_policy": Endpoint("/api/admin/privacy-policy", "GET", 15, True),
+    "payslip": Endpoint("/api/admin/payroll/generate_emp_payslip", "GET", 15, True),
+}
+
+
+def endpoint_url(name):
+    return FIXHR_BASE_URL + ENDPOINTS[name].path
+
+
+def auth_headers(token=None, form=False):
+    headers = {"Accept": "application/json"}
+    if token:
+        headers["authorization"] = f"Bearer {token}"
+    if form:
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    return headers
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE):
+    """Full-jitter exponential backoff: uniform(0, base * 2^attempt)."""
+    return random.uniform(0, base * (2 ** attempt))
+
+
+def page_rows(response, rows_key="data"):
+    """(rows, page_count, total) from one page of a FixHR list response."""
+    payload = response.json() if response.content else {}
+    result = payload.get("result") if isinstance(payload, dict) else None
+    if not isinstance(result, dict):
+        return [], 1, 0
+    rows = result.get(rows_key) or []
+    total = int(result.get("total") or len(rows))
+    pages = result.get("last_page")
+    if not pages:
+        per_page = int(result.get("per_page") or 0)
+        pages = math.ceil(total / per_page) if per_page else 1
+    return rows, max(int(pages), 1), total
+
+
+def _page_params(params, page, limit):
+    return {**(params or {}), "page": page, "limit": limit}
+
+
+class FixHRClient:
+    def __init__(self, base_url=FIXHR_BASE_URL, pool_size=POOL_SIZE, max_retries=MAX_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pages = ThreadPoolExecutor(max_workers=PAGE_FANOUT, thread_name_prefix="fixhr-pages")
+        # runs hedged GETs: the original and, past the p95, its twin
+        self._hedges = ThreadPoolExecutor(max_workers=max(2 * pool_size, 8), thread_name_prefix="fixhr-hedge")
+
+    # A Session must not be shared across fork(), so rebuild it per process
+    @property
+    def session(self):
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+                    self._pid = os.getpid()
+        return self._session
+
+    def url(self, name):
+        return self.base_url + ENDPOINTS[name].path
+
+    @timed_stage("fixhr")
+    def request(self, name, token=None, params=None, data=None, headers=None, form=False, timeout=None,
+                scope=None, use_cache=True):
+        endpoint = ENDPOINTS[name]
+        scope = scope or token_scope(token or (headers or {}).get("authorization"))
+        send_args = (name, token, params, data, headers, form, timeout)
+
+        if endpoint.method == "GET" and use_cache and response_cache.enabled_for(name):
+            key = response_cache.key(name, scope, params)
+            state, cached = response_cache.lookup(name, key)
+            if state == "stale" and response_cache.claim_refresh(key):
+                threading.Thread(target=self._refresh, args=(key, send_args), daemon=True).start()
+            if cached is not None:
+                return cached
+            return response_cache.store(name, key, self._send(*send_args))
+
+        response = self._send(*send_args)
+        if endpoint.method == "POST" and response.status_code < 400:
+            response_cache.invalidate_after_write(name, scope)
+        return response
+
+    def _refresh(self, key, send_args):
+        name = send_args[0]
+        ok = False
+        try:
+            ok = response_cache.store(name, key, self._send(*send_args)).status_code == 200
+        except Exception as exc:
+            logger.warning("FixHR %s background refresh failed: %s", name, exc)
+        finally:
+            response_cache.finish_refresh(name, key, ok)
+
+    def _send(self, name, token=None, params=None, data=None, headers=None, form=False, timeout=None):
+        endpoint = ENDPOINTS[name]
+        merged_headers = auth_headers(token, form=form)
+        if headers:
+            merged_headers.update(headers)
+        breaker = resilience.breaker(name)
+
+        retries = self.max_retries if endpoint.idempotent else 0
+        for attempt in range(retries + 1):
+            read_timeout = call_timeout(name, timeout or endpoint.timeout)
+            breaker.before_call()
+            started = time.monotonic()
+            try:
+                args = (endpoint.method, self.url(name), params, data, merged_headers, read_timeout)
+                if endpoint.idempotent and endpoint.method == "GET":
+                    response = self._hedged(name, args)
+                else:
+                    response = self._request_once(*args)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                breaker.record(False)
+                delay = backoff_delay(attempt)
+                if attempt >= retries or not budget_allows(delay):
+                    raise
+                logger.warning("FixHR %s failed (%s), retry %d/%d", name, exc, attempt + 1, retries)
+                time.sleep(delay)
+                continue
+            except requests.RequestException:
+                breaker.record(False)
+                raise
+            except BaseException:
+                # never leave a half-open breaker waiting for a probe that is gone
+                breaker.release()
+                raise
+
+            elapsed = time.monotonic() - started
+            breaker.record(response.status_code < 500, elapsed)
+            if response.status_code < 500:
+                resilience.latency(name).add(elapsed)
+            delay = backoff_delay(attempt)
+            if response.status_code in RETRY_STATUSES and attempt < retries and budget_allows(delay):
+                logger.warning("FixHR %s returned %s, retry %d/%d", name, response.status_code, attempt + 1, retries)
+                time.sleep(delay)
+                continue
+            return response
+
+    def _request_once(self, method, url, params, data, headers, read_timeout):
+        return self.session.request(
+            method, url, params=params, data=data, headers=headers,
+            timeout=(min(CONNECT_TIMEOUT, read_timeout), read_timeout),
+        )
+
+    def _hedged(self, name, args):
+        """Send `args`; if no answer by the endpoint's p95, send it again and take the first good response."""
+        delay = resilience.hedge_delay(name)
+        if delay is None:
+            return self._request_once(*args)
+
+        first = self._hedges.submit(self._request_once, *args)
+        try:
+            return first.result(timeout=delay)
+        except FuturesTimeout:
+            pass
+
+        resilience.count_hedge(name)
+        second = self._hedges.submit(self._request_once, *args)
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        resilience.count_hedge(name, won=True)
+                    return future.result()
+        return first.result()
+
+    def get(self, name, token=None, params=None, **kwargs):
+        return self.request(name, token=token, params=params, **kwargs)
+
+    def post(self, name, token=None, data=None, params=None, **kwargs):
+        return self.request(name, token=token, data=data, params=params, **kwargs)
+
+    @timed_stage("fixhr")
+    def get_all_pages(self, name, token=None, params=None, rows_key="data", limit=PAGE_LIMIT, max_pages=MAX_PAGES,
+                      **kwargs):
+        """All rows of a paginated list, in page order: (rows, total); fewer rows than total past max_pages."""
+        first = self.get(name, token=token, params=_page_params(params, 1, limit), **kwargs)
+        first.raise_for_status()
+        rows, pages, total = page_rows(first, rows_key)
+        if pages > max_pages:
+            logger.warning("FixHR %s has %d pages, reading the first %d", name, pages, max_pages)
+
+        def fetch(page):
+            r = self.get(name, token=token, params=_page_params(params, page, limit), **kwargs)
+            r.raise_for_status()
+            return page_rows(r, rows_key)[0]
+
+        for more in self._pages.map(inherit_budget(fetch), range(2, min(pages, max_pages) + 1)):
+            rows.extend(more)
+        return rows, max(total, len(rows))
+
+
+class AsyncFixHRClient:
+    def __init__(self, base_url=FIXHR_BASE_URL, pool_size=ASYNC_POOL_SIZE, max_retries=MAX_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        # httpx.AsyncClient is bound to the loop it was created on
+        self._clients = weakref.WeakKeyDictionary()
+        # loop -> suspended _close_with_loop generator of its client
+        self._closers = weakref.WeakKeyDictionary()
+        # strong refs to background refresh tasks
+        self._tasks = set()
+
+    async def client(self):
+        """This loop's pooled client; it is closed when the loop shuts down."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=POOL_SIZE),
+            )
+            self._clients[loop] = client
+            closer = self._close_with_loop(client)
+            await closer.__anext__()
+            self._closers[loop] = closer
+        return client
+
+    @staticmethod
+    async def _close_with_loop(client):
+        # Left suspended at the yield: asyncio.run and asgiref's async_to_sync (an async view
+        # under WSGI gets a fresh loop per request) call loop.shutdown_asyncgens() before
+        # closing a loop, which runs the finally and releases the client's connections
+        try:
+            yield
+        finally:
+            await client.aclose()
+
+    async def aclose(self):
+        """Close this loop's client now (tests, management commands)."""
+        loop = asyncio.get_running_loop()
+        closer = self._closers.pop(loop, None)
+        self._clients.pop(loop, None)
+        if closer is not None:
+            await closer.aclose()
+
+    def url(self, name):
+        return self.base_url + ENDPOINTS[name].path
+
+    @timed_stage("fixhr")
+    async def request(self, name, token=None, params=None, data=None, headers=None, form=False, timeout=None,
+                      scope=None, use_cache=True):
+        endpoint = ENDPOINTS[name]
+        scope = scope or token_scope(token or (headers or {}).get("authorization"))
+        send_args = (name, token, params, data, headers, form, timeout)
+
+        if endpoint.method == "GET" and use_cache and response_cache.enabled_for(name):
+            key = response_cache.key(name, scope, params)
+            state, cached = response_cache.lookup(name, key)
+            if state == "stale" and response_cache.claim_refresh(key):
+                task = asyncio.get_running_loop().create_task(self._refresh(key, send_args))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            if cached is not None:
+                return cached
+            return response_cache.store(name, key, await self._send(*send_args))
+
+        response = await self._send(*send_args)
+        if endpoint.method == "POST" and response.status_code < 400:
+            response_cache.invalidate_after_write(name, scope)
+        return response
+
+    async def _refresh(self, key, send_args):
+        name = send_args[0]
+        ok = False
+        try:
+            # the task copied the request's context; a refresh has no deadline
+            with no_budget():
+                response = await self._send(*send_args)
+            ok = response_cache.store(name, key, response).status_code == 200
+        except Exception as exc:
+            logger.warning("FixHR %s background refresh failed: %s", name, exc)
+        finally:
+            response_cache.finish_refresh(name, key, ok)
+
+    async def _send(self, name, token=None, params=None, data=None, headers=None, form=False, timeout=None):
+        endpoint = ENDPOINTS[name]
+        merged_headers = auth_headers(token, form=form)
+        if headers:
+            merged_headers.update(headers)
+        breaker = resilience.breaker(name)
+
+        retries = self.max_retries if endpoint.idempotent else 0
+        for attempt in range(retries + 1):
+            read_timeout = call_timeout(name, timeout or endpoint.timeout)
+            breaker.before_call()
+            started = time.monotonic()
+            try:
+                args = (endpoint.method, self.url(name), params, data, merged_headers, read_timeout)
+                if endpoint.idempotent and endpoint.method == "GET":
+                    response = await self._hedged(name, args)
+                else:
+                    response = await self._request_once(*args)
+            except httpx.TransportError as exc:
+                breaker.record(False)
+                delay = backoff_delay(attempt)
+                if attempt >= retries or not budget_allows(delay):
+                    raise
+                logger.warning("FixHR %s failed (%s), retry %d/%d", name, exc, attempt + 1, retries)
+                await asyncio.sleep(delay)
+                continue
+            except httpx.HTTPError:
+                breaker.record(False)
+                raise
+            except BaseException:
+                # e.g. CancelledError when the client disconnects mid-probe
+                breaker.release()
+                raise
+
+            elapsed = time.monotonic() - started
+            breaker.record(response.status_code < 500, elapsed)
+            if response.status_code < 500:
+                resilience.latency(name).add(elapsed)
+            delay = backoff_delay(attempt)
+            if response.status_code in RETRY_STATUSES and attempt < retries and budget_allows(delay):
+                logger.warning("FixHR %s returned %s, retry %d/%d", name, response.status_code, attempt + 1, retries)
+                await asyncio.sleep(delay)
+                continue
+            return response
+
+    async def _request_once(self, method, url, params, data, headers, read_timeout):
+        client = await self.client()
+        return await client.request(
+            method, url, params=params, data=data, headers=headers,
+            timeout=httpx.Timeout(read_timeout, connect=min(CONNECT_TIMEOUT, read_timeout)),
+        )
+
+    async def _hedged(self, name, args):
+        delay = resilience.hedge_delay(name)
+        if delay is None:
+            return await self._request_once(*args)
+
+        first = asyncio.ensure_future(self._request_once(*args))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        resilience.count_hedge(name)
+        second = asyncio.ensure_future(self._request_once(*args))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            resilience.count_hedge(name, won=True)
+                        return task.result()
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get(self, name, token=None, params=None, **kwargs):
+        return await self.request(name, token=token, params=params, **kwargs)
+
+    async def post(self, name, token=None, data=None, params=None, **kwargs):
+        return await self.request(name, token=token, data=data, params=params, **kwargs)
+
+    @timed_stage("fixhr")
+    async def get_all_pages(self, name, token=None, params=None, rows_key="data", limit=PAGE_LIMIT,
+                            max_pages=MAX_PAGES, **kwargs):
+        first = await self.get(name, token=token, params=_page_params(params, 1, limit), **kwargs)
+        first.raise_for_status()
+        rows, pages, total = page_rows(first, rows_key)
+        if pages > max_pages:
+            logger.warning("FixHR %s has %d pages, reading the first %d", name, pages, max_pages)
+        fanout = asyncio.Semaphore(PAGE_FANOUT)
+
+        async def fetch(page):
+            async with fanout:
+                r = await self.get(name, token=token, params=_page_params(params, page, limit), **kwargs)
+            r.raise_for_status()
+            return page_rows(r, rows_key)[0]
+
+        for more in await asyncio.gather(*(fetch(page) for page in range(2, min(pages, max_pages) + 1))):
+            rows.extend(more)
+        return rows, max(total, len(rows))
+
+
+# Process-wide clients used by views and the engines
+fixhr = FixHRClient()
+afixhr = AsyncFixHRClient()
@@ -0,0 +1,257 @@
+# core/fixhr_resilience.py
+"""
+Keeping chat responsive when FixHR is slow or down, used by
+core.fixhr_client.
+
+Circuit breakers, one per endpoint: FIXHR_BREAKER_FAILURES consecutive
+failures (connection errors, 5xx, or calls slower than
+FIXHR_BREAKER_SLOW_SECONDS) open the breaker, and calls then fail at once
+with FixHRUnavailable, whose message is safe to show in chat. After
+FIXHR_BREAKER_OPEN_SECONDS a single probe call is let through; its outcome
+closes or reopens the breaker.
+
+Hedging: recent latencies are tracked per endpoint. An idempotent GET
+still running after that endpoint's p95 gets a second identical request
+and the first good response wins (FIXHR_HEDGE=0 to disable).
+
+Latency budget: ``with latency_budget(seconds):`` sets a deadline that
+every FixHR call inside the block inherits. Timeouts are capped at what
+is left and calls after the deadline fail fast. ``inherit_budget(fn)``
+carries the deadline (and the rest of the caller's context) into worker
+threads.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import requests
+
+BREAKER_FAILURES = int(os.environ.get("FIXHR_BREAKER_FAILURES", "5"))
+BREAKER_OPEN_SECONDS = float(os.environ.get("FIXHR_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_SLOW_SECONDS = float(os.environ.get("FIXHR_BREAKER_SLOW_SECONDS", "8"))
+HEDGE_ENABLED = os.environ.get("FIXHR_HEDGE", "1") != "0"
+# Don't hedge on a p95 computed from a handful of calls
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+LATENCY_WINDOW = 200
+# Below this much budget a call cannot realistically finish
+MIN_CALL_SECONDS = 0.05
+
+UNAVAILABLE_MESSAGE = "FixHR is not responding right now. Please try again in a minute."
+
+
+class FixHRUnavailable(requests.ConnectionError):
+    """Failed fast: breaker open or latency budget used up. str() is user-facing."""
+
+    def __init__(self, endpoint, reason):
+        super().__init__(UNAVAILABLE_MESSAGE)
+        self.endpoint = endpoint
+        self.reason = reason
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failures=BREAKER_FAILURES, open_seconds=BREAKER_OPEN_SECONDS,
+                 slow_seconds=BREAKER_SLOW_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.open_seconds = open_seconds
+        self.slow_seconds = slow_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise FixHRUnavailable unless a call may go out now."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    raise FixHRUnavailable(self.name, "circuit open")
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    raise FixHRUnavailable(self.name, "circuit half-open")
+                self._probing = True
+
+    def record(self, ok, latency=None):
+        failed = not ok or (latency is not None and latency > self.slow_seconds)
+        with self._lock:
+            if not failed:
+                self.state = self.CLOSED
+                self.failures = 0
+                self._probing = False
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """Let the next call probe again after one whose outcome says nothing about FixHR (e.g. cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "times_opened": self.times_opened,
+                    "rejected": self.rejected}
+
+
+class LatencyTracker:
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self):
+        if len(self) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.percentile(0.95), HEDGE_MIN_DELAY)
+
+
+class Resilience:
+    def __init__(self):
+        self._breakers = {}
+        self._latency = {}
+        self._hedges = defaultdict(lambda: {"fired": 0, "won": 0})
+        self._lock = threading.Lock()
+
+    def breaker(self, name):
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name)
+            return self._breakers[name]
+
+    def latency(self, name):
+        with self._lock:
+            if name not in self._latency:
+                self._latency[name] = LatencyTracker()
+            return self._latency[name]
+
+    def hedge_delay(self, name):
+        """Seconds before a hedged second request, or None to not hedge this call."""
+        if not HEDGE_ENABLED:
+            return None
+        delay = self.latency(name).hedge_delay()
+        left = remaining_budget()
+        if delay is None or (left is not None and left <= delay):
+            return None
+        return delay
+
+    def count_hedge(self, name, won=False):
+        with self._lock:
+            self._hedges[name]["won" if won else "fired"] += 1
+
+    def stats(self):
+        with self._lock:
+            names = sorted(set(self._breakers) | set(self._latency))
+            hedges = {name: dict(values) for name, values in self._hedges.items()}
+        rows = {}
+        for name in names:
+            tracker = self.latency(name)
+            p50, p95 = tracker.percentile(0.5), tracker.percentile(0.95)
+            rows[name] = {
+                "breaker": self.breaker(name).stats(),
+                "samples": len(tracker),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "hedges": hedges.get(name, {"fired": 0, "won": 0}),
+            }
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._breakers.clear()
+            self._latency.clear()
+            self._hedges.clear()
+
+
+resilience = Resilience()
+
+
+# ---------------- Latency budget ----------------
+_deadline = contextvars.ContextVar("fixhr_deadline", default=None)
+
+
+@contextmanager
+def latency_budget(seconds):
+    """FixHR calls in this block share `seconds` in total (a nested budget can only shrink it)."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def no_budget():
+    """Background work (cache refreshes, prefetches) must not inherit a request's budget."""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget():
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_timeout(name, timeout):
+    """Read timeout for one attempt: `timeout` capped by the remaining budget."""
+    left = remaining_budget()
+    if left is None:
+        return timeout
+    if left <= MIN_CALL_SECONDS:
+        raise FixHRUnavailable(name, "latency budget exhausted")
+    return min(timeout, left)
+
+
+def budget_allows(seconds):
+    left = remaining_budget()
+    return left is None or left - seconds > MIN_CALL_SECONDS
+
+
+def inherit_budget(fn):
+    """
+    Wrap `fn` so a worker thread runs it in the caller's context: under its
+    deadline, and timed by its request's stage timer (core.stage_timing).
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # One copy per call: the wrapper may run in several threads at once
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
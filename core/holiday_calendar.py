@@ -0,0 +1,205 @@
+# core/holiday_calendar.py
+"""
+Holiday calendar per business.
+
+The FixHR holiday list (get_data_for_type?type=holiday_list) is fetched
+once per business and year and kept as a HolidayCalendar: intervals sorted
+by start date, plus a running maximum of end dates so containment and
+overlap queries are a bisect plus a short backwards scan. Questions like
+"is tomorrow a holiday", "next holiday", "holidays in March" or "holidays
+between 10 Oct and 15 Nov" never call the API again.
+
+A year's calendar is refetched on the first query of a new day. If that
+refetch fails the previous copy is kept.
+Sessions without a business ID are not cached.
+"""
+
+import bisect
+import calendar
+import logging
+import re
+import threading
+from collections import namedtuple
+from datetime import date, datetime
+
+from core.fixhr_client import fixhr
+
+logger = logging.getLogger(__name__)
+
+Holiday = namedtuple("Holiday", ["start", "end", "name"])
+
+# Phrases about the holiday calendar itself. "chhutti" alone also means
+# leave ("chhutti kaise apply karu"), so it needs a calendar cue.
+HOLIDAY_QUESTION_RE = re.compile(
+    r"\bholidays?\b"
+    r"|\b(?:agli|next|pichli|previous|sarkari|festival|national)\s+chh?utti"
+    r"|\bchh?utti(?:yan|yon)?\s+(?:kab|list|kitni|ki list|kaun|konsi|kon si)\b"
+    r"|\bchh?uttiyan\b",
+    re.I,
+)
+LEAVE_REQUEST_RE = re.compile(r"\b(?:apply|lagani|lagana|lagao|chahiye|leave)\b", re.I)
+DAY_WORD_RE = re.compile(r"\b(today|aaj|tomorrow|kal)\b", re.I)
+MONTH_WORD_RE = re.compile(
+    r"\b(january|jan|february|feb|march|mar|april|apr|may|june|jun|july|jul|august|aug"
+    r"|september|sept|sep|october|oct|november|nov|december|dec)\b",
+    re.I,
+)
+MONTH_NUMBERS = {
+    **{name.lower(): i for i, name in enumerate(calendar.month_name) if name},
+    **{name.lower(): i for i, name in enumerate(calendar.month_abbr) if name},
+    "sept": 9,
+}
+# "may" is mostly the verb ("may I know the holidays"); it is the month only next to a holiday word
+HOLIDAY_MAY_RE = re.compile(
+    r"\b(?:holidays?|chh?utti(?:yan|yon)?)\s+(?:(?:in|of|for|during|mein|me)\s+)?may\b"
+    r"|\bmay\s+(?:(?:ke|ki|ka|mein|me)\s+)?(?:holidays?|chh?utti)",
+    re.I,
+)
+
+
+def is_holiday_question(text):
+    """True for holiday-calendar questions, not leave requests that mention a chhutti."""
+    text = text or ""
+    return bool(HOLIDAY_QUESTION_RE.search(text)) and not LEAVE_REQUEST_RE.search(text)
+
+
+def holiday_question_day(text):
+    """"today" or "tomorrow" when a holiday question asks about one of them, else None."""
+    match = DAY_WORD_RE.search(text or "")
+    if not match:
+        return None
+    return "today" if match.group(1).lower() in ("today", "aaj") else "tomorrow"
+
+
+def holiday_question_month(text):
+    """Month number a holiday question names, or None."""
+    text = text or ""
+    for match in MONTH_WORD_RE.finditer(text):
+        word = match.group(1).lower()
+        if word != "may" or HOLIDAY_MAY_RE.search(text):
+            return MONTH_NUMBERS[word]
+    return None
+
+
+def parse_holiday_rows(payload):
+    """FixHR holiday_list payload -> list of Holiday (bad rows skipped)."""
+    holidays = []
+    for h in (payload or {}).get("result", []) or []:
+        try:
+            start = datetime.strptime(h.get("phl_start_date"), "%d %b, %Y").date()
+            end = datetime.strptime(h.get("phl_end_date"), "%d %b, %Y").date()
+        except Exception:
+            continue
+        holidays.append(Holiday(start, max(start, end), h.get("phl_name") or "Holiday"))
+    return holidays
+
+
+class HolidayCalendar:
+    def __init__(self, holidays):
+        self.holidays = sorted(holidays, key=lambda h: (h.start, h.end))
+        self.starts = [h.start for h in self.holidays]
+        # max_end[i] = latest end among holidays[0..i]; lets scans stop early
+        self.max_end = []
+        latest = date.min
+        for h in self.holidays:
+            latest = max(latest, h.end)
+            self.max_end.append(latest)
+
+    def __len__(self):
+        return len(self.holidays)
+
+    def between(self, first, last):
+        """Holidays overlapping [first, last], in start order."""
+        found = []
+        i = bisect.bisect_right(self.starts, last) - 1
+        while i >= 0 and self.max_end[i] >= first:
+            if self.holidays[i].end >= first:
+                found.append(self.holidays[i])
+            i -= 1
+        found.reverse()
+        return found
+
+    def on(self, day):
+        return self.between(day, day)
+
+    def in_month(self, year, month):
+        return self.between(date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+
+    def next_after(self, day):
+        """First holiday starting after `day`, or None."""
+        i = bisect.bisect_right(self.starts, day)
+        return self.holidays[i] if i < len(self.holidays) else None
+
+
+class HolidayCalendarService:
+    def __init__(self, client=fixhr):
+        self.client = client
+        self._calendars = {}  # (business_id, year) -> (HolidayCalendar, loaded_on)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fetch(self, token, business_id, year):
+        res = self.client.get(
+            "holiday",
+            token=token,
+            params={"type": "holiday_list", "year": year},
+            scope=f"biz:{business_id}" if business_id else None,
+            # this service is the cache for holidays; always read through
+            use_cache=False,
+        )
+        res.raise_for_status()
+        return HolidayCalendar(parse_holiday_rows(res.json() if res.content else {}))
+
+    def calendar(self, token, business_id, year, today=None):
+        if not business_id:
+            # no business to key it by: one user's list must not answer another's
+            return self._fetch(token, business_id, year)
+        today = today or date.today()
+        key = (str(business_id or ""), int(year))
+        entry = self._calendars.get(key)
+        if entry and entry[1] == today:
+            return entry[0]
+
+        with self._key_lock(key):
+            entry = self._calendars.get(key)
+            if entry and entry[1] == today:
+                return entry[0]
+            try:
+                cal = self._fetch(token, business_id, year)
+            except Exception as e:
+                logger.error("Holiday calendar fetch failed for %s: %s", key, e)
+                if entry:
+                    return entry[0]
+                raise
+            self._calendars[key] = (cal, today)
+            return cal
+
+    def holidays_on(self, token, business_id, day):
+        return self.calendar(token, business_id, day.year).on(day)
+
+    def holidays_in_month(self, token, business_id, year, month):
+        return self.calendar(token, business_id, year).in_month(year, month)
+
+    def holidays_between(self, token, business_id, first, last):
+        found = []
+        for year in range(first.year, last.year + 1):
+            found.extend(self.calendar(token, business_id, year).between(max(first, date(year, 1, 1)), min(last, date(year, 12, 31))))
+        # a holiday spanning new year shows up in both years
+        return sorted(set(found), key=lambda h: (h.start, h.end))
+
+    def next_holiday(self, token, business_id, day):
+        found = self.calendar(token, business_id, day.year).next_after(day)
+        if found is None:
+            found = self.calendar(token, business_id, day.year + 1).next_after(day)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._calendars.clear()
+
+
+holiday_service = HolidayCalendarService()
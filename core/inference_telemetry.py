@@ -0,0 +1,232 @@
+# core/inference_telemetry.py
+"""
+Token-level telemetry for every model.generate call.
+
+timed_generate() wraps model.generate and measures:
+    prompt_tokens, generated_tokens, queue_wait, concurrent, prefill_time,
+    decode_time, tokens_per_sec and stop_reason
+
+queue_wait is the time a call spent waiting for an inference worker; it
+is only known for callables wrapped with queued() before being handed to
+an executor. concurrent counts the other generate calls already running
+on the same model. Nothing here serializes generate.
+
+record() folds those numbers into rolling histograms kept per model and
+per (model, intent), so a slowdown can be traced to longer prompts,
+longer answers or contention.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+
+
+# Only the most recent samples feed the percentiles
+WINDOW_SIZE = 1000
+
+# Bucket upper bounds: seconds for *_time / queue_wait, counts for tokens
+TIME_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60]
+TOKEN_BUCKETS = [8, 16, 32, 64, 128, 256, 512, 1024, 2048]
+RATE_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200]
+CONCURRENCY_BUCKETS = [0, 1, 2, 4, 8, 16]
+
+METRIC_BUCKETS = {
+    "prompt_tokens": TOKEN_BUCKETS,
+    "generated_tokens": TOKEN_BUCKETS,
+    "queue_wait": TIME_BUCKETS,
+    "concurrent": CONCURRENCY_BUCKETS,
+    "prefill_time": TIME_BUCKETS,
+    "decode_time": TIME_BUCKETS,
+    "total_time": TIME_BUCKETS,
+    "tokens_per_sec": RATE_BUCKETS,
+}
+
+
+class RollingHistogram:
+    """Bucketed counts plus percentiles over the last WINDOW_SIZE samples."""
+
+    def __init__(self, bounds, window=WINDOW_SIZE):
+        self.bounds = list(bounds)
+        self.samples = deque(maxlen=window)
+
+    def add(self, value):
+        self.samples.append(float(value))
+
+    def snapshot(self):
+        values = sorted(self.samples)
+        if not values:
+            return {"count": 0}
+
+        counts = [0] * (len(self.bounds) + 1)
+        for v in values:
+            counts[bisect.bisect_left(self.bounds, v)] += 1
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+
+        def pct(p):
+            return round(values[min(len(values) - 1, int(p * len(values)))], 4)
+
+        return {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 4),
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": round(values[-1], 4),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class _Series:
+    def __init__(self):
+        self.histograms = {name: RollingHistogram(bounds) for name, bounds in METRIC_BUCKETS.items()}
+        self.stop_reasons = defaultdict(int)
+        self.calls = 0
+
+    def add(self, stats):
+        self.calls += 1
+        for name, hist in self.histograms.items():
+            if stats.get(name) is not None:
+                hist.add(stats[name])
+        self.stop_reasons[stats.get("stop_reason") or "unknown"] += 1
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "stop_reasons": dict(self.stop_reasons),
+            **{name: hist.snapshot() for name, hist in self.histograms.items()},
+        }
+
+
+_STATS_LOCK = threading.Lock()
+_BY_MODEL = defaultdict(_Series)
+_BY_INTENT = defaultdict(_Series)
+
+# generate calls currently running, per model
+_IN_FLIGHT = defaultdict(int)
+_IN_FLIGHT_LOCK = threading.Lock()
+
+# Set by queued() on the worker thread for the duration of the wrapped call
+_QUEUE = threading.local()
+
+
+def queued(fn):
+    """
+    Wrap fn before submitting it to an executor so the generate calls it
+    makes report how long it sat in the executor queue as queue_wait.
+    """
+    queued_at = time.perf_counter()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        _QUEUE.queued_at = queued_at
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _QUEUE.queued_at = None
+
+    return run
+
+
+class _TokenClock(StoppingCriteria):
+    """Never stops generation; notes when the first new token appears."""
+
+    def __init__(self):
+        self.first_token_at = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+def timed_generate(model_name, model, **generate_kwargs):
+    """
+    Run model.generate(**generate_kwargs) and return (output_ids, stats).
+
+    Stats describe the first sequence in the batch; callers record them
+    once they know the intent (see record()).
+    """
+    input_ids = generate_kwargs["input_ids"]
+    prompt_tokens = int(input_ids.shape[-1])
+    max_new_tokens = generate_kwargs.get("max_new_tokens")
+    eos_token_id = generate_kwargs.get("eos_token_id")
+    if eos_token_id is None and getattr(model, "generation_config", None) is not None:
+        eos_token_id = model.generation_config.eos_token_id
+    if isinstance(eos_token_id, (list, tuple)):
+        eos_token_id = set(eos_token_id)
+    elif eos_token_id is not None:
+        eos_token_id = {eos_token_id}
+
+    clock = _TokenClock()
+    criteria = StoppingCriteriaList(generate_kwargs.pop("stopping_criteria", None) or [])
+    criteria.append(clock)
+
+    with _IN_FLIGHT_LOCK:
+        concurrent = _IN_FLIGHT[model_name]
+        _IN_FLIGHT[model_name] += 1
+    started_at = time.perf_counter()
+    queued_at = getattr(_QUEUE, "queued_at", None)
+    try:
+        output_ids = model.generate(stopping_criteria=criteria, **generate_kwargs)
+    finally:
+        finished_at = time.perf_counter()
+        with _IN_FLIGHT_LOCK:
+            _IN_FLIGHT[model_name] -= 1
+
+    new_tokens = output_ids[0][prompt_tokens:]
+    generated_tokens = int(new_tokens.shape[-1])
+    first_token_at = clock.first_token_at or finished_at
+    decode_time = finished_at - first_token_at
+
+    if eos_token_id and generated_tokens and int(new_tokens[-1]) in eos_token_id:
+        stop_reason = "eos"
+    elif max_new_tokens and generated_tokens >= max_new_tokens:
+        stop_reason = "max_new_tokens"
+    else:
+        stop_reason = "stopping_criteria"
+
+    stats = {
+        "model": model_name,
+        "prompt_tokens": prompt_tokens,
+        "generated_tokens": generated_tokens,
+        "queue_wait": round(started_at - queued_at, 4) if queued_at is not None else None,
+        "concurrent": concurrent,
+        "prefill_time": round(first_token_at - started_at, 4),
+        "decode_time": round(decode_time, 4),
+        "total_time": round(finished_at - started_at, 4),
+        "tokens_per_sec": round((generated_tokens - 1) / decode_time, 2) if decode_time > 0 and generated_tokens > 1 else None,
+        "stop_reason": stop_reason,
+    }
+    return output_ids, stats
+
+
+def record(stats, intent=None):
+    """Add one call's stats to the per-model and per-intent histograms."""
+    model_name = stats.get("model") or "unknown"
+    intent = intent or "unknown"
+    with _STATS_LOCK:
+        _BY_MODEL[model_name].add(stats)
+        _BY_INTENT[(model_name, intent)].add(stats)
+
+
+def snapshot():
+    with _STATS_LOCK:
+        by_intent = defaultdict(dict)
+        for (model_name, intent), series in _BY_INTENT.items():
+            by_intent[model_name][intent] = series.snapshot()
+        return {
+            "window_size": WINDOW_SIZE,
+            "models": {name: series.snapshot() for name, series in _BY_MODEL.items()},
+            "intents": dict(by_intent),
+        }
+
+
+def reset():
+    with _STATS_LOCK:
+        _BY_MODEL.clear()
+        _BY_INTENT.clear()
@@ -0,0 +1,62 @@
+# core/leave_balance_cache.py
+"""
+Per-employee leave-balance caching on top of the FixHR response cache.
+
+Balances are keyed by employee and business rather than by token, so the
+same employee's repeated "kitni chutti bachi hai" is served from cache
+until something changes it:
+
+  - a successful leave apply drops that employee's entry and, unless
+    FIXHR_LEAVE_BALANCE_PREFETCH=0, refetches it in the background so the
+    next question is instant and current;
+  - a successful leave approval bumps the business generation. Approval
+    messages carry the request's emp_d_id, not the applicant's emp_id, so
+    every balance of that business is refetched on next read.
+"""
+
+import logging
+import os
+import threading
+
+from core.fixhr_cache import response_cache
+from core.fixhr_client import afixhr, fixhr
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_AFTER_APPLY = os.environ.get("FIXHR_LEAVE_BALANCE_PREFETCH", "1") == "1"
+
+
+def balance_scope(employee_id, business_id):
+    generation = response_cache.generation(f"leave_balance:biz:{business_id}")
+    return f"emp:{employee_id}:biz:{business_id}:g{generation}"
+
+
+def get_balance(token, employee_id=None, business_id=None, use_cache=True):
+    scope = balance_scope(employee_id, business_id) if employee_id else None
+    return fixhr.get("leave_balance", token=token, scope=scope, use_cache=use_cache)
+
+
+async def get_balance_async(token, employee_id=None, business_id=None, use_cache=True):
+    scope = balance_scope(employee_id, business_id) if employee_id else None
+    return await afixhr.get("leave_balance", token=token, scope=scope, use_cache=use_cache)
+
+
+def _prefetch(token, employee_id, business_id):
+    try:
+        get_balance(token, employee_id, business_id)
+    except Exception as e:
+        logger.warning("Leave balance prefetch failed for %s: %s", employee_id, e)
+
+
+def on_leave_applied(token, employee_id, business_id=None, prefetch=None):
+    """Call after a successful leave apply by `employee_id`."""
+    if not employee_id:
+        return
+    response_cache.invalidate("leave_balance", balance_scope(employee_id, business_id))
+    if PREFETCH_AFTER_APPLY if prefetch is None else prefetch:
+        threading.Thread(target=_prefetch, args=(token, employee_id, business_id), daemon=True).start()
+
+
+def on_leave_approved(business_id):
+    """Call after a successful leave approval/rejection in `business_id`."""
+    response_cache.bump_generation(f"leave_balance:biz:{business_id}")
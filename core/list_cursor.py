@@ -0,0 +1,63 @@
+# core/list_cursor.py
+"""
+Server-side cursors for long card lists (pending leaves, gatepasses,
+missed punches).
+
+The chat reply carries the first LIST_CHUNK cards. The rest of the merged
+list is kept under a random cursor id for CURSOR_TTL seconds, and the chat
+page pulls it LIST_CHUNK cards at a time from /api/list-page/?cursor=...
+
+A cursor is "<id>:<offset>": the stored list never changes, so each chunk
+just points at the next offset. Cursors are bound to the token that
+created them.
+
+A list that FixHR reports as longer than what was read (the client stops
+at FIXHR_MAX_PAGES pages) is marked ``truncated`` so the chat page says
+the cards it shows are not the whole list.
+"""
+
+import os
+import secrets
+
+from core.fixhr_cache import LocalLRUBackend, build_backend, token_scope
+
+LIST_CHUNK = int(os.environ.get("FIXHR_LIST_CHUNK", "20"))
+CURSOR_TTL = int(os.environ.get("FIXHR_LIST_CURSOR_TTL", "900"))
+
+# Same backend choice as the response cache, so cursors work across workers with FIXHR_CACHE_BACKEND=django
+_store = build_backend() or LocalLRUBackend(max_entries=256)
+
+
+def _chunk(reply, items_key, items, offset, total, cursor_id):
+    end = offset + LIST_CHUNK
+    chunk = dict(reply)
+    chunk[items_key] = items[offset:end]
+    chunk["total"] = total
+    chunk["offset"] = offset
+    chunk["next_cursor"] = f"{cursor_id}:{end}" if cursor_id and end < len(items) else None
+    chunk["truncated"] = len(items) < total
+    return chunk
+
+
+def first_chunk(reply, items_key, token):
+    """The reply dict with only the first LIST_CHUNK items, plus ``next_cursor`` when more remain."""
+    items = reply.get(items_key) or []
+    total = reply.get("total") or len(items)
+    cursor_id = None
+    if len(items) > LIST_CHUNK:
+        cursor_id = secrets.token_urlsafe(12)
+        base = {k: v for k, v in reply.items() if k != items_key}
+        _store.set(f"fixhr:cursor:{cursor_id}", (token_scope(token), base, items_key, items, total), CURSOR_TTL)
+    return _chunk(reply, items_key, items, 0, total, cursor_id)
+
+
+def next_chunk(cursor, token):
+    """The chunk a cursor points at, or None if it expired or belongs to another user."""
+    cursor_id, _, offset = (cursor or "").partition(":")
+    entry = _store.get(f"fixhr:cursor:{cursor_id}") if cursor_id and offset.isdigit() else None
+    if entry is None:
+        return None
+    owner, base, items_key, items, total = entry
+    if owner != token_scope(token):
+        return None
+    return _chunk(base, items_key, items, int(offset), total, cursor_id)
@@ -0,0 +1,91 @@
+# core/login_prefetch.py
+"""
+Warm the FixHR caches right after login.
+
+A user's first questions are nearly always leave balance, pending
+approvals or this month's attendance, so login_api queues those reads on
+a small background pool and the first chat answers come from cache:
+
+  - everyone: leave balance (core.leave_balance_cache)
+  - approvers: pending leave, gatepass and missed-punch lists (all pages)
+  - users who only see their own attendance: this month's attendance
+    (core.attendance_store)
+  - everyone: a sync of their own leave, gatepass and missed-punch lists
+    (core.request_store)
+
+Runs with FIXHR_LOGIN_PREFETCH=1 (default). With the in-process cache
+backend only the worker that served the login is warmed; use
+FIXHR_CACHE_BACKEND=django to share the lists across workers.
+"""
+
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from core import leave_balance_cache
+from core.attendance_store import attendance_store
+from core.fixhr_client import fixhr
+from core.request_store import KINDS as REQUEST_KINDS, request_store
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ON_LOGIN = os.environ.get("FIXHR_LOGIN_PREFETCH", "1") == "1"
+PENDING_LISTS = ("leave_list", "gatepass_approval_list", "missed_punch_approval_list")
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("FIXHR_LOGIN_PREFETCH_THREADS", "4")),
+    thread_name_prefix="login-prefetch",
+)
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _run(label, fn, *args):
+    from django.db import close_old_connections
+
+    try:
+        fn(*args)
+        outcome = "ok"
+    except Exception as e:
+        logger.warning("Login prefetch of %s failed: %s", label, e)
+        outcome = "failed"
+    finally:
+        close_old_connections()
+    with _stats_lock:
+        _stats[f"{label}:{outcome}"] += 1
+
+
+def _pending_list(token, name):
+    fixhr.get_all_pages(name, token=token)
+
+
+def _own_attendance(token, business_id, view):
+    today = date.today()
+    attendance_store.month(token, business_id, view, today.year, today.month)
+
+
+def prefetch_after_login(token, employee_id, business_id, approver=False, attendance_view=None):
+    """
+    Queue the background reads for a user who just logged in and return
+    the futures. ``attendance_view`` is the user's attendance store view
+    when it is their own (``emp:<id>``); None skips attendance.
+    """
+    if not PREFETCH_ON_LOGIN or not token:
+        return []
+
+    jobs = [("leave_balance", leave_balance_cache.get_balance, token, employee_id, business_id)]
+    if approver:
+        jobs.extend((name, _pending_list, token, name) for name in PENDING_LISTS)
+    if attendance_view:
+        jobs.append(("attendance", _own_attendance, token, business_id, attendance_view))
+    jobs.extend((f"my_{kind}", request_store.ensure_synced, token, employee_id, business_id, kind)
+                for kind in REQUEST_KINDS)
+    return [_executor.submit(_run, *job) for job in jobs]
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,62 @@
+"""python manage.py fixhr_stub: serve the offline FixHR stub (benchmarks/fixhr_stub.py)."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.fixhr_stub import Faults, FixHRStub, SyntheticFixHR, make_stub_server
+
+
+class Command(BaseCommand):
+    help = "Serve a fake FixHR API with synthetic or recorded data and injectable latency/errors."
+    # The stub never touches the chat views; skip the checks that import them (and load the models)
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--employees", type=int, default=200, help="synthetic employees")
+        parser.add_argument("--requests", type=int, default=6, help="synthetic leave/gatepass/missed punch rows per employee")
+        parser.add_argument("--team-size", type=int, default=25, help="employees reporting to each manager login")
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--latency-ms", type=float, default=0, help="mean added latency per request")
+        parser.add_argument("--jitter-ms", type=float, default=0, help="standard deviation of the added latency")
+        parser.add_argument("--endpoint-latency", action="append", default=[], metavar="NAME=MS",
+                            help="mean latency for one endpoint, e.g. attendance=400 (repeatable)")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 500/503")
+        parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests that hang")
+        parser.add_argument("--timeout-seconds", type=float, default=30.0, help="how long a hanging request hangs")
+        parser.add_argument("--replay", metavar="DIR", help="answer from responses recorded in DIR")
+        parser.add_argument("--record", metavar="DIR", help="proxy to --upstream and record responses to DIR")
+        parser.add_argument("--upstream", default="https://dev.fixhr.app", help="FixHR to proxy when recording")
+
+    def handle(self, *args, **options):
+        if options["replay"] and options["record"]:
+            raise CommandError("--replay and --record are mutually exclusive")
+        endpoint_latency = {}
+        for item in options["endpoint_latency"]:
+            name, _, ms = item.partition("=")
+            try:
+                endpoint_latency[name.strip()] = float(ms)
+            except ValueError:
+                raise CommandError(f"Bad --endpoint-latency {item!r}, expected NAME=MS")
+
+        stub = FixHRStub(
+            data=SyntheticFixHR(employees=options["employees"], requests=options["requests"],
+                                team_size=options["team_size"], seed=options["seed"]),
+            faults=Faults(latency_ms=options["latency_ms"], jitter_ms=options["jitter_ms"],
+                          error_rate=options["error_rate"], timeout_rate=options["timeout_rate"],
+                          timeout_seconds=options["timeout_seconds"], endpoint_latency=endpoint_latency,
+                          seed=options["seed"]),
+            replay=options["replay"],
+            record=options["record"],
+            upstream=options["upstream"] if options["record"] else None,
+        )
+        server = make_stub_server(stub, options["host"], options["port"])
+        mode = "recording" if options["record"] else "replaying" if options["replay"] else "synthetic"
+        self.stdout.write(f"FixHR stub ({mode}) on http://{options['host']}:{server.server_port}")
+        self.stdout.write(f"Point the app at it: FIXHR_BASE_URL=http://{options['host']}:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
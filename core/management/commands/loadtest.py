@@ -0,0 +1,141 @@
+"""python manage.py loadtest: drive the chat API with virtual users (benchmarks/chat_loadtest.py)."""
+
+import contextlib
+import json
+import os
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.chat_loadtest import (
+    HttpUser,
+    InProcessUser,
+    LoadTest,
+    MessageMix,
+    format_table,
+    isolate_state,
+    parse_weights,
+    summarize,
+    use_oracle_classifier,
+)
+
+
+class Command(BaseCommand):
+    help = ("Log in virtual users against the FixHR stub and replay a weighted chat mix; "
+            "reports p50/p95/p99, error rates and Server-Timing stages per intent.")
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=20, help="virtual users (each its own session)")
+        parser.add_argument("--managers", type=float, default=0.2, help="share of users logging in as managers")
+        load = parser.add_mutually_exclusive_group()
+        load.add_argument("--concurrency", type=int, default=8, help="closed loop: parallel workers")
+        load.add_argument("--rate", type=float, help="open loop: arrivals per second (Poisson)")
+        parser.add_argument("--max-workers", type=int, default=64, help="open loop: most requests in flight")
+        parser.add_argument("--messages", type=int, default=200, help="messages to send")
+        parser.add_argument("--duration", type=float, help="stop after this many seconds")
+        parser.add_argument("--mix", help="category weights, e.g. leave=30,gatepass=15,missed_punch=15,"
+                                          "attendance=25,faq=15")
+        parser.add_argument("--warmup", type=int, default=5, help="unrecorded messages sent first")
+        parser.add_argument("--seed", type=int, default=11)
+        parser.add_argument("--async", dest="use_async", action="store_true",
+                            help="use /api/chat/async/ (turns on FIXHR_ASYNC_CHAT in-process; "
+                                 "a --target server needs it on)")
+        parser.add_argument("--classifier", choices=("model", "oracle"), default="model",
+                            help="oracle answers intents from the mix labels instead of running Phi-3")
+        parser.add_argument("--target", help="base URL of a running server (its FIXHR_BASE_URL must be a stub); "
+                                             "default is in-process")
+        parser.add_argument("--fixhr-url", help="use a stub that is already running instead of starting one")
+        parser.add_argument("--employees", type=int, default=500, help="stub employees")
+        parser.add_argument("--latency-ms", type=float, default=60, help="stub latency per FixHR call")
+        parser.add_argument("--jitter-ms", type=float, default=20)
+        parser.add_argument("--error-rate", type=float, default=0.0, help="stub 500/503 share")
+        parser.add_argument("--timeout-rate", type=float, default=0.0, help="stub hanging-request share")
+        parser.add_argument("--app-output", action="store_true", help="keep the views' print output")
+        parser.add_argument("--json", dest="json_out", help="also write the results to this file")
+
+    def handle(self, *args, **options):
+        try:
+            weights = parse_weights(options["mix"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options["users"] < 1:
+            raise CommandError("--users must be at least 1")
+        if options["target"] and options["classifier"] == "oracle":
+            raise CommandError("--classifier oracle only works in-process")
+
+        if options["use_async"] and not options["target"]:
+            # core.urls only routes the async view with the flag on; the URLconf is not loaded yet
+            os.environ["FIXHR_ASYNC_CHAT"] = "1"
+        mix = MessageMix(weights, seed=options["seed"])
+        stub = self._stub(options) if not options["target"] else None
+        state_dir = isolate_state() if not options["target"] else None
+        if options["classifier"] == "oracle":
+            use_oracle_classifier(mix.labels())
+
+        managers = round(options["users"] * options["managers"])
+        emails = [f"{'manager' if i < managers else 'emp'}{i + 1}@stub.fixhr" for i in range(options["users"])]
+        if options["target"]:
+            users = [HttpUser(options["target"], email) for email in emails]
+        else:
+            users = [InProcessUser(email) for email in emails]
+        test = LoadTest(users, mix, "/api/chat/async/" if options["use_async"] else "/api/chat/")
+
+        concurrency = options["concurrency"]
+        quiet = open(os.devnull, "w") if not options["app_output"] else None
+        with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+            test.login_all(min(concurrency, len(users)))
+            test.warmup(options["warmup"])
+            if options["rate"]:
+                wall = test.run_open(options["rate"], options["messages"], options["duration"],
+                                     options["max_workers"], seed=options["seed"])
+            else:
+                wall = test.run_closed(concurrency, options["messages"], options["duration"])
+        if quiet:
+            quiet.close()
+        if state_dir:
+            from django.db import connections
+
+            connections.close_all()
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+        summary = summarize(test, wall)
+        summary["config"] = {k: options[k] for k in ("users", "managers", "concurrency", "rate", "messages",
+                                                      "duration", "classifier", "use_async", "target")}
+        summary["config"]["mix"] = weights
+        if stub is not None:
+            summary["fixhr"] = {name: dict(counts) for name, counts in sorted(stub.stats.items())}
+
+        load = f"rate {options['rate']}/s" if options["rate"] else f"concurrency {concurrency}"
+        overall = summary["overall"]
+        self.stdout.write(f"\n{overall['requests']} messages in {summary['wall_seconds']}s ({load}), "
+                          f"{overall['throughput_rps']} msg/s, {overall['errors']} errors, "
+                          f"{overall['degraded']} degraded replies; stage columns are mean ms\n")
+        self.stdout.write(format_table([summary["login"], overall] + summary["categories"]) + "\n")
+        self.stdout.write(format_table(summary["intents"]) + "\n")
+        if stub is not None:
+            self.stdout.write("FixHR calls: " + ", ".join(
+                f"{name} {counts.get('requests', 0)}" for name, counts in summary["fixhr"].items()))
+
+        if options["json_out"]:
+            with open(options["json_out"], "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+            self.stdout.write(f"Wrote {options['json_out']}")
+
+    def _stub(self, options):
+        """Point both FixHR clients at --fixhr-url, or at a stub started in this process."""
+        from benchmarks.fixhr_stub import Faults, FixHRStub, SyntheticFixHR, start_in_thread
+        from core.fixhr_client import afixhr, fixhr
+
+        stub = None
+        base_url = options["fixhr_url"]
+        if not base_url:
+            stub = FixHRStub(
+                data=SyntheticFixHR(employees=max(options["employees"], options["users"]), seed=options["seed"]),
+                faults=Faults(latency_ms=options["latency_ms"], jitter_ms=options["jitter_ms"],
+                              error_rate=options["error_rate"], timeout_rate=options["timeout_rate"],
+                              seed=options["seed"]),
+            )
+            _, base_url = start_in_thread(stub)
+        fixhr.base_url = afixhr.base_url = base_url.rstrip("/")
+        return stub
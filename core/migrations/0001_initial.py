@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_id', models.CharField(max_length=64)),
+                ('view', models.CharField(max_length=64)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('payload', models.BinaryField()),
+                ('employee_count', models.PositiveIntegerField(default=0)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business_id', 'view', 'year', 'month'), name='uniq_attendance_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplyJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(max_length=32)),
+                ('employee_id', models.CharField(max_length=64)),
+                ('business_id', models.CharField(blank=True, default='', max_length=64)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(default='queued', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('message', models.TextField(blank=True, default='')),
+                ('response', models.JSONField(blank=True, null=True)),
+                ('next_attempt_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='apply_job_due')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_apply_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_id', models.CharField(max_length=64)),
+                ('employee_id', models.CharField(max_length=64)),
+                ('kind', models.CharField(max_length=32)),
+                ('remote_id', models.CharField(blank=True, default='', max_length=64)),
+                ('start_date', models.DateField(null=True)),
+                ('end_date', models.DateField(null=True)),
+                ('state', models.CharField(max_length=16)),
+                ('status_name', models.CharField(blank=True, default='', max_length=64)),
+                ('card', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business_id', 'employee_id', 'kind', 'start_date'], name='employee_request_date'), models.Index(fields=['business_id', 'employee_id', 'kind', 'state', 'start_date'], name='employee_request_state'), models.Index(fields=['kind', 'remote_id'], name='employee_request_remote')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('remote_id', ''), _negated=True), fields=('business_id', 'employee_id', 'kind', 'remote_id'), name='uniq_employee_request')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RequestSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('business_id', models.CharField(max_length=64)),
+                ('employee_id', models.CharField(max_length=64)),
+                ('kind', models.CharField(max_length=32)),
+                ('synced_at', models.DateTimeField(null=True)),
+                ('full_synced_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('business_id', 'employee_id', 'kind'), name='uniq_request_sync')],
+            },
+        ),
+    ]
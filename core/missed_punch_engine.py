@@ -5,7 +5,8 @@ FINAL — Advanced Missed-Punch LLM + NLP Engine (100% working for FixHR)
 
 import re
 import json
-import requests
+from core.fixhr_client import endpoint_url
+from core.apply_queue import apply_queue
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -27,8 +28,8 @@ except:
 # -------------------------------------------------------------------
 # CONFIG
 # -------------------------------------------------------------------
-MISSED_PUNCH_API_URL = "https://dev.fixhr.app/api/admin/attendance/mis_punch_store"
-GET_IN_OUT_URL = "https://dev.fixhr.app/api/admin/attendance/get_in_out_time"
+MISSED_PUNCH_API_URL = endpoint_url("missed_punch_apply")
+GET_IN_OUT_URL = endpoint_url("get_in_out_time")
 
 TYPE_IN_ONLY = 215
 TYPE_OUT_ONLY = 216
@@ -325,43 +326,18 @@ def apply_missed_punch_nlp(info, token, user_id=None):
     print(json.dumps(payload, indent=2))
     print("=" * 60)
 
-    # Step 7: API call (form-encoded like gatepass and leave)
-    api_raw = {}
-    ok = False
-    msg_out = ""
-    try:
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/x-www-form-urlencoded",
-            "authorization": f"Bearer {token}"
-        }
-        r = requests.post(
-            MISSED_PUNCH_API_URL,
-            headers=headers,
-            data=payload,  # Use 'data' for form-encoded, not 'json'
-            timeout=15
-        )
-        print("📡 Missed Punch API Status:", r.status_code)
-        print("📡 Missed Punch API Body:", r.text)
-        
-        try:
-            api_raw = r.json()
-        except:
-            api_raw = {"status": False, "message": r.text}
-        
-        ok = bool(api_raw.get("status"))
-        msg_out = api_raw.get("message", "")
-    except Exception as e:
-        print(f"❌ Missed Punch API Error: {e}")
-        api_raw = {"status": False, "message": str(e)}
-        msg_out = str(e)
-        ok = False
+    # Step 7: queue the apply (core.apply_queue posts it, form-encoded like gatepass and leave)
+    api_raw = apply_queue.submit("missed_punch", payload, token, user_id, business_id)
+    print("📡 Missed Punch queued:", api_raw.get("job"))
+    ok = bool(api_raw.get("status"))
+    msg_out = api_raw.get("message", "")
 
     # Step 8: Return result
     return {
         "ok": ok,
         "message": msg_out,
         "api_raw": api_raw,
+        "job": api_raw.get("job"),
         "date": display_date,
         "type": type_name,
         "in": in_time,
@@ -5,13 +5,17 @@ from transformers import AutoModelForCausalLM, AutoTokenizer
 import json
 import os
 
+from core import inference_telemetry
+
 # --------------------------- PATHS ---------------------------
 # Resolve model + history relative to this file to keep HF loader happy.
 from pathlib import Path
 
 _BASE_DIR = Path(__file__).resolve().parent
-MODEL_DIR = str((_BASE_DIR / "merged_phi3").resolve())
-HISTORY_FILE = str((_BASE_DIR / "chat_history.json").resolve())
+# FIXHR_CHAT_MODEL_DIR lets benchmarks point at a stand-in checkpoint
+MODEL_DIR = os.environ.get("FIXHR_CHAT_MODEL_DIR") or str((_BASE_DIR / "merged_phi3").resolve())
+# FIXHR_CHAT_HISTORY_FILE keeps load tests away from the real history
+HISTORY_FILE = os.environ.get("FIXHR_CHAT_HISTORY_FILE") or str((_BASE_DIR / "chat_history.json").resolve())
 
 
 # --------------------------- GLOBAL SYSTEM PROMPT ---------------------------
@@ -187,9 +191,10 @@ def safe_apply_chat_template(tokenizer, messages):
 
 
 # --------------------------- GENERATE RESPONSE ---------------------------
-def generate_response(tokenizer, model, device, user_message: str):
+def generate_response_with_stats(tokenizer, model, device, user_message: str):
     """
     Core generation logic: messages → tokens → model.generate → text
+    Returns (text, stats) where stats come from inference_telemetry.
     """
     messages = [
         {
@@ -214,7 +219,9 @@ def generate_response(tokenizer, model, device, user_message: str):
     # print("------------------")
 
     with torch.no_grad():
-        output_ids = model.generate(
+        output_ids, stats = inference_telemetry.timed_generate(
+            "phi3_chat",
+            model,
             **model_inputs,
             max_new_tokens=500,
             do_sample=False,             # FixHR domain ke liye deterministic output better
@@ -228,12 +235,17 @@ def generate_response(tokenizer, model, device, user_message: str):
     input_len = model_inputs["input_ids"].shape[1]
     new_tokens = output_ids[0][input_len:]
 
-    return tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+    return tokenizer.decode(new_tokens, skip_special_tokens=True).strip(), stats
+
+
+def generate_response(tokenizer, model, device, user_message: str):
+    reply, _ = generate_response_with_stats(tokenizer, model, device, user_message)
+    return reply
 
 
 
 # --------------------------- PUBLIC ENTRY POINT ---------------------------
-def model_response(message: str) -> str:
+def model_response(message: str, intent: str = "general") -> str:
     """
     Ye function tum Django view se call karoge.
     Yahan model/tokenizer/device dubara load NAHI hote.
@@ -243,7 +255,8 @@ def model_response(message: str) -> str:
     reply = ""
 
     try:
-        reply = generate_response(TOKENIZER, MODEL, DEVICE, user_text)
+        reply, stats = generate_response_with_stats(TOKENIZER, MODEL, DEVICE, user_text)
+        inference_telemetry.record(stats, intent=intent)
         print(f"model call =============== : {reply}")
     except Exception as e:
         print(f"[ERROR] {e}")
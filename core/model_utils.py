@@ -41,3 +41,47 @@ def predict_intent(text, model, tokenizer, label_map):
     id2label = {v: k for k, v in label_map.items()}
     label = id2label.get(predicted_id, "unknown")
     return label, confidence
+
+
+def predict_intents_batch(texts, model, tokenizer, label_map, batch_size=32, max_length=128):
+    """
+    Classify many messages at once.
+
+    Messages are tokenized once, sorted by token length and run in
+    fixed-size chunks padded only to the longest message in each chunk.
+    Returns one dict per input (original order) with the label, its
+    confidence and the full probability vector keyed by label.
+    """
+    if not texts:
+        return []
+
+    model.eval()
+    device = next(model.parameters()).device
+    id2label = {v: k for k, v in label_map.items()}
+
+    encodings = tokenizer(list(texts), truncation=True, max_length=max_length)
+    keys = list(encodings.keys())
+    order = sorted(range(len(texts)), key=lambda i: len(encodings["input_ids"][i]))
+
+    results = [None] * len(texts)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            features = [{k: encodings[k][i] for k in keys} for i in chunk]
+            batch = tokenizer.pad(features, padding="longest", return_tensors="pt")
+            batch = {k: v.to(device) for k, v in batch.items()}
+
+            probs = torch.nn.functional.softmax(model(**batch).logits, dim=-1).cpu()
+            confidences, predicted = probs.max(dim=-1)
+
+            for row, idx in enumerate(chunk):
+                results[idx] = {
+                    "text": texts[idx],
+                    "intent": id2label.get(int(predicted[row]), "unknown"),
+                    "confidence": float(confidences[row]),
+                    "probabilities": {
+                        id2label.get(j, str(j)): round(float(p), 6) for j, p in enumerate(probs[row].tolist())
+                    },
+                }
+
+    return results
@@ -1,3 +1,101 @@
 from django.db import models
 
 # Create your models here.
+
+
+class AttendanceMonth(models.Model):
+    """A closed month of attendance, stored as a compressed MonthGrid (core.attendance_store)."""
+
+    business_id = models.CharField(max_length=64)
+    view = models.CharField(max_length=64)  # "emp:<employee_id>" of the user it was fetched for
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    payload = models.BinaryField()
+    employee_count = models.PositiveIntegerField(default=0)
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["business_id", "view", "year", "month"], name="uniq_attendance_month"),
+        ]
+
+    def __str__(self):
+        return f"{self.business_id}/{self.view} {self.year}-{self.month:02d}"
+
+
+class ApplyJob(models.Model):
+    """A leave / gatepass / missed-punch apply queued for FixHR (core.apply_queue)."""
+
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=32)  # "leave", "gatepass" or "missed_punch"
+    employee_id = models.CharField(max_length=64)
+    business_id = models.CharField(max_length=64, blank=True, default="")
+    payload = models.JSONField()
+    # No token column: core.apply_queue keeps tokens in memory only
+    status = models.CharField(max_length=16, default="queued")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    message = models.TextField(blank=True, default="")
+    response = models.JSONField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="apply_job_due"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} for {self.employee_id} ({self.status})"
+
+
+class EmployeeRequest(models.Model):
+    """An employee's own leave / gatepass / missed-punch request, mirrored from FixHR (core.request_store)."""
+
+    business_id = models.CharField(max_length=64)
+    employee_id = models.CharField(max_length=64)
+    kind = models.CharField(max_length=32)  # "leave", "gatepass" or "missed_punch"
+    # FixHR id; empty for a request we applied that FixHR has not listed yet
+    remote_id = models.CharField(max_length=64, blank=True, default="")
+    start_date = models.DateField(null=True)
+    end_date = models.DateField(null=True)
+    state = models.CharField(max_length=16)  # pending / approved / rejected / cancelled
+    status_name = models.CharField(max_length=64, blank=True, default="")
+    card = models.JSONField()  # the chat card, as the reply builders send it
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["business_id", "employee_id", "kind", "remote_id"],
+                condition=~models.Q(remote_id=""),
+                name="uniq_employee_request",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["business_id", "employee_id", "kind", "start_date"], name="employee_request_date"),
+            models.Index(fields=["business_id", "employee_id", "kind", "state", "start_date"],
+                         name="employee_request_state"),
+            models.Index(fields=["kind", "remote_id"], name="employee_request_remote"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.remote_id or '(local)'} for {self.employee_id} ({self.state})"
+
+
+class RequestSync(models.Model):
+    """When an employee's request list of one kind was last reconciled with FixHR."""
+
+    business_id = models.CharField(max_length=64)
+    employee_id = models.CharField(max_length=64)
+    kind = models.CharField(max_length=32)
+    synced_at = models.DateTimeField(null=True)
+    full_synced_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["business_id", "employee_id", "kind"], name="uniq_request_sync"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} sync for {self.employee_id}"
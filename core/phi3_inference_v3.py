@@ -2,11 +2,22 @@
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
 import json
+import os
 import re
 
 from pathlib import Path
 
-MODEL_DIR = str((Path(__file__).resolve().parent / "merged_phi3_intent").resolve())
+from core import cpu_tuning, inference_telemetry
+from core.compact_intent import COMPACT_SYSTEM_PROMPT, format_prompt, looks_compact, parse_compact
+
+# "json" for the original checkpoint, "compact" for the one fine-tuned on
+# core/configs/phi3_intent_compact.json. extract_fields reads both.
+INTENT_OUTPUT_FORMAT = os.environ.get("FIXHR_INTENT_FORMAT", "json")
+JSON_MAX_NEW_TOKENS = 300
+COMPACT_MAX_NEW_TOKENS = 48
+
+# FIXHR_INTENT_MODEL_DIR lets benchmarks point at a stand-in checkpoint
+MODEL_DIR = os.environ.get("FIXHR_INTENT_MODEL_DIR") or str((Path(__file__).resolve().parent / "merged_phi3_intent").resolve())
 
 
 def get_device():
@@ -107,8 +118,10 @@ def load_model():
 
 
 # ---------------------- PROMPT BUILDER ----------------------
-def make_prompt(user_msg):
-    return f"<|system|>\n{SYSTEM_PROMPT}\n</s>\n<|user|>\n{user_msg}\n</s>\n<|assistant|>"
+def make_prompt(user_msg, output_format=None):
+    output_format = output_format or INTENT_OUTPUT_FORMAT
+    system_prompt = COMPACT_SYSTEM_PROMPT if output_format == "compact" else SYSTEM_PROMPT
+    return format_prompt(system_prompt, user_msg)
 
 
 # ---------------------- IMPROVED JSON SAFE FIXER ----------------------
@@ -214,15 +227,24 @@ def extract_json_fallback(text):
 
 
 # ---------------------- GENERATE RAW JSON ----------------------
-def generate_json(tokenizer, model, text, device):
+def generate_json_with_stats(tokenizer, model, text, device, max_new_tokens=None):
+    """
+    Same as generate_json but also returns the inference_telemetry stats
+    for the call (prompt/generated tokens, prefill/decode time, ...).
+    """
+    if max_new_tokens is None:
+        max_new_tokens = COMPACT_MAX_NEW_TOKENS if INTENT_OUTPUT_FORMAT == "compact" else JSON_MAX_NEW_TOKENS
+
     inputs = tokenizer(text, return_tensors="pt").to(device)
 
     if hasattr(model, "config") and getattr(model.config, "use_cache", True):
         model.config.use_cache = False
 
-    output = model.generate(
+    output, stats = inference_telemetry.timed_generate(
+        "phi3_intent",
+        model,
         **inputs,
-        max_new_tokens=300,
+        max_new_tokens=max_new_tokens,
         do_sample=False,
         temperature=0.0,
         use_cache=False,
@@ -238,19 +260,30 @@ def generate_json(tokenizer, model, text, device):
 
     decoded = decoded.strip()
 
+    # Compact "intent|key=value" line
+    if looks_compact(decoded):
+        return decoded.split("\n", 1)[0].strip(), stats
+
     # Extract JSON-looking block
     json_match = re.findall(r"\{.*", decoded, re.DOTALL)
     if json_match:
-        return json_match[-1].strip()
+        return json_match[-1].strip(), stats
+
+    return "{}", stats   # fallback empty
+
 
-    return "{}"   # fallback empty
+def generate_json(tokenizer, model, text, device, max_new_tokens=None):
+    raw, _ = generate_json_with_stats(tokenizer, model, text, device, max_new_tokens=max_new_tokens)
+    return raw
 
 
 # ---------------------- EXTRACT FIELDS ----------------------
 def extract_fields(raw_output):
     try:
-        # Always fix JSON first
-        if isinstance(raw_output, str):
+        # Compact lines come from the compact fine-tune; everything else is JSON
+        if isinstance(raw_output, str) and looks_compact(raw_output):
+            data = parse_compact(raw_output)
+        elif isinstance(raw_output, str):
             data = fix_json_string(raw_output)
         else:
             data = raw_output
@@ -279,12 +312,20 @@ print(">> [phi3_intent] Initializing global classifier...")
 TOKENIZER, MODEL, DEVICE = load_model()
 print(">> [phi3_intent] Global classifier ready ✅")
 
+if DEVICE == "cpu":
+    # Short calibration generates to pick this worker's thread count
+    cpu_tuning.autotune(
+        lambda: generate_json(TOKENIZER, MODEL, make_prompt("kal leave chahiye"), DEVICE, max_new_tokens=8),
+        label="phi3_intent",
+    )
+
 def intent_model_call(user_msg):
         print(f"user_msg on intent_model_call========= : {user_msg}")
         prompt = make_prompt(user_msg)
-        raw = generate_json(TOKENIZER, MODEL, prompt, DEVICE)
+        raw, stats = generate_json_with_stats(TOKENIZER, MODEL, prompt, DEVICE)
         
         intent, confidence, date, date_range, time, time_range, reason, other = extract_fields(raw)
+        inference_telemetry.record(stats, intent=intent or "unparsed")
         print(f"intent, confidence, date, date_range, time, time_range, reason, other =============== : {intent}, {confidence}, {date}, {date_range}, {time}, {time_range}, {reason}, {other}")
         
         return intent, confidence, date, date_range, time, time_range, reason, other
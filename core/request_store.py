@@ -0,0 +1,351 @@
+# core/request_store.py
+"""
+Local read model of each employee's own requests.
+
+"My leaves" / "my missed punches" / "my gatepasses" used to download the
+whole history from FixHR on every ask. The requests are now mirrored in
+EmployeeRequest, one row per request holding the chat card plus indexed
+start/end dates and a normalized state (pending, approved, rejected,
+cancelled), and answered with a local query:
+
+    cards, total = request_store.requests(token, employee_id, business_id, "leave",
+                                          state="pending", first=date(2026, 10, 1))
+
+Keeping it current:
+
+  - our own applies: a "pending" row is added when core.apply_queue gets
+    FixHR's OK, and replaced by FixHR's row on the next sync;
+  - approvals made here: the request's row turns approved/rejected on
+    the last approval step; earlier steps only mark the owner for a resync;
+  - delta sync: a list older than FIXHR_REQUEST_SYNC_SECONDS is read again
+    from page 1 (FixHR lists newest first), stopping at the first page
+    with no new or changed row. The first read of a list, and one every
+    FIXHR_REQUEST_FULL_SYNC_SECONDS, reads every page and drops rows that
+    FixHR no longer returns.
+
+Only the first sync of a list blocks the chat request; later syncs run in
+the background while the local rows are served.
+"""
+
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from core.apply_queue import on_success
+from core.attendance_store import parse_day
+from core.fixhr_client import MAX_PAGES, PAGE_LIMIT, fixhr, page_rows
+
+logger = logging.getLogger(__name__)
+
+SYNC_SECONDS = int(os.environ.get("FIXHR_REQUEST_SYNC_SECONDS", "300"))
+FULL_SYNC_SECONDS = int(os.environ.get("FIXHR_REQUEST_FULL_SYNC_SECONDS", "21600"))
+
+PENDING, APPROVED, REJECTED, CANCELLED = "pending", "approved", "rejected", "cancelled"
+STATES = (PENDING, APPROVED, REJECTED, CANCELLED)
+
+
+def _first(value):
+    return (value or [{}])[0] if isinstance(value, list) else (value or {})
+
+
+def _status(info):
+    return info.get("name") or "Requested", (_first(info.get("other"))).get("color")
+
+
+def state_of(status_name):
+    name = (status_name or "").lower()
+    if "approv" in name:
+        return APPROVED
+    if "reject" in name:
+        return REJECTED
+    if "cancel" in name:
+        return CANCELLED
+    return PENDING
+
+
+# ---------------- FixHR row -> card ----------------
+def leave_card(lv):
+    status_name, color = _status(_first(lv.get("leave_status")))
+    return {
+        "leave_id": lv.get("leave_id"),
+        "start_date": lv.get("start_date"),
+        "end_date": lv.get("end_date"),
+        "reason": lv.get("reason"),
+        "leave_type": _first(lv.get("leave_category")).get("category", {}).get("name", "Unknown"),
+        "status_name": status_name,
+        "status_color": color,
+    }
+
+
+def gatepass_card(g):
+    status_name, color = _status(_first(g.get("status")))
+    return {
+        "id": g.get("id"),
+        "emp_name": g.get("emp_name"),
+        "date": g.get("date"),
+        "out_time": g.get("out_time"),
+        "in_time": g.get("in_time"),
+        "reason": g.get("reason"),
+        "destination": g.get("destination"),
+        "status_name": status_name,
+        "status_color": color,
+    }
+
+
+def missed_punch_card(item):
+    status_name, color = _status(_first(item.get("status")))
+    next_approver = item.get("next_approver_details") or {}
+    return {
+        "id": item.get("id"),
+        "date": item.get("date"),
+        "in_time": item.get("in_time") or "",
+        "out_time": item.get("out_time") or "",
+        "reason": item.get("custom_reason") or _first(item.get("reason")).get("name") or "",
+        "type": _first(item.get("type_id")).get("name") or "",
+        "status": status_name,
+        "status_color": color or "#000000",
+        "is_request_deletable": item.get("is_request_deletable", False),
+        "approver_name": next_approver.get("approver_name") or "",
+        "next_message": next_approver.get("message") or "",
+    }
+
+
+# Cards for an apply FixHR accepted but has not listed yet
+def _applied_leave_card(payload):
+    return {"leave_id": None, "start_date": payload.get("leave_start_date"), "end_date": payload.get("leave_end_date"),
+            "reason": payload.get("reason"), "leave_type": "Leave", "status_name": "Requested", "status_color": None}
+
+
+def _applied_gatepass_card(payload):
+    return {"id": None, "emp_name": "", "date": payload.get("date"), "out_time": payload.get("out_time"),
+            "in_time": payload.get("in_time"), "reason": payload.get("reason"),
+            "destination": payload.get("destination"), "status_name": "Requested", "status_color": None}
+
+
+def _applied_missed_punch_card(payload):
+    return {"id": None, "date": payload.get("date"), "in_time": payload.get("in_time") or "",
+            "out_time": payload.get("out_time") or "", "reason": payload.get("custom_reason") or "", "type": "",
+            "status": "Requested", "status_color": "#000000", "is_request_deletable": False,
+            "approver_name": "", "next_message": ""}
+
+
+# list endpoint, rows key, extra params, card builder, card id / start / end / status fields, applied card
+Kind = namedtuple("Kind", ["endpoint", "rows_key", "params", "card", "id_field", "start_field", "end_field",
+                           "status_field", "applied_card"])
+
+KINDS = {
+    "leave": Kind("leave_list", "data", {"self": 1}, leave_card, "leave_id", "start_date", "end_date",
+                  "status_name", _applied_leave_card),
+    "gatepass": Kind("gatepass_list", "data", {}, gatepass_card, "id", "date", "date",
+                     "status_name", _applied_gatepass_card),
+    "missed_punch": Kind("missed_punch_list", "missed_punch_list", {}, missed_punch_card, "id", "date", "date",
+                         "status", _applied_missed_punch_card),
+}
+
+
+class RequestStore:
+    def __init__(self, client=fixhr, sync_seconds=SYNC_SECONDS, full_sync_seconds=FULL_SYNC_SECONDS):
+        self.client = client
+        self.sync_seconds = sync_seconds
+        self.full_sync_seconds = full_sync_seconds
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="request-sync")
+        self._syncing = set()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    # ---------------- reading ----------------
+    def requests(self, token, employee_id, business_id, kind, state=None, first=None, last=None):
+        """
+        (cards, total) of `employee_id`'s requests of `kind`, newest first,
+        optionally only one state and those overlapping [first, last].
+        """
+        from core.models import EmployeeRequest
+
+        self.ensure_synced(token, employee_id, business_id, kind)
+        rows = EmployeeRequest.objects.filter(business_id=str(business_id or ""), employee_id=str(employee_id), kind=kind)
+        if state:
+            rows = rows.filter(state=state)
+        if first:
+            rows = rows.filter(end_date__gte=first)
+        if last:
+            rows = rows.filter(start_date__lte=last)
+        cards = list(rows.order_by("-start_date", "-pk").values_list("card", flat=True))
+        return cards, len(cards)
+
+    def ensure_synced(self, token, employee_id, business_id, kind):
+        """Sync now if the list was never read, in the background if it is stale."""
+        from django.utils import timezone
+
+        from core.models import RequestSync
+
+        key = (str(business_id or ""), str(employee_id), kind)
+        state = RequestSync.objects.filter(business_id=key[0], employee_id=key[1], kind=kind).first()
+        if state is None or state.synced_at is None:
+            self.sync(token, employee_id, business_id, kind)
+            return
+        if timezone.now() - state.synced_at < timedelta(seconds=self.sync_seconds):
+            return
+        with self._lock:
+            if key in self._syncing:
+                return
+            self._syncing.add(key)
+        self._executor.submit(self._background_sync, token, employee_id, business_id, kind, key)
+
+    def _background_sync(self, token, employee_id, business_id, kind, key):
+        try:
+            self._in_worker(self.sync, token, employee_id, business_id, kind)
+        finally:
+            with self._lock:
+                self._syncing.discard(key)
+
+    # ---------------- syncing ----------------
+    def sync(self, token, employee_id, business_id, kind, full=None):
+        """Reconcile one list with FixHR. Returns the number of rows added or changed."""
+        from django.utils import timezone
+
+        from core.models import RequestSync
+
+        key = (str(business_id or ""), str(employee_id), kind)
+        with self._key_lock(key):
+            started = timezone.now()
+            state, _ = RequestSync.objects.get_or_create(business_id=key[0], employee_id=key[1], kind=kind)
+            if full is None:
+                full = state.full_synced_at is None or (
+                    started - state.full_synced_at >= timedelta(seconds=self.full_sync_seconds)
+                )
+
+            spec = KINDS[kind]
+            params = {**spec.params, "emp_id": employee_id} if kind == "leave" else dict(spec.params)
+            changed, seen, page, pages = 0, set(), 1, 1
+            while page <= min(pages, MAX_PAGES):
+                # this store is the cache for these lists; always read through
+                r = self.client.get(spec.endpoint, token=token, params={**params, "page": page, "limit": PAGE_LIMIT},
+                                    use_cache=False)
+                r.raise_for_status()
+                rows, pages, _ = page_rows(r, spec.rows_key)
+                page_changed, page_ids = self._upsert(key, spec, rows)
+                changed += page_changed
+                seen |= page_ids
+                if not full and not page_changed:
+                    break
+                page += 1
+
+            self._drop_stale(key, seen, full, started)
+            state.synced_at = timezone.now()
+            if full:
+                state.full_synced_at = state.synced_at
+            state.save()
+            logger.info("%s sync of %s for %s: %d changed", "Full" if full else "Delta", kind, employee_id, changed)
+            return changed
+
+    def _upsert(self, key, spec, rows):
+        from core.models import EmployeeRequest
+
+        business_id, employee_id, kind = key
+        cards = {}
+        for row in rows:
+            card = spec.card(row)
+            if card.get(spec.id_field) is not None:
+                cards[str(card[spec.id_field])] = card
+        existing = {
+            r.remote_id: r for r in EmployeeRequest.objects.filter(
+                business_id=business_id, employee_id=employee_id, kind=kind, remote_id__in=list(cards)
+            )
+        }
+        new, updated = [], []
+        for remote_id, card in cards.items():
+            row = existing.get(remote_id)
+            if row is not None and row.card == card:
+                continue
+            row = row or EmployeeRequest(business_id=business_id, employee_id=employee_id, kind=kind,
+                                         remote_id=remote_id)
+            self._fill(row, spec, card)
+            (updated if row.pk else new).append(row)
+        EmployeeRequest.objects.bulk_create(new)
+        if updated:
+            EmployeeRequest.objects.bulk_update(updated, ["start_date", "end_date", "state", "status_name", "card"])
+
+        # FixHR now lists what we applied: drop our placeholder for the same day
+        days = {row.start_date for row in new if row.start_date}
+        if days:
+            EmployeeRequest.objects.filter(business_id=business_id, employee_id=employee_id, kind=kind,
+                                           remote_id="", start_date__in=days).delete()
+        return len(new) + len(updated), set(cards)
+
+    @staticmethod
+    def _fill(row, spec, card):
+        row.start_date = parse_day(card.get(spec.start_field))
+        row.end_date = parse_day(card.get(spec.end_field)) or row.start_date
+        row.status_name = card.get(spec.status_field) or ""
+        row.state = state_of(row.status_name)
+        row.card = card
+
+    def _drop_stale(self, key, seen, full, started):
+        """After a full sync, rows FixHR no longer lists (and placeholders older than the sync) go."""
+        from core.models import EmployeeRequest
+
+        if not full:
+            return
+        business_id, employee_id, kind = key
+        mine = EmployeeRequest.objects.filter(business_id=business_id, employee_id=employee_id, kind=kind)
+        mine.exclude(remote_id="").exclude(remote_id__in=list(seen)).delete()
+        mine.filter(remote_id="", updated_at__lt=started).delete()
+
+    # ---------------- local updates ----------------
+    def on_applied(self, job, token=None):
+        """apply_queue callback: FixHR accepted `job`; show it as pending until FixHR lists it."""
+        from core.models import EmployeeRequest
+
+        spec = KINDS.get(job.kind)
+        if spec is None or not job.employee_id:
+            return
+        row = EmployeeRequest(business_id=job.business_id, employee_id=job.employee_id, kind=job.kind)
+        self._fill(row, spec, spec.applied_card(job.payload))
+        row.save()
+
+    def record_approval(self, kind, request_id, approve, final=True, business_id=None):
+        """on_approval on the sync pool, so approval handlers (sync or async) don't wait on the DB."""
+        return self._executor.submit(self._in_worker, self.on_approval, kind, request_id, approve, final, business_id)
+
+    @staticmethod
+    def _in_worker(fn, *args):
+        from django.db import close_old_connections
+
+        try:
+            return fn(*args)
+        except Exception as e:
+            logger.warning("Request store update failed: %s", e)
+        finally:
+            close_old_connections()
+
+    def on_approval(self, kind, request_id, approve, final=True, business_id=None):
+        """An approval step on `request_id` succeeded here."""
+        from core.models import EmployeeRequest, RequestSync
+
+        rows = EmployeeRequest.objects.filter(kind=kind, remote_id=str(request_id))
+        if business_id:
+            rows = rows.filter(business_id=str(business_id))
+        if approve and not final:
+            # still waiting for the next approver; let the owner's next read resync
+            for business, employee in rows.values_list("business_id", "employee_id"):
+                RequestSync.objects.filter(business_id=business, employee_id=employee, kind=kind).update(synced_at=None)
+            return
+        status_name = "Approved" if approve else "Rejected"
+        for row in rows:
+            row.card = {**row.card, KINDS[kind].status_field: status_name}
+            row.status_name = status_name
+            row.state = state_of(status_name)
+            row.save(update_fields=["card", "status_name", "state", "updated_at"])
+
+
+request_store = RequestStore()
+
+for _kind in KINDS:
+    on_success(_kind, request_store.on_applied)
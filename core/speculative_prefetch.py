@@ -0,0 +1,140 @@
+# core/speculative_prefetch.py
+"""
+Speculative FixHR reads while Phi-3 classifies the message.
+
+chat_api used to start its FixHR read only after classification, so
+model latency and API latency added up. Now a cheap keyword guess runs as
+soon as the message arrives. If it names a read task (leave balance,
+pending lists, own missed punches, attendance), that read starts at once
+on a small pool, or as a task under ASGI, in parallel with classification.
+
+Once the final task is known:
+  - it agrees: wait for the speculative read, then run the normal handler,
+    which finds the data in the response cache / attendance store;
+  - it differs: the read is discarded (it only warmed a cache).
+
+Hits and misses per guessed task are reported by ``stats()``.
+FIXHR_SPECULATIVE_PREFETCH=0 turns it off.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from core.fixhr_resilience import inherit_budget, remaining_budget
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("FIXHR_SPECULATIVE_PREFETCH", "1") == "1"
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("FIXHR_SPECULATIVE_THREADS", "4")),
+    thread_name_prefix="speculative",
+)
+# strong refs to speculative asyncio tasks
+_tasks = set()
+_stats = defaultdict(lambda: {"started": 0, "hits": 0, "misses": 0})
+_stats_lock = threading.Lock()
+
+APPLY_WORDS = ("apply", "chahiye", "lena hai", "le lo", "de do", "request for")
+PENDING_WORDS = ("pending", "approval", "approve list", "requests")
+
+
+def guess_read_task(message):
+    """Likely read task for `message`, or None. Only read tasks are guessed: a wrong guess must be harmless."""
+    t = (message or "").lower()
+    if "|" in t or any(w in t for w in APPLY_WORDS):
+        return None
+    if any(w in t for w in PENDING_WORDS):
+        if "gate" in t:
+            return "pending_gatepass"
+        if "missed" in t or "punch" in t:
+            return "pending_missed_punch"
+        if "leave" in t or "chhutti" in t or "chutti" in t:
+            return "pending_leave"
+    if "missed punch" in t and any(w in t for w in ("my ", "mera", "meri", "show", "list")):
+        return "my_missed_punch"
+    if "balance" in t or "bachi" in t or "kitni chutti" in t:
+        return "leave_balance"
+    if "attendance" in t or "haziri" in t or "register" in t:
+        return "attendance_report"
+    return None
+
+
+def _count(task, field):
+    with _stats_lock:
+        _stats[task][field] += 1
+
+
+class Speculation:
+    def __init__(self, task=None, handle=None):
+        self.task = task
+        self.handle = handle
+        self.settled = False
+
+    def _record(self, final_task):
+        if self.task is None or self.settled:
+            return False
+        self.settled = True
+        hit = final_task == self.task
+        _count(self.task, "hits" if hit else "misses")
+        return hit
+
+    def settle(self, final_task):
+        """Record the outcome; on a hit, wait for the read so the handler finds it cached."""
+        if not self._record(final_task):
+            return False
+        try:
+            self.handle.result(timeout=remaining_budget())
+        except Exception as e:
+            # the handler will simply fetch again
+            logger.info("Speculative %s read did not help: %s", self.task, e)
+        return True
+
+    async def asettle(self, final_task):
+        if not self._record(final_task):
+            return False
+        try:
+            await asyncio.wait_for(asyncio.shield(self.handle), timeout=remaining_budget())
+        except Exception as e:
+            logger.info("Speculative %s read did not help: %s", self.task, e)
+        return True
+
+
+def start(message, reads):
+    """
+    Guess the task and start its read. ``reads`` maps task -> zero-argument
+    callable doing the read (blocking). Returns a Speculation (a no-op one
+    when nothing was guessed).
+    """
+    task = guess_read_task(message) if ENABLED else None
+    if task not in reads:
+        return Speculation()
+    _count(task, "started")
+    return Speculation(task, _executor.submit(inherit_budget(reads[task])))
+
+
+def start_async(message, reads):
+    """Same as start(), with ``reads`` mapping task -> zero-argument coroutine function."""
+    task = guess_read_task(message) if ENABLED else None
+    if task not in reads:
+        return Speculation()
+    _count(task, "started")
+    handle = asyncio.get_running_loop().create_task(reads[task]())
+    _tasks.add(handle)
+    handle.add_done_callback(_tasks.discard)
+    # a discarded read that fails must not log "exception never retrieved"
+    handle.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return Speculation(task, handle)
+
+
+def stats():
+    with _stats_lock:
+        rows = {task: dict(values) for task, values in _stats.items()}
+    for values in rows.values():
+        settled = values["hits"] + values["misses"]
+        values["hit_rate"] = round(values["hits"] / settled, 3) if settled else 0.0
+    return rows
@@ -0,0 +1,162 @@
+# core/stage_timing.py
+"""
+Per-request stage timings, reported in a Server-Timing header.
+
+ServerTimingMiddleware starts a timer for each request, and code marks its
+expensive stages:
+
+    with stage_timing.stage("intent"):
+        classification = classify_message(msg)
+
+Time spent in the same stage adds up, so three FixHR calls show as one
+"fixhr" total (the FixHR clients are decorated with
+``@timed_stage("fixhr")``). A stage nested inside itself is counted once, e.g.
+get_all_pages -> get. Every SQL query counts as "db". The response gets
+
+    Server-Timing: intent;dur=412.3, fixhr;dur=88.1, db;dur=3.2, total;dur=530.8
+
+in milliseconds. Browser dev tools show it and `manage.py loadtest` adds
+it up per intent. Work handed to threads through
+core.fixhr_resilience.inherit_budget (page fan-out, speculative reads) is
+counted too, so stages that ran in parallel can sum to more than
+"total". Other threads are not counted.
+
+FIXHR_SERVER_TIMING=0 removes the header and the timer.
+"""
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+ENABLED = os.environ.get("FIXHR_SERVER_TIMING", "1") != "0"
+
+_timer = contextvars.ContextVar("stage_timer", default=None)
+_open = contextvars.ContextVar("open_stages", default=frozenset())
+
+
+class StageTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.totals = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.totals[name] += seconds
+
+    def header(self):
+        with self._lock:
+            parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.totals.items()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+@contextmanager
+def stage(name):
+    """Add the block's wall time to stage `name` of the current request (no-op outside one)."""
+    timer = _timer.get()
+    opened = _open.get()
+    if timer is None or name in opened:
+        yield
+        return
+    token = _open.set(opened | {name})
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+        _open.reset(token)
+
+
+def timed_stage(name):
+    """Decorator form of stage() for plain and async functions."""
+    def wrap(fn):
+        if iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with stage(name):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return run
+    return wrap
+
+
+def _time_query(execute, sql, params, many, context):
+    with stage("db"):
+        return execute(sql, params, many, context)
+
+
+def _install_db_timer(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def parse_header(value):
+    """{"intent": ms, ..., "total": ms} from a Server-Timing header."""
+    stages = {}
+    for part in (value or "").split(","):
+        name, _, rest = part.strip().partition(";")
+        for param in rest.split(";"):
+            key, _, number = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    stages[name] = float(number)
+                except ValueError:
+                    pass
+    return stages
+
+
+class ServerTimingMiddleware:
+    """Times each request's stages and adds the Server-Timing header (WSGI and ASGI)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if ENABLED:
+            connection_created.connect(_install_db_timer, dispatch_uid="stage_timing_db")
+            for connection in connections.all(initialized_only=True):
+                _install_db_timer(None, connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not ENABLED:
+            return self.get_response(request)
+        timer = StageTimer()
+        token = _timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _timer.reset(token)
+        response["Server-Timing"] = timer.header()
+        return response
+
+    async def __acall__(self, request):
+        if not ENABLED:
+            return await self.get_response(request)
+        timer = StageTimer()
+        token = _timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timer.reset(token)
+        response["Server-Timing"] = timer.header()
+        return response
@@ -1,3 +1,1471 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import asyncio
+import csv
+import gzip
+import io
+import json
+import zipfile
+from collections import Counter, defaultdict
+from xml.etree import ElementTree
+
+import httpx
+import requests
+import torch
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+from datetime import date, timedelta
+
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core import apply_queue as apply_queue_module
+from core.apply_queue import ApplyQueue, idempotency_key
+from core import attendance_cursor, attendance_export
+from core.attendance_store import AttendanceStore, MonthGrid
+from core.compact_intent import INTENTS, parse_compact
+from core.convert_intent_dataset_compact import convert_record
+from core.employee_directory import EmployeeDirectory
+from core.fast_json import FastJsonResponse
+from core.fixhr_cache import CachedResponse, CachePolicy, LocalLRUBackend, ResponseCache, token_scope
+from core.fixhr_client import AsyncFixHRClient, FixHRClient
+from core.fixhr_resilience import CircuitBreaker, FixHRUnavailable, Resilience, latency_budget
+from core import inference_telemetry, leave_balance_cache, login_prefetch, speculative_prefetch
+from core.holiday_calendar import (
+    HolidayCalendarService,
+    holiday_question_day,
+    holiday_question_month,
+    is_holiday_question,
+)
+from core import list_cursor
+from core.request_store import RequestStore
+
+
+class CompactDatasetConversionTests(SimpleTestCase):
+    def test_label_only_records_are_not_given_a_made_up_output(self):
+        self.assertEqual(
+            convert_record({"text": "kal leave chahiye", "label": "apply_leave"}),
+            ("label", "kal leave chahiye", "apply_leave"),
+        )
+
+    def test_labels_are_mapped_into_the_prompt_intents(self):
+        for label in ["holiday_list", "leave_balance", "privacy_policy", "apply_gatepass", "apply_missed_punch"]:
+            _, _, intent = convert_record({"text": "x", "label": label})
+            self.assertIn(intent, INTENTS)
+        self.assertIsNone(convert_record({"text": "x", "label": "fire_the_boss"}))
+
+    def test_real_outputs_keep_their_slots(self):
+        output = '{"intent": "apply_leave", "confidence": 0.9, "slots": {"date": "kal", "reason": "shaadi"}}'
+        user, old, compact = convert_record({"input": "kal shaadi hai leave", "output": output})
+        self.assertEqual(old, output)
+        self.assertEqual(compact, "apply_leave|date=kal|reason=shaadi")
+        self.assertEqual(parse_compact(compact)["slots"]["reason"], "shaadi")
+
+    def test_outputs_with_unknown_intents_are_dropped(self):
+        output = {"intent": "privacy_policy_v2", "slots": {}}
+        self.assertIsNone(convert_record({"input": "policy", "output": output}))
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"{}"):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {}
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ResponseCache(LocalLRUBackend(), {"leave_list": CachePolicy(10, 60)})
+        self.now = 1000.0
+        patcher = mock.patch("core.fixhr_cache.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fresh_then_stale_then_expired(self):
+        key = self.cache.key("leave_list", "emp:1", {"page": 1})
+        self.assertEqual(self.cache.lookup("leave_list", key), ("miss", None))
+
+        self.cache.store("leave_list", key, FakeResponse(content=b'{"a": 1}'))
+        state, cached = self.cache.lookup("leave_list", key)
+        self.assertEqual(state, "fresh")
+        self.assertEqual(cached.json(), {"a": 1})
+
+        self.now += 30
+        self.assertEqual(self.cache.lookup("leave_list", key)[0], "stale")
+
+        self.now += 60
+        self.assertEqual(self.cache.lookup("leave_list", key)[0], "miss")
+
+    def test_errors_are_not_cached(self):
+        key = self.cache.key("leave_list", "emp:1", None)
+        self.cache.store("leave_list", key, FakeResponse(status_code=500))
+        self.assertEqual(self.cache.lookup("leave_list", key)[0], "miss")
+
+    def test_invalidate_moves_only_that_scope_to_a_new_version(self):
+        mine = self.cache.key("leave_list", "emp:1", None)
+        theirs = self.cache.key("leave_list", "emp:2", None)
+        self.cache.store("leave_list", mine, FakeResponse())
+        self.cache.store("leave_list", theirs, FakeResponse())
+
+        self.cache.invalidate_after_write("leave_apply", "emp:1")
+
+        self.assertNotEqual(self.cache.key("leave_list", "emp:1", None), mine)
+        self.assertEqual(self.cache.lookup("leave_list", self.cache.key("leave_list", "emp:1", None))[0], "miss")
+        self.assertEqual(self.cache.lookup("leave_list", self.cache.key("leave_list", "emp:2", None))[0], "fresh")
+
+    def test_one_refresh_per_key(self):
+        self.assertTrue(self.cache.claim_refresh("k"))
+        self.assertFalse(self.cache.claim_refresh("k"))
+        self.cache.finish_refresh("leave_list", "k", True)
+        self.assertTrue(self.cache.claim_refresh("k"))
+
+
+class StaleWhileRevalidateTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ResponseCache(LocalLRUBackend(), {"leave_list": CachePolicy(10, 60)})
+        patcher = mock.patch("core.fixhr_client.response_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = FixHRClient()
+
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        sent = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def send(*args):
+            sent.append(args)
+            if len(sent) > 1:
+                started.set()
+                release.wait(5)
+            return FakeResponse(content=b'{"n": %d}' % len(sent))
+
+        with mock.patch.object(self.client, "_send", side_effect=send):
+            self.assertEqual(self.client.get("leave_list", token="t").json(), {"n": 1})
+            self.assertEqual(self.client.get("leave_list", token="t").json(), {"n": 1})
+            self.assertEqual(len(sent), 1)
+
+            key = self.cache.key("leave_list", token_scope("t"), None)
+            stored_at, response = self.cache.backend.get(key)
+            self.cache.backend.set(key, (stored_at - 30, response), 60)
+
+            self.assertEqual(self.client.get("leave_list", token="t").json(), {"n": 1})
+            self.assertTrue(started.wait(5))
+            self.assertEqual(self.client.get("leave_list", token="t").json(), {"n": 1})
+            self.assertEqual(len(sent), 2)
+            release.set()
+
+        for _ in range(100):
+            if self.cache.stats()["endpoints"]["leave_list"].get("refreshes"):
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.client.get("leave_list", token="t").json(), {"n": 2})
+
+    def test_successful_write_invalidates_the_callers_reads(self):
+        with mock.patch.object(self.client, "_send", return_value=FakeResponse()):
+            self.client.get("leave_list", token="t")
+            key = self.cache.key("leave_list", token_scope("t"), None)
+            self.client.post("leave_apply", token="t", data={})
+        self.assertNotEqual(self.cache.key("leave_list", token_scope("t"), None), key)
+
+
+class HolidayQuestionTests(SimpleTestCase):
+    def test_calendar_questions(self):
+        for text in ["holiday list", "next holiday kab hai", "agli chhutti kab hai", "chhuttiyan batao",
+                     "is there any festival holiday"]:
+            self.assertTrue(is_holiday_question(text), text)
+
+    def test_leave_and_other_general_questions(self):
+        for text in ["chhutti kaise apply karu", "kal chhutti chahiye", "current month ka salary",
+                     "current month attendance", "holiday ke din leave apply karna hai"]:
+            self.assertFalse(is_holiday_question(text), text)
+
+    def test_day_words_are_whole_words(self):
+        self.assertEqual(holiday_question_day("is tomorrow a holiday"), "tomorrow")
+        self.assertEqual(holiday_question_day("kal holiday hai kya"), "tomorrow")
+        self.assertEqual(holiday_question_day("aaj holiday hai?"), "today")
+        self.assertIsNone(holiday_question_day("holidays for kalpana's team"))
+        self.assertIsNone(holiday_question_day("holidays in kalyan office"))
+
+    def test_may_is_a_month_only_next_to_a_holiday_word(self):
+        self.assertIsNone(holiday_question_month("may I know the holidays"))
+        self.assertEqual(holiday_question_month("holidays in may"), 5)
+        self.assertEqual(holiday_question_month("may ki chhuttiyan"), 5)
+        self.assertEqual(holiday_question_month("may I see holidays in march"), 3)
+        self.assertEqual(holiday_question_month("holiday list for Sept 2026"), 9)
+        self.assertIsNone(holiday_question_month("holiday list"))
+
+
+class HolidayCalendarServiceTests(SimpleTestCase):
+    def payload(self, name):
+        body = {"result": [{"phl_name": name, "phl_start_date": "26 Jan, 2026", "phl_end_date": "26 Jan, 2026"}]}
+        return CachedResponse(200, json.dumps(body).encode())
+
+    def test_calendar_is_cached_per_business(self):
+        client = mock.Mock()
+        client.get.return_value = self.payload("Republic Day")
+        service = HolidayCalendarService(client=client)
+        for _ in range(2):
+            self.assertEqual([h.name for h in service.holidays_in_month("t", "biz", 2026, 1)], ["Republic Day"])
+        self.assertEqual(client.get.call_count, 1)
+
+    def test_no_business_is_never_cached(self):
+        client = mock.Mock()
+        client.get.side_effect = [self.payload("Holiday A"), self.payload("Holiday B")]
+        service = HolidayCalendarService(client=client)
+        self.assertEqual([h.name for h in service.holidays_in_month("user-a", None, 2026, 1)], ["Holiday A"])
+        self.assertEqual([h.name for h in service.holidays_in_month("user-b", "", 2026, 1)], ["Holiday B"])
+
+
+def attendance_payload(*employees):
+    """monthly-attendance-detail payload: (emp_id, name, {iso_date: status}) per employee."""
+    return {"result": {"data": [
+        {"emp_id": emp_id, "emp_name": name,
+         "days": [{"date": day, "status": status, "in_time": "09:30" if status == "P" else None, "remark": ""}
+                  for day, status in days.items()]}
+        for emp_id, name, days in employees
+    ]}}
+
+
+class LeaveBalanceCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = ResponseCache(LocalLRUBackend(), {"leave_balance": CachePolicy(60, 300)})
+        self.client = FixHRClient()
+        self.sent = []
+
+        def send(name, token, *args):
+            self.sent.append(token)
+            return FakeResponse(content=b'{"n": %d}' % len(self.sent))
+
+        for patcher in (
+            mock.patch("core.fixhr_client.response_cache", self.cache),
+            mock.patch("core.leave_balance_cache.response_cache", self.cache),
+            mock.patch("core.leave_balance_cache.fixhr", self.client),
+            mock.patch.object(self.client, "_send", side_effect=send),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def balance(self, employee_id, token="t", business_id="b1"):
+        return leave_balance_cache.get_balance(token, employee_id, business_id).json()["n"]
+
+    def test_shared_across_tokens_of_one_employee(self):
+        self.assertEqual(self.balance("e1", token="t1"), 1)
+        self.assertEqual(self.balance("e1", token="t2"), 1)
+        self.assertEqual(self.balance("e2", token="t2"), 2)
+
+    def test_apply_drops_only_that_employee(self):
+        self.balance("e1")
+        self.balance("e2")
+        leave_balance_cache.on_leave_applied("t", "e1", "b1", prefetch=False)
+        self.assertEqual(self.balance("e1"), 3)
+        self.assertEqual(self.balance("e2"), 2)
+
+    def test_apply_prefetches_the_new_balance(self):
+        self.balance("e1")
+        leave_balance_cache.on_leave_applied("t", "e1", "b1", prefetch=True)
+        for _ in range(100):
+            if len(self.sent) == 2:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.balance("e1"), 2)
+        self.assertEqual(len(self.sent), 2)
+
+    def test_approval_refreshes_the_whole_business(self):
+        self.balance("e1")
+        self.balance("e2")
+        self.balance("e3", business_id="b2")
+        leave_balance_cache.on_leave_approved("b1")
+        self.assertEqual(self.balance("e1"), 4)
+        self.assertEqual(self.balance("e2"), 5)
+        self.assertEqual(self.balance("e3", business_id="b2"), 3)
+
+
+class LoginPrefetchTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = []
+        record = lambda label: lambda *args, **kwargs: self.calls.append((label, args))
+        for patcher in (
+            mock.patch.object(login_prefetch, "_stats", Counter()),
+            mock.patch.object(login_prefetch.leave_balance_cache, "get_balance", side_effect=record("balance")),
+            mock.patch.object(login_prefetch.fixhr, "get_all_pages", side_effect=record("pages")),
+            mock.patch.object(login_prefetch.attendance_store, "month", side_effect=record("month")),
+            mock.patch.object(login_prefetch.request_store, "ensure_synced", side_effect=record("sync")),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def prefetch(self, **kwargs):
+        futures = login_prefetch.prefetch_after_login("t", "7", "b1", **kwargs)
+        for future in futures:
+            future.result(5)
+        return futures
+
+    def test_employee_gets_balance_attendance_and_own_requests(self):
+        self.prefetch(attendance_view="emp:7")
+        labels = sorted(label for label, _ in self.calls)
+        self.assertEqual(labels, ["balance", "month"] + ["sync"] * len(login_prefetch.REQUEST_KINDS))
+        self.assertNotIn("pages", labels)
+        self.assertIn(("balance", ("t", "7", "b1")), self.calls)
+
+    def test_approver_also_gets_pending_lists(self):
+        self.prefetch(approver=True)
+        pages = [args for label, args in self.calls if label == "pages"]
+        self.assertEqual(sorted(args[0] for args in pages), sorted(login_prefetch.PENDING_LISTS))
+        self.assertNotIn("month", [label for label, _ in self.calls])
+
+    def test_failures_are_counted_not_raised(self):
+        login_prefetch.leave_balance_cache.get_balance.side_effect = requests.ConnectionError("down")
+        self.prefetch()
+        stats = login_prefetch.stats()
+        self.assertEqual(stats["leave_balance:failed"], 1)
+        self.assertEqual(stats["my_leave:ok"], 1)
+
+    def test_nothing_without_token_or_when_disabled(self):
+        self.assertEqual(login_prefetch.prefetch_after_login(None, "7", "b1"), [])
+        with mock.patch.object(login_prefetch, "PREFETCH_ON_LOGIN", False):
+            self.assertEqual(self.prefetch(), [])
+        self.assertEqual(self.calls, [])
+
+
+class SpeculativePrefetchTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(speculative_prefetch, "_stats",
+                                    defaultdict(lambda: {"started": 0, "hits": 0, "misses": 0}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_guesses_only_read_tasks(self):
+        guess = speculative_prefetch.guess_read_task
+        self.assertEqual(guess("kitni chutti bachi hai"), "leave_balance")
+        self.assertEqual(guess("show pending gate pass requests"), "pending_gatepass")
+        self.assertEqual(guess("pending leave approvals"), "pending_leave")
+        self.assertEqual(guess("my attendance this month"), "attendance_report")
+        self.assertIsNone(guess("apply leave for tomorrow, balance check later"))
+        self.assertIsNone(guess("approve leave|12|3|4|5|ok"))
+        self.assertIsNone(guess("hello"))
+
+    def test_hit_waits_for_the_read(self):
+        release = threading.Event()
+        done = []
+
+        def read():
+            release.wait(5)
+            done.append(True)
+
+        speculation = speculative_prefetch.start("leave balance", {"leave_balance": read})
+        threading.Timer(0.05, release.set).start()
+        self.assertTrue(speculation.settle("leave_balance"))
+        self.assertEqual(done, [True])
+        self.assertFalse(speculation.settle("leave_balance"))
+        self.assertEqual(speculative_prefetch.stats()["leave_balance"],
+                         {"started": 1, "hits": 1, "misses": 0, "hit_rate": 1.0})
+
+    def test_miss_does_not_wait_and_failures_are_swallowed(self):
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        speculation = speculative_prefetch.start("leave balance", {"leave_balance": lambda: gate.wait(5)})
+        self.assertFalse(speculation.settle("apply_leave"))
+        self.assertEqual(speculative_prefetch.stats()["leave_balance"]["misses"], 1)
+
+        def fail():
+            raise requests.ConnectionError("down")
+
+        self.assertTrue(speculative_prefetch.start("leave balance", {"leave_balance": fail}).settle("leave_balance"))
+
+    def test_nothing_guessed_or_disabled_is_a_no_op(self):
+        read = mock.Mock()
+        self.assertFalse(speculative_prefetch.start("hello", {"leave_balance": read}).settle("general"))
+        with mock.patch.object(speculative_prefetch, "ENABLED", False):
+            self.assertFalse(speculative_prefetch.start("leave balance", {"leave_balance": read}).settle("leave_balance"))
+        read.assert_not_called()
+        self.assertEqual(speculative_prefetch.stats(), {})
+
+    def test_async_read_runs_alongside_the_caller(self):
+        order = []
+
+        async def read():
+            order.append("read")
+
+        async def run():
+            speculation = speculative_prefetch.start_async("leave balance", {"leave_balance": read})
+            order.append("classify")
+            return await speculation.asettle("leave_balance")
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(order, ["classify", "read"])
+
+
+class MonthGridTests(SimpleTestCase):
+    def test_bytes_round_trip_keeps_rows_and_can_be_merged_into(self):
+        grid = MonthGrid(2026, 3)
+        grid.merge(attendance_payload(
+            (1, "Priya Sharma", {"2026-03-02": "P", "2026-03-03": "A"}),
+            (2, "Amit Singh", {"2026-03-02": "L"}),
+        ))
+        copy = MonthGrid.from_bytes(grid.to_bytes())
+        self.assertEqual(list(copy.rows()), list(grid.rows()))
+        self.assertEqual([r["status"] for r in copy.rows(ids={"1"})], ["P", "A"])
+
+        copy.merge(attendance_payload((2, "Amit Singh", {"2026-03-03": "P"}), (3, "Ravi Kumar", {"2026-03-03": "A"})))
+        self.assertEqual([(r["employee_id"], r["date"], r["status"]) for r in copy.rows(ids={"2", "3"})],
+                         [(2, "2026-03-02", "L"), (2, "2026-03-03", "P"), (3, "2026-03-03", "A")])
+        self.assertEqual(copy.rows(ids={"3"}).__next__()["in_time"], "-")
+
+    def test_merge_only_writes_the_given_range(self):
+        grid = MonthGrid(2026, 3)
+        grid.merge(attendance_payload((1, "Priya", {"2026-03-01": "P", "2026-03-05": "P"})))
+        grid.merge(attendance_payload((1, "Priya", {"2026-03-01": "A", "2026-03-05": "A"})),
+                   date(2026, 3, 4), date(2026, 3, 31))
+        self.assertEqual([r["status"] for r in grid.rows()], ["P", "A"])
+        self.assertEqual([r["date"] for r in grid.rows(date(2026, 3, 2), date(2026, 3, 31))], ["2026-03-05"])
+
+
+class FakeAttendanceClient:
+    """Answers the attendance endpoint with a different employee set per token."""
+
+    def __init__(self, by_token):
+        self.by_token = by_token
+        self.calls = []
+
+    def get(self, name, token=None, params=None, use_cache=True):
+        self.calls.append((token, params["year"], params["month"]))
+        return CachedResponse(200, json.dumps(self.by_token[token]).encode())
+
+
+class AttendanceStoreTests(TestCase):
+    def setUp(self):
+        self.client = FakeAttendanceClient({
+            "manager-a": attendance_payload((1, "Priya", {"2025-01-02": "P"})),
+            "manager-b": attendance_payload((2, "Amit", {"2025-01-02": "A"})),
+        })
+
+    def test_closed_months_are_kept_per_view(self):
+        store = AttendanceStore(client=self.client)
+        a = store.month("manager-a", "biz", "emp:10", 2025, 1)
+        b = store.month("manager-b", "biz", "emp:20", 2025, 1)
+        self.assertEqual([r["employee_id"] for r in a.rows()], [1])
+        self.assertEqual([r["employee_id"] for r in b.rows()], [2])
+        self.assertEqual(len(self.client.calls), 2)
+
+        # a fresh process reads each user's month back from the DB, not the other's
+        store = AttendanceStore(client=self.client)
+        self.assertEqual([r["employee_id"] for r in store.month("manager-b", "biz", "emp:20", 2025, 1).rows()], [2])
+        self.assertEqual([r["employee_id"] for r in store.month("manager-a", "biz", "emp:10", 2025, 1).rows()], [1])
+        self.assertEqual(len(self.client.calls), 2)
+
+    def test_months_in_memory_are_bounded(self):
+        with mock.patch("core.attendance_store.MEMORY_MONTHS", 2):
+            store = AttendanceStore(client=self.client)
+        for month in (1, 2, 3):
+            store.month("manager-a", "biz", "emp:10", 2025, month)
+        self.assertEqual(len(store._closed._data), 2)
+        # the evicted month comes back from the DB, not from FixHR
+        with self.assertNumQueries(1):
+            store.month("manager-a", "biz", "emp:10", 2025, 1)
+        self.assertEqual(len(self.client.calls), 3)
+
+
+class FakeAsyncAttendanceClient(FakeAttendanceClient):
+    async def get(self, name, token=None, params=None, use_cache=True):
+        await asyncio.sleep(0.01)
+        return FakeAttendanceClient.get(self, name, token, params, use_cache)
+
+
+class AsyncAttendanceStoreTests(SimpleTestCase):
+    def test_concurrent_requests_for_a_month_fetch_it_once(self):
+        client = FakeAsyncAttendanceClient({"t": attendance_payload((1, "Priya", {"2026-03-02": "P"}))})
+        store = AttendanceStore(async_client=client)
+
+        async def load():
+            today = date(2026, 3, 10)
+            return await asyncio.gather(*(store.amonth("t", "biz", "emp:1", 2026, 3, today) for _ in range(5)))
+
+        grids = asyncio.run(load())
+        self.assertEqual(len(client.calls), 1)
+        self.assertTrue(all(g is grids[0] for g in grids))
+
+
+class ListCursorTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(list_cursor, "_store", LocalLRUBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def reply(self, count):
+        return {"reply_type": "pending_leaves", "leaves": [{"id": i} for i in range(count)]}
+
+    def test_short_lists_have_no_cursor(self):
+        chunk = list_cursor.first_chunk(self.reply(3), "leaves", "t")
+        self.assertEqual(len(chunk["leaves"]), 3)
+        self.assertIsNone(chunk["next_cursor"])
+
+    def test_cursor_walks_the_whole_list_in_order(self):
+        chunk = list_cursor.first_chunk(self.reply(2 * list_cursor.LIST_CHUNK + 5), "leaves", "t")
+        seen = [item["id"] for item in chunk["leaves"]]
+        while chunk["next_cursor"]:
+            chunk = list_cursor.next_chunk(chunk["next_cursor"], "t")
+            self.assertEqual(chunk["reply_type"], "pending_leaves")
+            seen.extend(item["id"] for item in chunk["leaves"])
+        self.assertEqual(seen, list(range(2 * list_cursor.LIST_CHUNK + 5)))
+        self.assertEqual(chunk["total"], len(seen))
+
+    def test_cursor_is_bound_to_its_token(self):
+        cursor = list_cursor.first_chunk(self.reply(list_cursor.LIST_CHUNK + 1), "leaves", "t")["next_cursor"]
+        self.assertIsNone(list_cursor.next_chunk(cursor, "someone-else"))
+        self.assertIsNotNone(list_cursor.next_chunk(cursor, "t"))
+
+    def test_list_cut_short_by_fixhr_paging_is_marked(self):
+        reply = dict(self.reply(list_cursor.LIST_CHUNK + 1), total=5000)
+        chunk = list_cursor.first_chunk(reply, "leaves", "t")
+        self.assertIsNotNone(chunk["next_cursor"])
+        chunk = list_cursor.next_chunk(chunk["next_cursor"], "t")
+        self.assertIsNone(chunk["next_cursor"])
+        self.assertTrue(chunk["truncated"])
+        self.assertFalse(list_cursor.first_chunk(self.reply(3), "leaves", "t")["truncated"])
+
+    def test_get_all_pages_reports_fixhr_total_past_max_pages(self):
+        client = FixHRClient(base_url="http://fixhr.test")
+
+        def page(name, token=None, params=None, **kwargs):
+            rows = [{"id": (params["page"] - 1) * params["limit"] + i} for i in range(params["limit"])]
+            body = {"result": {"data": rows, "total": 10 * params["limit"], "last_page": 10}}
+            return CachedResponse(200, json.dumps(body).encode())
+
+        with mock.patch.object(client, "get", side_effect=page):
+            rows, total = client.get_all_pages("leave_list", token="t", limit=5, max_pages=3)
+        self.assertEqual([r["id"] for r in rows], list(range(15)))
+        self.assertEqual(total, 50)
+
+    def test_unknown_or_malformed_cursors(self):
+        self.assertIsNone(list_cursor.next_chunk("nope:20", "t"))
+        self.assertIsNone(list_cursor.next_chunk("nope", "t"))
+        self.assertIsNone(list_cursor.next_chunk(None, "t"))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 100.0
+        patcher = mock.patch("core.fixhr_resilience.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("leave_list", failures=3, open_seconds=30, slow_seconds=5)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.record(False)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_opens_after_consecutive_failures_and_slow_calls(self):
+        self.breaker.record(False)
+        self.breaker.record(True, latency=6)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(FixHRUnavailable):
+            self.breaker.before_call()
+
+    def test_success_resets_the_count(self):
+        self.breaker.record(False)
+        self.breaker.record(False)
+        self.breaker.record(True, latency=0.1)
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.open_breaker()
+        self.now += 31
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(FixHRUnavailable):
+            self.breaker.before_call()
+
+        self.breaker.record(True, latency=0.1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(FixHRUnavailable):
+            self.breaker.before_call()
+        self.assertEqual(self.breaker.stats()["times_opened"], 2)
+
+    def test_released_probe_lets_the_next_call_probe(self):
+        self.open_breaker()
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.release()
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+class ClientBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.resilience = Resilience()
+        patcher = mock.patch("core.fixhr_client.resilience", self.resilience)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = self.resilience.breaker("leave_apply")
+        self.breaker.state = CircuitBreaker.HALF_OPEN
+
+    def test_unexpected_request_errors_end_the_probe(self):
+        client = FixHRClient()
+        with mock.patch.object(client, "_request_once", side_effect=requests.exceptions.ChunkedEncodingError()):
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                client.post("leave_apply", token="t", data={})
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker._probing)
+
+    def test_cancelled_probe_is_released(self):
+        client = AsyncFixHRClient()
+
+        async def cancelled(*args):
+            raise asyncio.CancelledError()
+
+        async def run():
+            with mock.patch.object(client, "_request_once", side_effect=cancelled):
+                with self.assertRaises(asyncio.CancelledError):
+                    await client.post("leave_apply", token="t", data={})
+
+        asyncio.run(run())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.breaker.before_call()
+
+    def test_budget_caps_timeouts_and_fails_fast(self):
+        client = FixHRClient()
+        response = CachedResponse(200, b"{}")
+        with mock.patch.object(client, "_request_once", return_value=response) as send:
+            with latency_budget(2):
+                client.post("leave_apply", token="t", data={})
+            self.assertLessEqual(send.call_args.args[-1], 2)
+            with latency_budget(0):
+                with self.assertRaises(FixHRUnavailable):
+                    client.post("leave_apply", token="t", data={})
+
+
+
+class AsyncClientTests(SimpleTestCase):
+    def setUp(self):
+        self.seen = []
+
+        def handler(request):
+            self.seen.append(request)
+            return httpx.Response(200, json={"result": {"ok": True}})
+
+        transport = httpx.MockTransport(handler)
+        real_client = httpx.AsyncClient
+        patcher = mock.patch("core.fixhr_client.httpx.AsyncClient",
+                             side_effect=lambda **kwargs: real_client(transport=transport, **kwargs))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requests_share_the_loops_client_and_it_closes_with_the_loop(self):
+        client = AsyncFixHRClient(base_url="http://fixhr.test")
+
+        async def run():
+            first = await client.get("leave_balance", token="t", use_cache=False)
+            second = await client.get("leave_balance", token="t", use_cache=False)
+            return first.json(), await client.client(), await client.client()
+
+        body, pooled, again = asyncio.run(run())
+        self.assertEqual(body, {"result": {"ok": True}})
+        self.assertIs(pooled, again)
+        self.assertEqual(len(self.seen), 2)
+        self.assertEqual(self.seen[0].headers["authorization"], "Bearer t")
+        self.assertTrue(pooled.is_closed)
+
+    def test_async_to_sync_loops_do_not_leak_clients(self):
+        from asgiref.sync import async_to_sync
+
+        client = AsyncFixHRClient(base_url="http://fixhr.test")
+        pooled = [async_to_sync(client.client)() for _ in range(3)]
+        self.assertTrue(all(c.is_closed for c in pooled))
+
+    def test_aclose(self):
+        client = AsyncFixHRClient(base_url="http://fixhr.test")
+
+        async def run():
+            pooled = await client.client()
+            await client.aclose()
+            return pooled, await client.client()
+
+        closed, fresh = asyncio.run(run())
+        self.assertTrue(closed.is_closed)
+        self.assertIsNot(closed, fresh)
+
+
+class ApplyQueueTests(TestCase):
+    payload = {"leave_type": "CL", "date": "2026-03-02", "reason": "Family function"}
+
+    def setUp(self):
+        self.queue = ApplyQueue(max_attempts=3)
+        # submit() must not start worker threads here
+        patcher = mock.patch.object(self.queue, "start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self, payload=None, token="tok"):
+        return self.queue.submit("leave", payload or self.payload, token, "7", "biz")
+
+    def attempt(self, job_id, **post):
+        from core.models import ApplyJob
+
+        ApplyJob.objects.filter(pk=job_id).update(status=apply_queue_module.RUNNING, attempts=1)
+        job = ApplyJob.objects.get(pk=job_id)
+        with mock.patch.object(apply_queue_module.fixhr, "post", **post) as sent:
+            self.queue._attempt(job)
+        job.refresh_from_db()
+        return job, sent
+
+    def test_same_apply_twice_is_one_job(self):
+        first = self.submit()
+        again = self.submit({**self.payload, "reason": "  family   FUNCTION "})
+        self.assertFalse(first["duplicate"])
+        self.assertTrue(again["duplicate"])
+        self.assertEqual(first["job"]["id"], again["job"]["id"])
+        self.assertNotEqual(idempotency_key("7", "leave", self.payload),
+                            idempotency_key("7", "leave", {**self.payload, "date": "2026-03-03"}))
+
+    def test_token_is_not_stored(self):
+        from core.models import ApplyJob
+
+        job_id = self.submit(token="secret-token")["job"]["id"]
+        self.assertNotIn("token", [f.name for f in ApplyJob._meta.get_fields()])
+        callback = mock.Mock()
+        with mock.patch.dict(apply_queue_module._callbacks, {"leave": [callback]}, clear=True):
+            job, sent = self.attempt(job_id, return_value=CachedResponse(200, b'{"status": true}'))
+        self.assertEqual(sent.call_args.kwargs["token"], "secret-token")
+        self.assertEqual(callback.call_args.args[1], "secret-token")
+        self.assertEqual(job.status, apply_queue_module.DONE)
+        self.assertNotIn(job_id, self.queue._tokens)
+
+    def test_failures_before_sending_are_retried(self):
+        refused = requests.ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "refused")))
+        for error in [requests.ConnectTimeout(), refused, FixHRUnavailable("leave_apply", "circuit open")]:
+            job_id = self.submit({**self.payload, "reason": repr(error)})["job"]["id"]
+            job, _ = self.attempt(job_id, side_effect=error)
+            self.assertEqual(job.status, apply_queue_module.QUEUED, repr(error))
+
+        job_id = self.submit({**self.payload, "reason": "503"})["job"]["id"]
+        job, _ = self.attempt(job_id, return_value=CachedResponse(503, b""))
+        self.assertEqual(job.status, apply_queue_module.QUEUED)
+
+    def test_failures_after_sending_are_not_retried(self):
+        aborted = requests.ConnectionError(ProtocolError("Connection aborted.", ConnectionResetError()))
+        for error in [requests.ReadTimeout(), aborted, requests.exceptions.ChunkedEncodingError()]:
+            job_id = self.submit({**self.payload, "reason": repr(error)})["job"]["id"]
+            job, _ = self.attempt(job_id, side_effect=error)
+            self.assertEqual(job.status, apply_queue_module.UNKNOWN, repr(error))
+
+        for status in (502, 504):
+            job_id = self.submit({**self.payload, "reason": str(status)})["job"]["id"]
+            job, _ = self.attempt(job_id, return_value=CachedResponse(status, b""))
+            self.assertEqual(job.status, apply_queue_module.UNKNOWN)
+
+    def test_fixhr_rejection_fails_the_job(self):
+        job_id = self.submit()["job"]["id"]
+        job, _ = self.attempt(job_id, return_value=CachedResponse(200, b'{"status": false, "message": "No balance"}'))
+        self.assertEqual(job.status, apply_queue_module.FAILED)
+        self.assertEqual(job.message, "No balance")
+
+    def test_only_jobs_with_a_token_here_are_claimed(self):
+        from django.utils import timezone
+
+        from core.models import ApplyJob
+
+        job_id = self.submit()["job"]["id"]
+        other = ApplyQueue()
+        self.assertIsNone(other._claim())
+        self.assertEqual(self.queue._claim().pk, job_id)
+
+        # queued by a process that is gone: failed, never sent
+        orphan_id = self.submit({**self.payload, "reason": "orphan"})["job"]["id"]
+        ApplyJob.objects.filter(pk=orphan_id).update(
+            next_attempt_at=timezone.now() - timedelta(seconds=apply_queue_module.ORPHAN_SECONDS + 1))
+        other._claim()
+        self.assertEqual(ApplyJob.objects.get(pk=orphan_id).status, apply_queue_module.FAILED)
+
+
+class EmployeeDirectoryTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = EmployeeDirectory()
+        self.directory.add("1", "Amit Singh")
+        self.directory.add("2", "Priya Sharma")
+        self.directory.add("3", "Priya Verma")
+        self.directory.add("4", "Raj Kumar")
+        self.directory.add("5", "Rajesh Gupta")
+
+    def test_single_name_matches_everyone_with_it(self):
+        found = self.directory.resolve("attendance of priya")
+        self.assertEqual(found.ids, {"2", "3"})
+        self.assertEqual(found.method, "exact")
+        self.assertEqual([name for _, name in found.matches], ["Priya Sharma", "Priya Verma"])
+
+    def test_full_name_narrows(self):
+        self.assertEqual(self.directory.resolve("priya verma").ids, {"3"})
+
+    def test_contradicting_name_matches_nobody(self):
+        for phrase in ("priya singh", "singh priya", "amit sharma"):
+            found = self.directory.resolve(phrase)
+            self.assertEqual(found.ids, frozenset(), phrase)
+            self.assertEqual(found.method, "none", phrase)
+
+    def test_contradicting_word_falls_back_to_fuzzy(self):
+        self.directory.add("6", "Priya Singhal")
+        found = self.directory.resolve("priya singh")
+        self.assertEqual(found.ids, {"6"})
+        self.assertEqual(found.method, "fuzzy")
+
+    def test_unknown_word_is_ignored(self):
+        self.assertEqual(self.directory.resolve("priya sharma xyzzy").ids, {"2"})
+
+    def test_only_filler_words_is_empty(self):
+        found = self.directory.resolve("attendance for this month")
+        self.assertEqual(found.method, "empty")
+        self.assertEqual(found.ids, frozenset())
+
+    def test_prefix_and_exact_preference(self):
+        self.assertEqual(self.directory.resolve("raj").ids, {"4"})
+        found = self.directory.resolve("sharm")
+        self.assertEqual((found.ids, found.method), ({"2"}, "prefix"))
+
+    def test_typo(self):
+        found = self.directory.resolve("priay")
+        self.assertEqual(found.ids, {"2", "3"})
+        self.assertEqual(found.method, "fuzzy")
+
+    def test_renamed_employee_is_reindexed(self):
+        self.directory.add("1", "Amit Rathore")
+        self.assertEqual(self.directory.resolve("singh").method, "none")
+        self.assertEqual(self.directory.resolve("rathore").ids, {"1"})
+
+
+def register_row(**values):
+    """A row as MonthGrid.rows yields it; "-" is the grid's placeholder for an empty field."""
+    row = {"employee_id": "7", "employee_name": "Priya Sharma", "date": "2026-03-02", "status": "P",
+           "in_time": "09:30", "out_time": "-", "work_hours": "-", "late": False, "overtime": "-", "remark": "-"}
+    row.update(values)
+    return row
+
+
+def grid_rows(*days):
+    """Rows of a MonthGrid built from one employee per entry of ``days`` ({iso_date: day fields})."""
+    grid = MonthGrid(2026, 3)
+    grid.merge({"result": {"data": [
+        {"emp_id": i, "emp_name": f"Emp {i}", "days": [{"date": d, **fields} for d, fields in emp_days.items()]}
+        for i, emp_days in enumerate(days, start=1)
+    ]}})
+    return list(grid.rows())
+
+
+class AttendanceExportTests(SimpleTestCase):
+    def rows(self, employees):
+        present = {"status": "P", "in_time": "09:30", "out_time": "18:00", "work_hrs": "8:30"}
+        return grid_rows(*[{"2026-03-02": present, "2026-03-03": {"status": "A"}}] * employees)
+
+    def read_csv(self, chunks):
+        text = b"".join(chunks).decode()
+        self.assertTrue(text.startswith("\ufeff"))
+        return list(csv.reader(io.StringIO(text[1:])))
+
+    def read_xlsx(self, chunks):
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as workbook:
+            self.assertIn("xl/workbook.xml", workbook.namelist())
+            sheet = ElementTree.fromstring(workbook.read("xl/worksheets/sheet1.xml"))
+        ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        return [[t.text or "" for t in row.iterfind("s:c/s:is/s:t", ns)] for row in sheet.iterfind(".//s:row", ns)]
+
+    def test_csv_rows_and_chunking(self):
+        employees = attendance_export.CHUNK_ROWS // 2 + 2
+        chunks = list(attendance_export.csv_chunks(iter(self.rows(employees))))
+        self.assertEqual(len(chunks), 2)
+        table = self.read_csv(chunks)
+        self.assertEqual(table[0], [title for title, _ in attendance_export.COLUMNS])
+        self.assertEqual(len(table), 2 * employees + 1)
+        self.assertEqual(table[1], ["1", "Emp 1", "2026-03-02", "P", "09:30", "18:00", "8:30", "No", "", ""])
+        self.assertEqual(table[2], ["1", "Emp 1", "2026-03-03", "A", "", "", "", "No", "", ""])
+
+    def test_xlsx_is_a_readable_workbook(self):
+        employees = attendance_export.CHUNK_ROWS // 2 + 2
+        table = self.read_xlsx(attendance_export.xlsx_chunks(iter(self.rows(employees))))
+        self.assertEqual(table[0], [title for title, _ in attendance_export.COLUMNS])
+        self.assertEqual(len(table), 2 * employees + 1)
+        self.assertEqual(table[-1], [str(employees), f"Emp {employees}", "2026-03-03", "A",
+                                     "", "", "", "No", "", ""])
+
+    def test_formulas_are_written_as_text(self):
+        rows = grid_rows(
+            {"2026-03-02": {"status": "P", "remark": '=HYPERLINK("http://x")', "work_hrs": "-1+1", "is_late": True}},
+            {"2026-03-02": {"status": "P", "remark": "<b> & co", "ot": "+2", "out_time": "@SUM(A1)"}},
+        )
+        for table in (self.read_csv(attendance_export.csv_chunks(iter(rows))),
+                      self.read_xlsx(attendance_export.xlsx_chunks(iter(rows)))):
+            self.assertEqual(table[1][6:], ["'-1+1", "Yes", "", "'=HYPERLINK(\"http://x\")"])
+            self.assertEqual(table[2][5:], ["'@SUM(A1)", "", "No", "'+2", "<b> & co"])
+
+    def test_empty_register_has_only_the_header(self):
+        self.assertEqual(len(self.read_csv(attendance_export.csv_chunks(iter(())))), 1)
+        self.assertEqual(len(self.read_xlsx(attendance_export.xlsx_chunks(iter(())))), 1)
+
+
+class AttendanceCursorTests(SimpleTestCase):
+    def setUp(self):
+        attendance_cursor._store.clear()
+
+    def register(self, employees, days):
+        # month order, as the store yields it: every employee on day 1, then day 2...
+        return [register_row(employee_id=str(e), employee_name=f"Emp {e}", date=f"2026-03-{d:02d}")
+                for d in range(1, days + 1) for e in range(employees)]
+
+    def test_pages_cover_every_row_in_employee_order(self):
+        page = attendance_cursor.first_page(self.register(5, 3), {"title": "March"}, "tok-a", page_rows=4)
+        self.assertEqual(page.total, 15)
+        seen = list(page.rows)
+        while page.next_cursor:
+            page = attendance_cursor.next_page(page.next_cursor, "tok-a", page_rows=4)
+            self.assertEqual(page.context, {"title": "March"})
+            seen.extend(page.rows)
+        self.assertEqual([(r["employee_id"], r["date"]) for r in seen],
+                         [(str(e), f"2026-03-{d:02d}") for e in range(5) for d in range(1, 4)])
+
+    def test_page_never_splits_an_employee(self):
+        page = attendance_cursor.first_page(self.register(3, 4), {}, "tok-a", page_rows=5)
+        self.assertEqual(len(page.rows), 8)
+        self.assertEqual(page.next_cursor.split(":")[1], "8")
+
+    def test_short_register_has_no_cursor(self):
+        page = attendance_cursor.first_page(self.register(2, 2), {}, "tok-a", page_rows=10)
+        self.assertIsNone(page.next_cursor)
+        self.assertEqual(len(attendance_cursor._store._data), 0)
+
+    def test_cursor_is_bound_to_its_token(self):
+        page = attendance_cursor.first_page(self.register(5, 3), {}, "tok-a", page_rows=3)
+        self.assertIsNone(attendance_cursor.next_page(page.next_cursor, "tok-b", page_rows=3))
+        self.assertIsNone(attendance_cursor.next_page(page.next_cursor, None, page_rows=3))
+        self.assertIsNotNone(attendance_cursor.next_page(page.next_cursor, "tok-a", page_rows=3))
+
+    def test_bad_and_expired_cursors(self):
+        page = attendance_cursor.first_page(self.register(5, 3), {}, "tok-a", page_rows=3)
+        cursor_id = page.next_cursor.split(":")[0]
+        for cursor in ("", "nope:3", f"{cursor_id}:x", f"{cursor_id}:15", None):
+            self.assertIsNone(attendance_cursor.next_page(cursor, "tok-a", page_rows=3), cursor)
+        with mock.patch("core.attendance_cursor.time.time", return_value=time.time() + attendance_cursor.CURSOR_TTL + 1):
+            self.assertIsNone(attendance_cursor.next_page(page.next_cursor, "tok-a", page_rows=3))
+
+    def test_pages_span_chunks(self):
+        with mock.patch.object(attendance_cursor, "CHUNK_ROWS", 4):
+            page = attendance_cursor.first_page(self.register(5, 3), {}, "tok-a", page_rows=5)
+            self.assertEqual(len(attendance_cursor._store._data), 5)
+            page = attendance_cursor.next_page(page.next_cursor, "tok-a", page_rows=5)
+        self.assertEqual((page.offset, len(page.rows)), (6, 6))
+        self.assertEqual([r["employee_id"] for r in page.rows], ["2"] * 3 + ["3"] * 3)
+
+    def test_local_store_is_bounded_by_rows(self):
+        store = attendance_cursor._CursorStore(max_entries=100, max_rows=25)
+        with mock.patch.object(attendance_cursor, "_store", store), mock.patch.object(attendance_cursor, "CHUNK_ROWS", 5):
+            older = attendance_cursor.first_page(self.register(5, 3), {}, "tok-a", page_rows=3)
+            newer = attendance_cursor.first_page(self.register(5, 3), {}, "tok-a", page_rows=3)
+            self.assertIsNone(attendance_cursor.next_page(older.next_cursor, "tok-a", page_rows=3))
+            self.assertIsNotNone(attendance_cursor.next_page(newer.next_cursor, "tok-a", page_rows=3))
+            self.assertEqual(store.rows, 25)
+            # a register bigger than the bound keeps its latest chunks
+            big = attendance_cursor.first_page(self.register(10, 3), {}, "tok-a", page_rows=3)
+            cursor_id = big.next_cursor.split(":")[0]
+            self.assertIsNone(attendance_cursor.next_page(big.next_cursor, "tok-a", page_rows=3))
+            self.assertEqual(attendance_cursor.next_page(f"{cursor_id}:27", "tok-a", page_rows=3).offset, 27)
+            self.assertEqual(store.rows, 25)
+
+    def test_shared_backend_serves_other_workers(self):
+        from django.core.cache import caches
+        from core.fixhr_cache import DjangoCacheBackend
+
+        backend = DjangoCacheBackend()
+        with mock.patch.dict("os.environ", {"FIXHR_CACHE_BACKEND": "django"}), \
+                mock.patch.object(DjangoCacheBackend, "cache", caches["default"]):
+            store = attendance_cursor._build_store()
+            self.assertIsInstance(store, DjangoCacheBackend)
+            with mock.patch.object(attendance_cursor, "_store", store):
+                page = attendance_cursor.first_page(self.register(5, 3), {"title": "March"}, "tok-a", page_rows=3)
+            # a fresh store object, as another worker would have
+            with mock.patch.object(attendance_cursor, "_store", backend):
+                page = attendance_cursor.next_page(page.next_cursor, "tok-a", page_rows=3)
+        self.assertEqual((page.offset, page.context), (3, {"title": "March"}))
+
+
+class FakeGenerateModel:
+    """Appends ``new_tokens`` one at a time, calling the stopping criteria like model.generate does."""
+
+    generation_config = None
+
+    def __init__(self, new_tokens, before_token=None):
+        self.new_tokens = new_tokens
+        self.before_token = before_token
+
+    def generate(self, input_ids, stopping_criteria, max_new_tokens=None, eos_token_id=None):
+        output = input_ids
+        for token in self.new_tokens:
+            if self.before_token:
+                self.before_token()
+            output = torch.cat([output, torch.tensor([[token]])], dim=1)
+            stopping_criteria(output, None)
+        return output
+
+
+class InferenceTelemetryTests(SimpleTestCase):
+    def setUp(self):
+        inference_telemetry.reset()
+        self.addCleanup(inference_telemetry.reset)
+
+    def generate(self, model, **kwargs):
+        return inference_telemetry.timed_generate("tiny", model, input_ids=torch.tensor([[1, 2, 3]]), **kwargs)
+
+    def test_stats_of_one_call(self):
+        output, stats = self.generate(FakeGenerateModel([7, 8, 2]), max_new_tokens=10, eos_token_id=2)
+        self.assertEqual(output.shape[-1], 6)
+        self.assertEqual((stats["prompt_tokens"], stats["generated_tokens"]), (3, 3))
+        self.assertEqual(stats["stop_reason"], "eos")
+        self.assertEqual(stats["concurrent"], 0)
+        self.assertIsNone(stats["queue_wait"])
+        self.assertGreaterEqual(stats["total_time"], stats["prefill_time"])
+
+        _, stats = self.generate(FakeGenerateModel([7, 8]), max_new_tokens=2, eos_token_id=2)
+        self.assertEqual(stats["stop_reason"], "max_new_tokens")
+
+    def test_queue_wait_is_measured_for_queued_calls(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        gate = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(gate.wait, 5)
+            waiting = pool.submit(inference_telemetry.queued(lambda: self.generate(FakeGenerateModel([7]))[1]))
+            time.sleep(0.05)
+            gate.set()
+            stats = waiting.result(5)
+        self.assertGreaterEqual(stats["queue_wait"], 0.05)
+
+    def test_concurrent_calls_are_counted_not_serialized(self):
+        first_running, second_done = threading.Event(), threading.Event()
+        results = {}
+
+        def slow():
+            first_running.set()
+            # only finishes if the second call can run meanwhile
+            self.assertTrue(second_done.wait(5))
+
+        thread = threading.Thread(target=lambda: results.setdefault("first", self.generate(FakeGenerateModel([7], slow))))
+        thread.start()
+        self.assertTrue(first_running.wait(5))
+        results["second"] = self.generate(FakeGenerateModel([7]))
+        second_done.set()
+        thread.join(5)
+        self.assertEqual(results["first"][1]["concurrent"], 0)
+        self.assertEqual(results["second"][1]["concurrent"], 1)
+
+    def test_record_keeps_per_model_and_per_intent_series(self):
+        for intent, reason in (("apply_leave", "eos"), ("apply_leave", "max_new_tokens"), ("general", "eos")):
+            inference_telemetry.record({"model": "tiny", "prompt_tokens": 40, "generated_tokens": 12,
+                                        "queue_wait": None, "concurrent": 1, "stop_reason": reason}, intent=intent)
+        snapshot = inference_telemetry.snapshot()
+        model = snapshot["models"]["tiny"]
+        self.assertEqual(model["calls"], 3)
+        self.assertEqual(model["stop_reasons"], {"eos": 2, "max_new_tokens": 1})
+        self.assertEqual(model["queue_wait"], {"count": 0})
+        self.assertEqual(model["prompt_tokens"]["p50"], 40)
+        self.assertEqual(model["concurrent"]["buckets"]["<=1"], 3)
+        self.assertEqual(snapshot["intents"]["tiny"]["apply_leave"]["calls"], 2)
+
+
+def session_request(method, path, data=None, **session):
+    """A RequestFactory request carrying ``session`` in a cookie-backed session (no DB)."""
+    from django.contrib.sessions.backends.signed_cookies import SessionStore
+
+    factory = RequestFactory()
+    if method == "post":
+        request = factory.post(path, data=json.dumps(data or {}), content_type="application/json")
+    else:
+        request = factory.get(path, data or {})
+    request.session = SessionStore()
+    request.session.update(session)
+    return request
+
+
+class ChatApiAsyncTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from core import views
+        cls.views = views
+
+    def call(self, message, **session):
+        request = session_request("post", "/api/chat/async/", {"message": message}, **session)
+        return asyncio.run(self.views.chat_api_async(request))
+
+    def test_requires_a_session_token(self):
+        self.assertEqual(self.call("hello").status_code, 401)
+
+    def test_general_reply_runs_the_model_off_the_loop(self):
+        threads = []
+
+        def model_response(msg, intent=None):
+            threads.append(threading.current_thread())
+            return "Hi there"
+
+        classification = {"intent": "general", "language": "en", "confidence": 0.9}
+        with mock.patch.object(self.views, "classify_message", return_value=classification), \
+                mock.patch.object(self.views, "model_response", side_effect=model_response):
+            response = self.call("hello", fixhr_token="t", employee_id="1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["reply"], "Hi there")
+        self.assertIsNot(threads[0], threading.main_thread())
+
+    def test_task_dispatches_to_the_async_handler(self):
+        classification = {"intent": "leave_balance", "language": "en", "confidence": 0.9}
+        decision = ({}, "leave_balance", "en", {}, None)
+        handler = mock.AsyncMock(return_value=self.views.JsonResponse({"reply": "12 days"}))
+        speculation = mock.Mock(asettle=mock.AsyncMock())
+        with mock.patch.object(self.views, "classify_message", return_value=classification), \
+                mock.patch.object(self.views, "_chat_decision", return_value=decision), \
+                mock.patch.object(self.views.speculative_prefetch, "start_async", return_value=speculation), \
+                mock.patch.object(self.views, "handle_leave_balance_async", handler):
+            response = self.call("my leave balance", fixhr_token="t", employee_id="7", business_id="3")
+        self.assertEqual(json.loads(response.content), {"reply": "12 days"})
+        handler.assert_awaited_once_with("t", "7", "3")
+        speculation.asettle.assert_awaited_once_with("leave_balance")
+
+    def test_async_route_only_with_flag(self):
+        import importlib
+        from core import urls
+
+        def names():
+            return {p.name for p in urls.urlpatterns}
+
+        self.addCleanup(importlib.reload, urls)
+        with mock.patch.dict("os.environ", {"FIXHR_ASYNC_CHAT": ""}):
+            importlib.reload(urls)
+            self.assertNotIn("chat_api_async", names())
+            self.assertIs(urls.CHAT_VIEW, self.views.chat_api)
+        with mock.patch.dict("os.environ", {"FIXHR_ASYNC_CHAT": "1"}):
+            importlib.reload(urls)
+            self.assertIn("chat_api_async", names())
+            self.assertIs(urls.CHAT_VIEW, self.views.chat_api_async)
+
+
+
+class BulkApprovalApiTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from core import views
+        cls.views = views
+
+    def call(self, body, csrf=False, **session):
+        session.setdefault("fixhr_token", "t")
+        request = session_request("post", "/api/approvals/bulk/", body, business_id="b1", **session)
+        request._dont_enforce_csrf_checks = not csrf
+        return self.views.bulk_approval_api(request)
+
+    def item(self, kind, id):
+        return {"kind": kind, "id": id, "emp_d_id": "d", "module_id": "m", "master_module_id": "mm"}
+
+    def test_csrf_is_enforced(self):
+        response = self.call({"action": "approve", "items": [self.item("leave", 1)]}, csrf=True)
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_bodies(self):
+        for body in ([], {"action": "approve"}, {"action": "approve", "items": "1"},
+                     {"action": "maybe", "items": [self.item("leave", 1)]},
+                     {"action": "approve", "items": [self.item("payslip", 1)]}):
+            self.assertEqual(self.call(body).status_code, 400, body)
+        too_many = [self.item("leave", i) for i in range(self.views.BULK_APPROVAL_MAX_ITEMS + 1)]
+        self.assertEqual(self.call({"action": "approve", "items": too_many}).status_code, 400)
+
+    def test_one_result_per_item_in_order(self):
+        def approve_one(item, approve, token, note):
+            return self.views._bulk_result(item, item["id"] != 2, "Done" if item["id"] != 2 else "HTTP 500")
+
+        items = [self.item("leave", 1), self.item("gatepass", 2), self.item("missed", 3)]
+        with mock.patch.object(self.views, "_approve_one", side_effect=approve_one), \
+                mock.patch.object(self.views.leave_balance_cache, "on_leave_approved") as approved:
+            response = self.call({"action": "approve", "items": items})
+        body = json.loads(response.content)
+        self.assertEqual([(r["id"], r["ok"]) for r in body["results"]], [(1, True), (2, False), (3, True)])
+        self.assertEqual((body["succeeded"], body["failed"]), (2, 1))
+        approved.assert_called_once_with("b1")
+
+    def test_requires_login(self):
+        request = session_request("post", "/api/approvals/bulk/", {"action": "approve", "items": []})
+        request._dont_enforce_csrf_checks = True
+        self.assertEqual(self.views.bulk_approval_api(request).status_code, 401)
+
+
+class ApplyJobStatusApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from core import views
+        cls.views = views
+
+    def setUp(self):
+        from core.models import ApplyJob
+
+        self.job = ApplyJob.objects.create(
+            idempotency_key="k", kind="leave", employee_id="7", payload={}, next_attempt_at=timezone.now(),
+        )
+        patcher = mock.patch.object(self.views.apply_queue, "start")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def call(self, job_id, **session):
+        request = session_request("get", f"/api/apply-jobs/{job_id}/", **session)
+        return self.views.apply_job_status_api(request, job_id)
+
+    def test_owner_sees_the_job(self):
+        response = self.call(self.job.pk, fixhr_token="t", employee_id="7")
+        body = json.loads(response.content)
+        self.assertEqual((body["id"], body["status"], body["finished"]), (self.job.pk, "queued", False))
+        self.assertIn("reply", body)
+
+    def test_other_employees_and_anonymous_do_not(self):
+        self.assertEqual(self.call(self.job.pk, fixhr_token="t", employee_id="8").status_code, 404)
+        self.assertEqual(self.call(self.job.pk + 1, fixhr_token="t", employee_id="7").status_code, 404)
+        self.assertEqual(self.call(self.job.pk).status_code, 401)
+
+
+class FakeListClient:
+    """Serves `pages` (lists of FixHR leave rows) as a paginated leave_list."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def get(self, name, token=None, params=None, use_cache=True):
+        self.calls.append(params["page"])
+        rows = self.pages[params["page"] - 1]
+        body = {"result": {"data": rows, "last_page": len(self.pages), "total": sum(map(len, self.pages))}}
+        return CachedResponse(200, json.dumps(body).encode())
+
+
+def leave_row(leave_id, day, status="Requested"):
+    return {"leave_id": leave_id, "start_date": day, "end_date": day, "reason": "r",
+            "leave_status": [{"name": status}]}
+
+
+class RequestStoreTests(TestCase):
+    def setUp(self):
+        self.client = FakeListClient([[leave_row(3, "2026-10-03"), leave_row(2, "2026-10-02", "Approved")],
+                                      [leave_row(1, "2026-09-01", "Rejected")]])
+        self.store = RequestStore(client=self.client, sync_seconds=300)
+
+    def requests(self, **filters):
+        cards, total = self.store.requests("t", "7", "b1", "leave", **filters)
+        return [card["leave_id"] for card in cards]
+
+    def test_first_read_syncs_every_page_then_queries_locally(self):
+        self.assertEqual(self.requests(), [3, 2, 1])
+        self.assertEqual(self.client.calls, [1, 2])
+        self.assertEqual(self.requests(state="pending"), [3])
+        self.assertEqual(self.requests(first=date(2026, 10, 1)), [3, 2])
+        self.assertEqual(self.client.calls, [1, 2])
+
+    def test_delta_sync_stops_at_an_unchanged_page(self):
+        self.store.sync("t", "7", "b1", "leave")
+        self.client.pages[0].insert(0, leave_row(4, "2026-10-04"))
+        self.client.calls.clear()
+        self.assertEqual(self.store.sync("t", "7", "b1", "leave", full=False), 1)
+        self.assertEqual(self.client.calls, [1, 2])
+        self.client.calls.clear()
+        self.assertEqual(self.store.sync("t", "7", "b1", "leave", full=False), 0)
+        self.assertEqual(self.client.calls, [1])
+
+    def test_full_sync_drops_rows_fixhr_no_longer_lists(self):
+        self.store.sync("t", "7", "b1", "leave")
+        del self.client.pages[1]
+        self.store.sync("t", "7", "b1", "leave", full=True)
+        self.assertEqual(self.requests(), [3, 2])
+
+    def test_applied_placeholder_until_fixhr_lists_it(self):
+        self.store.sync("t", "7", "b1", "leave")
+        job = mock.Mock(kind="leave", employee_id="7", business_id="b1",
+                        payload={"leave_start_date": "2026-10-05", "leave_end_date": "2026-10-05", "reason": "r"})
+        self.store.on_applied(job)
+        self.assertEqual(self.requests(state="pending"), [None, 3])
+        self.client.pages[0].insert(0, leave_row(5, "2026-10-05"))
+        self.store.sync("t", "7", "b1", "leave", full=False)
+        self.assertEqual(self.requests(state="pending"), [5, 3])
+
+    def test_approval_updates_the_row(self):
+        self.store.sync("t", "7", "b1", "leave")
+        self.store.on_approval("leave", 3, approve=True, final=False, business_id="b1")
+        self.assertEqual(self.requests(state="pending"), [3])
+        self.store.on_approval("leave", 3, approve=True, final=True, business_id="b1")
+        self.assertEqual(self.requests(state="approved"), [3, 2])
+
+
+class FixHRStubTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from benchmarks import fixhr_stub
+        cls.stub_module = fixhr_stub
+
+    def serve(self, **kwargs):
+        stub = self.stub_module.FixHRStub(**kwargs)
+        server, base_url = self.stub_module.start_in_thread(stub)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return stub, base_url
+
+    def login(self, base_url, email):
+        r = requests.post(base_url + "/api/auth/login", data={"email": email, "password": "x"}, timeout=5)
+        return r.json()["data"]["token"]
+
+    def test_synthetic_data_through_the_real_client(self):
+        data = self.stub_module.SyntheticFixHR(employees=20, seed=3, today=date(2026, 10, 19))
+        stub, base_url = self.serve(data=data)
+        token = self.login(base_url, "emp5@stub.fixhr")
+        self.assertEqual(token, "stub-5-employee")
+
+        client = FixHRClient(base_url=base_url)
+        rows, total = client.get_all_pages("leave_list", token=token, params={"self": 1}, use_cache=False)
+        again = self.stub_module.SyntheticFixHR(employees=20, seed=3, today=date(2026, 10, 19))
+        self.assertEqual(rows, again._rows("leave", {5}))
+
+        client.post("leave_apply", token=token, form=True,
+                    data={"leave_start_date": "2026-10-21", "leave_end_date": "2026-10-21", "reason": "Trip"})
+        after, _ = client.get_all_pages("leave_list", token=token, params={"self": 1}, use_cache=False)
+        self.assertEqual(len(after), len(rows) + 1)
+        self.assertEqual(stub.stats["leave_list"]["requests"], 2)
+
+    def test_unknown_tokens_are_rejected(self):
+        _, base_url = self.serve(data=self.stub_module.SyntheticFixHR(employees=5))
+        r = requests.get(base_url + "/api/admin/attendance/employee_leave", headers={"Authorization": "Bearer x"},
+                         timeout=5)
+        self.assertEqual(r.status_code, 401)
+
+    def test_injected_errors_spare_login(self):
+        faults = self.stub_module.Faults(error_rate=1.0)
+        stub, base_url = self.serve(data=self.stub_module.SyntheticFixHR(employees=5), faults=faults)
+        token = self.login(base_url, "manager1@stub.fixhr")
+        r = requests.get(base_url + "/api/admin/attendance/employee_leave",
+                         headers={"Authorization": f"Bearer {token}"}, timeout=5)
+        self.assertIn(r.status_code, (500, 503))
+        stats = requests.get(base_url + "/__stub__/stats", timeout=5).json()
+        self.assertEqual(stats["leave_list"], {"requests": 1, "error": 1})
+        requests.post(base_url + "/__stub__/reset", timeout=5)
+        self.assertEqual(requests.get(base_url + "/__stub__/stats", timeout=5).json(), {})
+
+    def test_replay_matches_the_recorded_query(self):
+        import shutil
+        import tempfile
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        fixtures = self.stub_module.Fixtures(directory)
+        fixtures.save("holiday", {"year": "2026"}, 200, {"result": ["2026"]})
+        fixtures.save("holiday", {"year": "2027"}, 200, {"result": ["2027"]})
+
+        replay = self.stub_module.Fixtures(directory)
+        self.assertEqual(replay.lookup("holiday", {"year": "2027"}), (200, {"result": ["2027"]}))
+        self.assertEqual(replay.lookup("holiday", {"year": "2030"}), (200, {"result": ["2026"]}))
+        self.assertIsNone(replay.lookup("leave_list", {}))
+
+
+def attendance_row(emp_id, name, day, status):
+    return {"employee_id": emp_id, "employee_name": name, "date": day, "status": status, "in_time": "09:30",
+            "out_time": "18:30", "work_hours": "9:00", "late": False, "overtime": "", "remark": ""}
+
+
+class FastJsonResponseTests(SimpleTestCase):
+    def test_gzips_large_bodies_for_clients_that_accept_it(self):
+        payload = {"names": ["राहुल शर्मा"] * 200}
+        plain = FastJsonResponse(RequestFactory().get("/"), payload)
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("राहुल".encode(), plain.content)
+        self.assertEqual(json.loads(plain.content), payload)
+
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        zipped = FastJsonResponse(request, payload)
+        self.assertEqual(zipped["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", zipped["Vary"])
+        self.assertEqual(json.loads(gzip.decompress(zipped.content)), payload)
+
+        small = FastJsonResponse(request, {"a": 1})
+        self.assertNotIn("Content-Encoding", small)
+
+
+class CompactAttendanceTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from core import views
+        cls.views = views
+
+    def test_compact_register_keeps_namesakes_apart(self):
+        dates = ["2026-10-01", "2026-10-02"]
+        rows = [attendance_row(1, "Amit", dates[0], "P"), attendance_row(2, "Amit", dates[0], "A"),
+                attendance_row(1, "Amit", dates[1], "A")]
+        register = self.views._compact_register(rows, dates)
+        self.assertEqual(register["employees"], [[1, "Amit"], [2, "Amit"]])
+        self.assertEqual(register["statuses"], ["P", "A"])
+        self.assertEqual(register["cells"], [[1, 2], [2, 0]])
+
+    def details(self, start, end, emp_id="7", **session):
+        session.setdefault("fixhr_token", "t")
+        request = session_request("get", "/api/attendance/details/", {"emp_id": emp_id, "start": start, "end": end},
+                                  **session)
+        return self.views.attendance_details_api(request)
+
+    def test_details_range_is_capped(self):
+        with mock.patch.object(self.views.attendance_store, "grids") as grids:
+            too_long = self.details("2025-01-01", "2026-01-02", employee_id="7")
+            backwards = self.details("2026-02-01", "2026-01-01", employee_id="7")
+            bad = self.details("yesterday", "2026-01-01", employee_id="7")
+        self.assertEqual((too_long.status_code, backwards.status_code, bad.status_code), (400, 400, 400))
+        grids.assert_not_called()
+
+    def test_details_only_of_visible_employees(self):
+        rows = [attendance_row("9", "Neha", "2026-10-01", "P")]
+        with mock.patch.object(self.views.attendance_store, "grids"), \
+                mock.patch.object(self.views.attendance_store, "rows_of", return_value=rows) as rows_of:
+            self.assertEqual(self.details("2026-10-01", "2026-10-31", emp_id="9", employee_id="7",
+                                          role_name="Employee").status_code, 403)
+            response = self.details("2026-10-01", "2026-10-31", emp_id="9", employee_id="7", role_name="HR Manager")
+        body = json.loads(response.content)
+        self.assertEqual((body["emp_id"], body["emp_name"]), ("9", "Neha"))
+        self.assertEqual(body["rows"][0]["work_hrs"], "9:00")
+        self.assertEqual(rows_of.call_args.kwargs["ids"], {"9"})
+
+
+class IntentBatchApiTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from core import views
+        cls.views = views
+
+    def call(self, body, **session):
+        return self.views.get_intent_batch_api(session_request("post", "/api/get-intent/batch/", body, **session))
+
+    def test_requires_login_and_bounded_input(self):
+        with mock.patch.object(self.views, "get_bert_classifier") as classifier:
+            self.assertEqual(self.call({"messages": ["hi"]}).status_code, 401)
+            for body in ({"messages": []}, {"messages": ["hi"] * (self.views.BERT_MAX_BATCH_MESSAGES + 1)},
+                         {"messages": ["x" * (self.views.BERT_MAX_MESSAGE_CHARS + 1)]},
+                         {"messages": ["hi"], "batch_size": self.views.BERT_MAX_BATCH_SIZE + 1},
+                         {"messages": ["hi"], "batch_size": True}):
+                self.assertEqual(self.call(body, fixhr_token="t").status_code, 400)
+        classifier.assert_not_called()
+
+    def test_classifies_with_the_requested_batch_size(self):
+        results = [{"intent": "leave_balance"}, {"intent": "general"}]
+        with mock.patch.object(self.views, "get_bert_classifier", return_value=("model", "tokenizer")), \
+                mock.patch.object(self.views, "predict_intents_batch", return_value=results) as predict:
+            response = self.call({"messages": ["balance?", "hi"], "batch_size": 2}, fixhr_token="t")
+        self.assertEqual(json.loads(response.content), {"count": 2, "results": results})
+        self.assertEqual(predict.call_args.kwargs["batch_size"], 2)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LoRA fine-tune of the Phi-3 intent model on the compact output format.
+
+1) python core/convert_intent_dataset_compact.py <data> -o dataset/intent_compact.jsonl
+2) python core/train_phi3_intent_compact.py [core/configs/phi3_intent_compact.json]
+3) FIXHR_INTENT_MODEL_DIR=core/merged_phi3_intent_compact FIXHR_INTENT_FORMAT=compact python manage.py runserver
+
+Loss is computed on the compact answer only (prompt tokens are masked).
+"""
+
+import json
+import os
+import sys
+
+import torch
+from datasets import Dataset
+from peft import LoraConfig, get_peft_model
+from transformers import AutoModelForCausalLM, AutoTokenizer, Trainer, TrainingArguments
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from core.compact_intent import COMPACT_SYSTEM_PROMPT, format_prompt  # noqa: E402
+
+DEFAULT_CONFIG = os.path.join(ROOT_DIR, "core", "configs", "phi3_intent_compact.json")
+
+
+def _path(value):
+    return value if os.path.isabs(value) else os.path.join(ROOT_DIR, value)
+
+
+def load_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_dataset(cfg, tokenizer):
+    with open(_path(cfg["train_file"]), "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    print(f"📚 Loaded {len(rows)} compact examples")
+
+    def encode(row):
+        prompt_ids = tokenizer(format_prompt(COMPACT_SYSTEM_PROMPT, row["user"]), add_special_tokens=False)["input_ids"]
+        answer_ids = tokenizer(row["output"], add_special_tokens=False)["input_ids"] + [tokenizer.eos_token_id]
+        input_ids = (prompt_ids + answer_ids)[:cfg["max_seq_len"]]
+        labels = ([-100] * len(prompt_ids) + answer_ids)[:cfg["max_seq_len"]]
+        return {"input_ids": input_ids, "attention_mask": [1] * len(input_ids), "labels": labels}
+
+    dataset = Dataset.from_list(rows).map(encode, remove_columns=["user", "output"])
+    return dataset.train_test_split(test_size=cfg["eval_fraction"], seed=cfg["seed"])
+
+
+def collate(tokenizer):
+    def _collate(features):
+        width = max(len(f["input_ids"]) for f in features)
+        batch = {"input_ids": [], "attention_mask": [], "labels": []}
+        for f in features:
+            pad = width - len(f["input_ids"])
+            batch["input_ids"].append(f["input_ids"] + [tokenizer.pad_token_id] * pad)
+            batch["attention_mask"].append(f["attention_mask"] + [0] * pad)
+            batch["labels"].append(f["labels"] + [-100] * pad)
+        return {k: torch.tensor(v) for k, v in batch.items()}
+    return _collate
+
+
+def main():
+    cfg = load_config(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CONFIG)
+    torch.manual_seed(cfg["seed"])
+
+    print(f"🚀 Loading base model {cfg['base_model']}...")
+    base = _path(cfg["base_model"]) if os.path.exists(_path(cfg["base_model"])) else cfg["base_model"]
+    tokenizer = AutoTokenizer.from_pretrained(base, trust_remote_code=True)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    model = AutoModelForCausalLM.from_pretrained(
+        base,
+        torch_dtype=torch.bfloat16 if torch.cuda.is_available() else torch.float32,
+        device_map="auto" if torch.cuda.is_available() else None,
+        trust_remote_code=True,
+    )
+    model = get_peft_model(model, LoraConfig(task_type="CAUSAL_LM", bias="none", **cfg["lora"]))
+    model.print_trainable_parameters()
+
+    splits = build_dataset(cfg, tokenizer)
+
+    args = TrainingArguments(
+        output_dir=_path(cfg["adapter_dir"]),
+        per_device_train_batch_size=cfg["per_device_batch_size"],
+        per_device_eval_batch_size=cfg["per_device_batch_size"],
+        gradient_accumulation_steps=cfg["gradient_accumulation_steps"],
+        num_train_epochs=cfg["epochs"],
+        learning_rate=cfg["learning_rate"],
+        warmup_steps=cfg["warmup_steps"],
+        bf16=torch.cuda.is_available(),
+        logging_steps=10,
+        save_strategy="epoch",
+        save_total_limit=2,
+        seed=cfg["seed"],
+        report_to=[],
+    )
+
+    trainer = Trainer(
+        model=model,
+        args=args,
+        train_dataset=splits["train"],
+        eval_dataset=splits["test"],
+        data_collator=collate(tokenizer),
+    )
+
+    print("🏋️ Starting training...")
+    trainer.train()
+    print("📊 Eval:", trainer.evaluate())
+
+    print("💾 Merging LoRA weights...")
+    merged = model.merge_and_unload()
+    merged.save_pretrained(_path(cfg["merged_dir"]))
+    tokenizer.save_pretrained(_path(cfg["merged_dir"]))
+    print(f"✅ Compact intent model saved in: {cfg['merged_dir']}")
+
+
+if __name__ == "__main__":
+    main()
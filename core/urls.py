@@ -1,7 +1,14 @@
+import os
+
 from django.urls import path
 from . import views
 from django.shortcuts import redirect
 
+# Serve /api/chat/ from the async view when running under ASGI
+# (e.g. FIXHR_ASYNC_CHAT=1 uvicorn fixhr_gpt_local.asgi:application)
+ASYNC_CHAT = os.environ.get("FIXHR_ASYNC_CHAT") == "1"
+CHAT_VIEW = views.chat_api_async if ASYNC_CHAT else views.chat_api
+
 # Homepage redirect → goes to login page
 def home_redirect(request):
     return redirect('login')
@@ -12,9 +19,22 @@ urlpatterns = [
     path("login/api/", views.login_api, name="login_api"),
     path("chat/", views.chat_page, name="chat"),
     path("logout/", views.logout_view, name="logout"),
-    path("api/chat/", views.chat_api, name="chat_api"),
+    path("api/chat/", CHAT_VIEW, name="chat_api"),
     path("api/train-model/", views.train_model_api, name="train_model_api"),
     path("api/model-status/", views.model_status_api, name="model_status_api"),
+    path("api/inference-stats/", views.inference_stats_api, name="inference_stats_api"),
+    path("api/approvals/bulk/", views.bulk_approval_api, name="bulk_approval_api"),
+    path("api/list-page/", views.list_page_api, name="list_page_api"),
+    path("api/attendance/page/", views.attendance_page_api, name="attendance_page_api"),
+    path("api/attendance/details/", views.attendance_details_api, name="attendance_details_api"),
+    path("api/attendance/export/", views.attendance_export_api, name="attendance_export_api"),
+    path("api/apply-jobs/<int:job_id>/", views.apply_job_status_api, name="apply_job_status_api"),
+    path("api/fixhr-stats/", views.fixhr_stats_api, name="fixhr_stats_api"),
     path("api/load-model/", views.load_model_api, name="load_model_api"),
     path("api/get-intent/", views.get_intent_api, name="get_intent_api"),
+    path("api/get-intent/batch/", views.get_intent_batch_api, name="get_intent_batch_api"),
 ]
+
+if ASYNC_CHAT:
+    # only worth it on an ASGI server; under WSGI every request would run in its own event loop
+    urlpatterns.append(path("api/chat/async/", views.chat_api_async, name="chat_api_async"))
@@ -1,10 +1,12 @@
-import requests, json, hashlib, traceback, re, os
+import json, hashlib, traceback, re, os, threading, asyncio, functools
 import dateparser
 import logging, calendar
 from datetime import datetime, timedelta
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.urls import reverse
+from django.utils.http import urlencode
 from django.views.decorators.csrf import csrf_protect, csrf_exempt
 from django.views.decorators.http import require_POST
 from core.missed_punch_engine import (
@@ -17,14 +19,35 @@ from core.missed_punch_engine import (
 
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch, json
-from .model_utils import load_trained_model, predict_intent
+from .model_utils import load_trained_model, predict_intent, predict_intents_batch
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from core.decision_engine import apply_leave_nlp
 from core.time_extractor import extract_times
 from core.model_inference2 import model_response
 
 from core.phi3_inference_v3 import intent_model_call
+from core.cpu_tuning import get_cpu_config
+from core import inference_telemetry
+from core.fixhr_client import afixhr, endpoint_url, fixhr
+from core.fixhr_cache import response_cache, token_scope
+from core.fixhr_resilience import FixHRUnavailable, inherit_budget, latency_budget, resilience
+from core.holiday_calendar import (
+    holiday_question_day,
+    holiday_question_month,
+    holiday_service,
+    is_holiday_question,
+    parse_holiday_rows,
+)
+from core import leave_balance_cache
+from core.attendance_store import attendance_store, parse_day
+from core.employee_directory import employee_directory
+from core import list_cursor, login_prefetch, speculative_prefetch, stage_timing
+from core.apply_queue import accepted as apply_queue_accepted, apply_queue
+from core.request_store import request_store
 from core.extract_date_time import extract_datetime_info
+from core.fast_json import FastJsonResponse
+from core import attendance_cursor, attendance_export
 
 # 🧠 Memory storage (works per user session)
 SESSION_MEMORY = {}
@@ -32,39 +55,65 @@ SESSION_MEMORY = {}
 
 # === Load BERT model for intent detection ===
 BERT_MODEL_PATH = os.path.join(os.path.dirname(__file__), "trained_model")
-# bert_tokenizer = AutoTokenizer.from_pretrained(BERT_MODEL_PATH)
-# bert_model = AutoModelForSequenceClassification.from_pretrained(BERT_MODEL_PATH)
-# with open(os.path.join(BERT_MODEL_PATH, "label_map.json"), "r", encoding="utf-8") as f:
-#     label_map = json.load(f)
-# id2label = {v: k for k, v in label_map.items()}
+BERT_BATCH_SIZE = 32
+# Limits for /api/get-intent/batch/, so one request cannot tie up the CPU
+BERT_MAX_BATCH_MESSAGES = 1000
+BERT_MAX_BATCH_SIZE = 128
+BERT_MAX_MESSAGE_CHARS = 2000
+
+_BERT_CLASSIFIER = None
+_BERT_LOCK = threading.Lock()
+
+# Total FixHR time one chat message may spend; every downstream call inherits it
+CHAT_LATENCY_BUDGET = float(os.environ.get("FIXHR_CHAT_BUDGET_SECONDS", "20"))
+
+# Attendance replies the chat page asks for in the compact, columnar format
+COMPACT_ATTENDANCE_TYPE = "application/vnd.fixhr.attendance+json"
+# Register rows per page (core.attendance_cursor); compact pages carry no details, so they can be much longer
+ATTENDANCE_PAGE_ROWS = int(os.environ.get("FIXHR_ATTENDANCE_PAGE_ROWS", "250"))
+COMPACT_PAGE_ROWS = int(os.environ.get("FIXHR_ATTENDANCE_COMPACT_PAGE_ROWS", "2000"))
+# Longest period one attendance export (or details request) may cover
+EXPORT_MAX_DAYS = 366
+
+# Phi-3 calls from chat_api_async; a couple of threads keep both models
+# busy without piling requests onto the CPU
+INFERENCE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("FIXHR_INFERENCE_THREADS", "2")),
+    thread_name_prefix="fixhr-inference",
+)
 
-# def predict_intent(text):
-#     inputs = bert_tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-#     with torch.no_grad():
-#         outputs = bert_model(**inputs)
-#         probs = torch.nn.functional.softmax(outputs.logits, dim=1)
-#         predicted_id = torch.argmax(probs, dim=1).item()
-#         confidence = probs[0][predicted_id].item()
-#     return id2label[predicted_id], confidence
+
+def get_bert_classifier():
+    """Load the BERT intent classifier once, on first use."""
+    global _BERT_CLASSIFIER
+    if _BERT_CLASSIFIER is None:
+        with _BERT_LOCK:
+            if _BERT_CLASSIFIER is None:
+                model, tokenizer, label_map = load_trained_model(BERT_MODEL_PATH)
+                if model is None:
+                    return None
+                _BERT_CLASSIFIER = (model, tokenizer, label_map)
+    return _BERT_CLASSIFIER
 
 
 
 # ---------------- API Endpoints ----------------
-FIXHR_LOGIN_URL = "https://dev.fixhr.app/api/auth/login"
-GATEPASS_URL = "https://dev.fixhr.app/api/admin/attendance/gate_pass"
-GATEPASS_APPROVAL_LIST = "https://dev.fixhr.app/api/admin/attendance/gate_pass_approval"
-APPROVAL_CHECK_URL = "https://dev.fixhr.app/api/admin/approval/approval_check"
-APPROVAL_HANDLER_URL = "https://dev.fixhr.app/api/admin/approval/approval_handler"
-LEAVE_APPLY_URL = "https://dev.fixhr.app/api/admin/attendance/employee_leave"
-LEAVE_LIST_URL = "https://dev.fixhr.app/api/admin/attendance/employee_leave"
-MISSED_PUNCH_LIST_URL = "https://dev.fixhr.app/api/admin/attendance/mis_punch"
-MISSED_PUNCH_APPLY_URL = "https://dev.fixhr.app/api/admin/attendance/mis_punch_store"
-MISSED_PUNCH_APPROVAL_LIST_URL = "https://dev.fixhr.app/api/admin/attendance/mis_punch/approval"
-LEAVE_BALANCE_URL = "https://dev.fixhr.app/api/admin/attendance/get-leave-balance"
-FIXHR_HOLIDAY_URL = "https://dev.fixhr.app/api/admin/attendance/get_data_for_type"
-FIXHR_ATTENDANCE_URL = "https://dev.fixhr.app/api/admin/attendance/attendance-report/monthly-attendance-detail"
-FIXHR_PRIVACY_POLICY ="https://dev.fixhr.app/api/admin/privacy-policy"
-FIXHR_PAYSLIP_POLICY = "https://dev.fixhr.app/api/admin/payroll/generate_emp_payslip"
+# URLs live in core.fixhr_client; these names are kept for existing imports
+FIXHR_LOGIN_URL = endpoint_url("login")
+GATEPASS_URL = endpoint_url("gatepass_apply")
+GATEPASS_APPROVAL_LIST = endpoint_url("gatepass_approval_list")
+APPROVAL_CHECK_URL = endpoint_url("approval_check")
+APPROVAL_HANDLER_URL = endpoint_url("approval_handler")
+LEAVE_APPLY_URL = endpoint_url("leave_apply")
+LEAVE_LIST_URL = endpoint_url("leave_list")
+MISSED_PUNCH_LIST_URL = endpoint_url("missed_punch_list")
+MISSED_PUNCH_APPLY_URL = endpoint_url("missed_punch_apply")
+MISSED_PUNCH_APPROVAL_LIST_URL = endpoint_url("missed_punch_approval_list")
+LEAVE_BALANCE_URL = endpoint_url("leave_balance")
+FIXHR_HOLIDAY_URL = endpoint_url("holiday")
+FIXHR_ATTENDANCE_URL = endpoint_url("attendance")
+FIXHR_PRIVACY_POLICY = endpoint_url("privacy_policy")
+FIXHR_PAYSLIP_POLICY = endpoint_url("payslip")
 
 
 # ---------------- Logging ----------------
@@ -224,18 +273,7 @@ def handle_general_chat(msg, lang="en"):
 
 # ---------------- Holiday Helpers ----------------
 def is_holiday_intent(text):
-    t = (text or "").lower()
-    keywords = [
-        "holiday",
-        "chhutti",
-        "holiday list",
-        "today holiday",
-        "tomorrow holiday",
-        "next holiday",
-        "previous holiday",
-        "current month",
-    ]
-    return any(k in t for k in keywords)
+    return is_holiday_question(text)
 
 
 def extract_month_year(text):
@@ -284,37 +322,121 @@ def fetch_holidays(headers, month=None, year=None):
         params["month"] = month
 
     try:
-        res = requests.get(
-            FIXHR_HOLIDAY_URL,
-            headers={**headers, "Accept": "application/json"},
-            params=params,
-            timeout=10
-        )
+        res = fixhr.get("holiday", params=params, headers=headers)
         res.raise_for_status()
         data = res.json() if res.content else {}
 
-        holidays = []
-        for h in data.get("result", []) or []:
-            try:
-                start = datetime.strptime(h.get("phl_start_date"), "%d %b, %Y").date()
-                end = datetime.strptime(h.get("phl_end_date"), "%d %b, %Y").date()
-            except Exception:
-                continue
-
-            holidays.append({
-                "name": h.get("phl_name"),
-                "start_date": start.isoformat(),
-                "end_date": end.isoformat(),
-                "month": h.get("phl_month"),
-                "month_number": h.get("phl_month_number"),
-            })
-        return holidays
+        return [
+            {
+                "name": h.name,
+                "start_date": h.start.isoformat(),
+                "end_date": h.end.isoformat(),
+                "month": h.start.strftime("%B"),
+                "month_number": h.start.month,
+            }
+            for h in parse_holiday_rows(data)
+        ]
         
     except Exception as e:
         logger.error(f"Holiday fetch error: {e}")
         return []
 
 
+HOLIDAY_TASKS = {"holiday_list", "holiday"}
+DATE_RANGE_RE = re.compile(r"(?:between|from)\s+(.+?)\s+(?:and|to|till|until|se)\s+(.+)", re.I)
+MONTH_NAME_RE = re.compile(
+    r"\b(january|jan|february|feb|march|mar|april|apr|may|june|jun|july|jul|august|aug"
+    r"|september|sept|sep|october|oct|november|nov|december|dec)\b"
+)
+
+
+def _parse_range_end(text):
+    # "15 oct for all employees": use the longest leading words that parse as a date
+    words = text.strip(" ?.!").split()
+    for n in range(min(len(words), 4), 0, -1):
+        parsed = dateparser.parse(" ".join(words[:n]))
+        if parsed:
+            return parsed
+    return None
+
+
+def _date_range(text):
+    """(first, last) dates for "between X and Y" / "from X to Y", else None."""
+    match = DATE_RANGE_RE.search(text or "")
+    if not match:
+        return None
+    first = dateparser.parse(match.group(1).strip(" ?.!"))
+    last = _parse_range_end(match.group(2))
+    if not first or not last:
+        return None
+    first, last = first.date(), last.date()
+    return (first, last) if first <= last else (last, first)
+
+
+def _holiday_json(holidays):
+    return [{"name": h.name, "start_date": h.start.isoformat(), "end_date": h.end.isoformat()} for h in holidays]
+
+
+def handle_holiday_query(msg, token, business_id, lang="en"):
+    """
+    Holiday questions answered from the cached per-business calendar:
+    today / tomorrow, next holiday, a date range, a month, or the year.
+    """
+    t = nlp_normalize(msg)
+    today = datetime.now().date()
+    hi = lang == "hi"
+
+    try:
+        which = holiday_question_day(t)
+        if which:
+            is_today = which == "today"
+            day = today if is_today else today + timedelta(days=1)
+            label = ("Aaj" if hi else "Today") if is_today else ("Kal" if hi else "Tomorrow")
+            found = holiday_service.holidays_on(token, business_id, day)
+            if found:
+                reply = f"✅ {label} {found[0].name} hai." if hi else f"✅ {label} is {found[0].name}."
+            else:
+                reply = f"❌ {label} ({day}) holiday nahi hai." if hi else f"❌ {label} ({day}) is not a holiday."
+            return JsonResponse({"reply_type": "holidays", "reply": reply, "holidays": _holiday_json(found)})
+
+        date_range = _date_range(msg)
+        next_month = any(k in t for k in ["next month", "agle mahine", "agla mahina"])
+        month = holiday_question_month(t)
+        if date_range:
+            first, last = date_range
+            holidays = holiday_service.holidays_between(token, business_id, first, last)
+            period = f"{first} → {last}"
+        elif next_month or month or any(k in t for k in ["this month", "current month", "is mahine", "iss mahine"]):
+            if next_month:
+                first_of_next = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+                month, year = first_of_next.month, first_of_next.year
+            else:
+                month, year = month or today.month, extract_month_year(t)[1]
+            holidays = holiday_service.holidays_in_month(token, business_id, year, month)
+            period = f"{calendar.month_name[month]} {year}"
+        elif any(k in t for k in ["next", "upcoming", "agla", "agli", "agle"]):
+            found = holiday_service.next_holiday(token, business_id, today)
+            if not found:
+                reply = "ℹ️ Aage koi holiday nahi mila." if hi else "ℹ️ No upcoming holidays found."
+                return JsonResponse({"reply_type": "holidays", "reply": reply, "holidays": []})
+            reply = f"🎉 Agla holiday: {found.name} ({found.start})" if hi else f"🎉 Next holiday: {found.name} ({found.start})"
+            return JsonResponse({"reply_type": "holidays", "reply": reply, "holidays": _holiday_json([found])})
+        else:
+            _, year = extract_month_year(t)
+            holidays = holiday_service.holidays_between(token, business_id, datetime(year, 1, 1).date(), datetime(year, 12, 31).date())
+            period = str(year)
+    except Exception as e:
+        logger.error("Holiday query failed: %s", e)
+        reply = "⚠️ Holiday list abhi nahi mil payi." if hi else f"⚠️ Could not fetch holidays: {e}"
+        return JsonResponse({"reply": reply})
+
+    if not holidays:
+        reply = f"ℹ️ {period} mein koi holiday nahi hai." if hi else f"ℹ️ No holidays found for {period}."
+    else:
+        reply = f"🎉 Holidays ({period})"
+    return JsonResponse({"reply_type": "holidays", "reply": reply, "holidays": _holiday_json(holidays)})
+
+
 
 
 
@@ -365,6 +487,9 @@ def extract_specific_date(text, month, year):
     return None
 
 
+QUARTER_RE = re.compile(r"\bq([1-4])\b(?:\s*(20\d{2}))?")
+
+
 def determine_attendance_period(text: str) -> dict:
     """Infer date range for attendance queries."""
     t = (text or "").lower()
@@ -376,6 +501,8 @@ def determine_attendance_period(text: str) -> dict:
     year = start.year
     label = f"{calendar.month_name[month]} {year}"
     period_type = "month"
+    quarter_match = QUARTER_RE.search(t)
+    date_range = _date_range(text)
 
     if any(k in t for k in ["last week", "previous week", "pichle hafte", "pichle week"]):
         this_monday = today - timedelta(days=today.weekday())
@@ -392,6 +519,27 @@ def determine_attendance_period(text: str) -> dict:
         year = start.year
         label = "This Week"
         period_type = "week"
+    elif quarter_match or any(k in t for k in ["this quarter", "current quarter", "last quarter", "previous quarter"]):
+        if quarter_match:
+            quarter = int(quarter_match.group(1))
+            year = int(quarter_match.group(2)) if quarter_match.group(2) else today.year
+        else:
+            quarter = (today.month - 1) // 3 + 1
+            year = today.year
+            if "last" in t or "previous" in t:
+                quarter, year = (4, year - 1) if quarter == 1 else (quarter - 1, year)
+        month = 3 * (quarter - 1) + 1
+        start = datetime(year, month, 1).date()
+        end = datetime(year, month + 2, calendar.monthrange(year, month + 2)[1]).date()
+        end = min(end, max(today, start))
+        label = f"Q{quarter} {year}"
+        period_type = "quarter"
+    elif date_range:
+        start, end = date_range
+        month = start.month
+        year = start.year
+        label = f"{start.strftime('%d %b %Y')} → {end.strftime('%d %b %Y')}"
+        period_type = "range"
     elif any(k in t for k in ["last month", "previous month", "pichle mahine"]):
         first_day_this_month = today.replace(day=1)
         end = first_day_this_month - timedelta(days=1)
@@ -422,20 +570,21 @@ def determine_attendance_period(text: str) -> dict:
     }
 
 
+def user_can_view_all(role_name):
+    role_name = (role_name or "").lower()
+    if not role_name:
+        return False
+    admin_keywords = ["admin", "hr", "manager", "owner", "supervisor"]
+    return any(k in role_name for k in admin_keywords)
+
+
 def detect_employee_filter(text: str, request) -> dict:
     """Identify whether user asked for self, specific employee, or everyone."""
     t = (text or "").lower()
     emp_id = request.session.get("employee_id")
     emp_name = (request.session.get("name") or "").strip() or "You"
-    role_name = (request.session.get("role_name") or "").lower()
-
-    def user_can_view_all():
-        if not role_name:
-            return False
-        admin_keywords = ["admin", "hr", "manager", "owner", "supervisor"]
-        return any(k in role_name for k in admin_keywords)
 
-    can_view_all = user_can_view_all()
+    can_view_all = user_can_view_all(request.session.get("role_name"))
 
     self_keywords = [
         "my attendance", "meri attendance", "mera attendance", "mujhe attendance",
@@ -488,71 +637,68 @@ def detect_employee_filter(text: str, request) -> dict:
     return {"type": "self", "label": emp_name, "name_value": emp_name.lower()}
 
 
-def handle_attendance_report(decision: dict, token: str, request, user_message: str = ""):
-    if not token:
-        return JsonResponse({"reply_type": "attendance", "reply": "⚠️ Session expired. Please login again."}, status=401)
+def attendance_view(request):
+    """
+    The attendance store view for this user. FixHR decides by token which
+    employees a user sees (a manager only their team), so months are kept
+    per user and never shared between users.
+    """
+    employee_id = request.session.get("employee_id")
+    if employee_id:
+        return f"emp:{employee_id}"
+    return token_scope(request.session.get("fixhr_token"))
+
 
+def _attendance_request(decision: dict, request, user_message: str = ""):
     user_message = user_message or decision.get("text") or ""
-    lang = decision.get("language", "en")
     period = determine_attendance_period(user_message)
     filter_info = detect_employee_filter(user_message, request)
+    store_key = (request.session.get("business_id"), attendance_view(request))
+    return period, filter_info, store_key
 
-    headers = {"authorization": f"Bearer {token}", "Accept": "application/json"}
-    params = {
-        "month": period["month"],
-        "year": period["year"],
-        "start_date": period["start_date"],
-        "end_date": period["end_date"],
-    }
 
-    try:
-        res = requests.get(FIXHR_ATTENDANCE_URL, headers=headers, params=params, timeout=20)
-        print("📡 Attendance API Status:", res.status_code)
-        print("📡 Attendance API Params:", params)
-        data = res.json() if res.content else {}
-        print(data)
-    except Exception as e:
-        logger.error("Attendance API error: %s", e)
-        return JsonResponse(
-            {
-                "reply_type": "attendance",
-                "reply": "⚠️ Attendance report fetch fail ho gaya." if lang == "hi" else f"⚠️ Could not fetch attendance: {e}",
-            },
-            status=502,
-        )
+def _period_dates(period):
+    return datetime.fromisoformat(period["start_date"]).date(), datetime.fromisoformat(period["end_date"]).date()
 
-    def extract_table(payload):
-        if isinstance(payload, list):
-            return payload
-        if isinstance(payload, dict):
-            if "original" in payload:
-                return extract_table(payload["original"])
-            if "data" in payload:
-                return extract_table(payload["data"])
-            if "result" in payload:
-                return extract_table(payload["result"])
-        return []
 
-    employees = extract_table(data)
-    if not isinstance(employees, list):
-        employees = []
+def _attendance_error(e, lang):
+    logger.error("Attendance API error: %s", e)
+    return JsonResponse(
+        {
+            "reply_type": "attendance",
+            "reply": "⚠️ Attendance report fetch fail ho gaya." if lang == "hi" else f"⚠️ Could not fetch attendance: {e}",
+        },
+        status=502,
+    )
+
 
-    def parse_date(value):
-        if not value:
-            return None
-        value = str(value).strip()
-        try:
-            return datetime.fromisoformat(value[:10]).date()
-        except ValueError:
-            parsed = dateparser.parse(value)
-            return parsed.date() if parsed else None
+def resolve_employee_filter(filter_info, business_id):
+    """
+    Add ``emp_ids`` (the rows to show) to a detect_employee_filter result,
+    resolving a name through the business's employee directory. Call it
+    after the report's months are loaded: loading them fills the directory.
+    """
+    f_type = filter_info["type"]
+    if f_type == "emp_id":
+        return {**filter_info, "emp_ids": {str(filter_info["value"])}}
+    if f_type == "self" and filter_info.get("emp_id"):
+        return {**filter_info, "emp_ids": {str(filter_info["emp_id"])}}
+    if f_type != "name":
+        return filter_info
+
+    found = employee_directory.resolve(business_id, filter_info["value"])
+    if found.method == "empty":
+        # Only period/filler words ("for november"): not a name filter
+        return {"type": "all", "label": "All Employees"}
+    info = {**filter_info, "emp_ids": set(found.ids), "resolution": found.method, "label": found.query.title(),
+            "matches": [{"emp_id": emp_id, "name": name} for emp_id, name in found.matches]}
+    if len(found.matches) == 1:
+        info["label"] = found.matches[0][1]
+    return info
 
-    period_start = datetime.fromisoformat(period["start_date"]).date()
-    period_end = datetime.fromisoformat(period["end_date"]).date()
-    row_limit = 250
-    rows = []
-    summary = defaultdict(int)
 
+def attendance_filter(filter_info):
+    """Predicate(emp_name, emp_id) for the employee filter from detect_employee_filter."""
     def matches_filter(emp_name, emp_id):
         f_type = filter_info["type"]
         if f_type == "all":
@@ -569,106 +715,193 @@ def handle_attendance_report(decision: dict, token: str, request, user_message:
         if f_type == "name":
             return filter_info.get("value") in (emp_name or "").lower()
         return True
+    return matches_filter
 
-    for emp in employees:
-        emp_name = (emp.get("emp_name") or emp.get("name") or "").strip()
-        emp_id = emp.get("emp_id") or emp.get("employee_id") or ""
-        if not matches_filter(emp_name, emp_id):
-            continue
 
-        day_entries = emp.get("days") or emp.get("attendance") or []
-        for day in day_entries:
-            day_date = parse_date(day.get("date") or day.get("attendance_date"))
-            if not day_date:
-                continue
-            if day_date < period_start or day_date > period_end:
-                continue
+def handle_attendance_report(decision: dict, token: str, request, user_message: str = ""):
+    if not token:
+        return JsonResponse({"reply_type": "attendance", "reply": "⚠️ Session expired. Please login again."}, status=401)
 
-            status = (day.get("status") or "-").upper()
-            row = {
-                "employee_name": emp_name or f"Emp #{emp_id}",
-                "employee_id": emp_id,
-                "date": day_date.isoformat(),
-                "status": status,
-                "in_time": day.get("in_time") or "-",
-                "out_time": day.get("out_time") or "-",
-                "work_hours": day.get("work_hrs") or day.get("work_hours") or "-",
-                "late": bool(day.get("is_late") or str(day.get("late", "")).lower() == "yes"),
-                "overtime": day.get("overtime_hours") or day.get("ot") or "-",
-                "remark": day.get("remark") or day.get("remarks") or "-",
-            }
-            rows.append(row)
-            summary[status] += 1
+    lang = decision.get("language", "en")
+    period, filter_info, (business_id, view) = _attendance_request(decision, request, user_message)
 
-            if len(rows) >= row_limit:
-                break
-        if len(rows) >= row_limit:
-            break
+    first, last = _period_dates(period)
+    try:
+        grids = attendance_store.grids(token, business_id, view, first, last)
+    except Exception as e:
+        return _attendance_error(e, lang)
+    filter_info = resolve_employee_filter(filter_info, business_id)
+    return _attendance_reply(_filtered_rows(grids, first, last, filter_info), lang, period, filter_info, request, token)
+
+
+async def handle_attendance_report_async(decision: dict, token: str, request, user_message: str = ""):
+    if not token:
+        return JsonResponse({"reply_type": "attendance", "reply": "⚠️ Session expired. Please login again."}, status=401)
+
+    lang = decision.get("language", "en")
+    period, filter_info, (business_id, view) = _attendance_request(decision, request, user_message)
+
+    first, last = _period_dates(period)
+    try:
+        grids = await attendance_store.agrids(token, business_id, view, first, last)
+    except Exception as e:
+        return _attendance_error(e, lang)
+    filter_info = resolve_employee_filter(filter_info, business_id)
+    return _attendance_reply(_filtered_rows(grids, first, last, filter_info), lang, period, filter_info, request, token)
 
-    if not rows:
+
+def _filtered_rows(grids, first, last, filter_info):
+    if "emp_ids" in filter_info:
+        return attendance_store.rows_of(grids, first, last, ids=filter_info["emp_ids"])
+    return attendance_store.rows_of(grids, first, last, attendance_filter(filter_info))
+
+
+def wants_compact_attendance(request):
+    """The chat page asks for the compact register with ``Accept: application/vnd.fixhr.attendance+json``."""
+    return COMPACT_ATTENDANCE_TYPE in request.headers.get("Accept", "")
+
+
+def _compact_register(rows, dates):
+    """
+    Columnar register: employee and status dictionaries plus one array of
+    status codes per employee and date in ``dates`` (0 = no entry that
+    day). Rows are keyed by employee ID, so two employees with the same
+    name stay apart.
+    """
+    column = {d: i for i, d in enumerate(dates)}
+    statuses, status_codes = [], {}
+    employees, cells, emp_rows = [], [], {}
+    for r in rows:
+        key = str(r["employee_id"]) if r["employee_id"] not in (None, "") else f"name:{r['employee_name']}"
+        row = emp_rows.get(key)
+        if row is None:
+            row = emp_rows[key] = len(employees)
+            employees.append([r["employee_id"], r["employee_name"]])
+            cells.append([0] * len(dates))
+        code = status_codes.get(r["status"])
+        if code is None:
+            statuses.append(r["status"])
+            code = status_codes[r["status"]] = len(statuses)
+        cells[row][column[r["date"]]] = code
+    return {"dates": dates, "employees": employees, "statuses": statuses, "cells": cells}
+
+
+def _detail_row(r):
+    return {
+        "date": r["date"],
+        "status": r["status"],
+        "in_time": r["in_time"],
+        "out_time": r["out_time"],
+        "work_hrs": r["work_hours"],
+        "is_late": r["late"],
+        "overtime_hours": r["overtime"],
+        "remark": r["remark"],
+    }
+
+
+def _export_links(period, filter_info):
+    """Download URLs (/api/attendance/export/) for the register a reply shows."""
+    query = {"start": period["start_date"], "end": period["end_date"]}
+    ids = filter_info.get("emp_ids") or ()
+    if len(ids) == 1:
+        query["emp_id"] = next(iter(ids))
+    elif filter_info["type"] == "name":
+        query["name"] = filter_info["label"]
+    url = reverse("attendance_export_api")
+    return {fmt: f"{url}?{urlencode({**query, 'format': fmt})}" for fmt in attendance_export.WRITERS}
+
+
+def _attendance_reply(all_rows, lang, period, filter_info, request, token):
+    """
+    Turn attendance rows (core.attendance_store) into the renderAttendance
+    JSON. The reply holds the first page of the register in (employee,
+    date) order; ``page.next_cursor`` points at the rest
+    (core.attendance_cursor, /api/attendance/page/).
+    """
+    if filter_info.get("resolution") == "none":
+        name = filter_info["label"]
+        reply = f"⚠️ '{name}' naam ka koi employee nahi mila." if lang == "hi" else f"⚠️ No employee named '{name}' found."
+        return JsonResponse({"reply_type": "attendance", "reply": reply, "matches": []})
+
+    if not all_rows:
         scope = filter_info["label"]
         reply = f"⚠️ Attendance data nahi mila {scope} ke liye." if lang == "hi" else f"⚠️ No attendance found for {scope}."
         return JsonResponse({"reply_type": "attendance", "reply": reply})
 
+    summary = defaultdict(int)
+    for row in all_rows:
+        summary[row["status"]] += 1
+    summary_rows = [{"status": status, "days": count} for status, count in summary.items()]
+
+    scope_label = filter_info["label"]
+    period_label = period["label"] or f"{period['start_date']} → {period['end_date']}"
+    reply = (
+        f"📒 Attendance report {scope_label} ka ({period_label})."
+        if lang == "hi"
+        else f"📒 Attendance report for {scope_label} ({period_label})."
+    )
+    matches = filter_info.get("matches") or []
+    if len(matches) > 1:
+        names = ", ".join(f"{m['name']} (#{m['emp_id']})" for m in matches[:8])
+        reply += (
+            f"\n🔎 {len(matches)} employees match '{scope_label}': {names}. Ek chunne ke liye 'attendance of emp <id>' likhein."
+            if lang == "hi"
+            else f"\n🔎 {len(matches)} employees match '{scope_label}': {names}. Say 'attendance of emp <id>' to pick one."
+        )
+    elif filter_info.get("resolution") == "fuzzy":
+        reply += " (closest match)"
+
+    # Everything but the register itself; kept with the cursor so later pages render the same way
+    head = {
+        "reply_type": "attendance",
+        "reply": reply,
+        "range": {"label": period_label, "start": period["start_date"], "end": period["end_date"]},
+        "scope": scope_label,
+        "summary": summary_rows,
+        "matches": matches,
+        "export": _export_links(period, filter_info),
+        "dates": sorted({r["date"] for r in all_rows}),
+    }
+    return _attendance_page(attendance_cursor.first_page(all_rows, head, token, _page_rows(request)), request)
+
+
+def _page_rows(request):
+    return COMPACT_PAGE_ROWS if wants_compact_attendance(request) else ATTENDANCE_PAGE_ROWS
+
+
+def _attendance_page(page, request):
+    """One page of the register in the format the request asks for (compact or the original one)."""
+    payload = dict(page.context)
+    dates = payload.pop("dates")
+    payload["page"] = {"offset": page.offset, "rows": len(page.rows), "total": page.total, "next_cursor": page.next_cursor}
+    if wants_compact_attendance(request):
+        payload.update(format="compact", register=_compact_register(page.rows, dates),
+                       details_url=reverse("attendance_details_api"))
+        return FastJsonResponse(request, payload, content_type=COMPACT_ATTENDANCE_TYPE)
+
     # ---- Build UI-friendly structure expected by renderAttendance in chat_page.html ----
     # 1) Register view: one row per employee with status per day
     by_emp_date = {}
-    dates_sorted = sorted({r["date"] for r in rows})
-    for r in rows:
+    for r in page.rows:
         key = r["employee_name"]
         by_emp_date.setdefault(key, {})[r["date"]] = r["status"]
 
     register_rows = []
     for emp_name, date_map in by_emp_date.items():
-        values = [date_map.get(d, "-") for d in dates_sorted]
+        values = [date_map.get(d, "-") for d in dates]
         register_rows.append({"name": emp_name, "values": values})
 
-    register = {
-        "headers": ["Employee"] + dates_sorted,
+    payload["register"] = {
+        "headers": ["Employee"] + dates,
         "rows": register_rows,
     }
 
     # 2) Details sections: one card per employee with row-wise data
     details_map = {}
-    for r in rows:
-        emp_name = r["employee_name"]
-        details_map.setdefault(emp_name, []).append(
-            {
-                "date": r["date"],
-                "status": r["status"],
-                "in_time": r["in_time"],
-                "out_time": r["out_time"],
-                "work_hrs": r["work_hours"],
-                "is_late": r["late"],
-                "overtime_hours": r["overtime"],
-                "remark": r["remark"],
-            }
-        )
-
-    details = [{"emp_name": emp, "rows": emp_rows} for emp, emp_rows in details_map.items()]
-
-    summary_rows = [{"status": status, "days": count} for status, count in summary.items()]
-
-    scope_label = filter_info["label"]
-    period_label = period["label"] or f"{period['start_date']} → {period['end_date']}"
-    reply = (
-        f"📒 Attendance report {scope_label} ka ({period_label})."
-        if lang == "hi"
-        else f"📒 Attendance report for {scope_label} ({period_label})."
-    )
-
-    return JsonResponse(
-        {
-            "reply_type": "attendance",
-            "reply": reply,
-            "range": {"label": period_label, "start": period["start_date"], "end": period["end_date"]},
-            "scope": scope_label,
-            "register": register,
-            "details": details,
-            "summary": summary_rows,
-            "limited": len(rows) >= row_limit,
-        }
-    )
+    for r in page.rows:
+        details_map.setdefault(r["employee_name"], []).append(_detail_row(r))
+    payload["details"] = [{"emp_name": emp, "rows": emp_rows} for emp, emp_rows in details_map.items()]
+    return JsonResponse(payload)
 
 
 
@@ -715,43 +948,52 @@ def small_talk(msg: str, lang: str):
 
 
 # ---------------- Feature Handlers (extracted) ----------------
-def handle_leave_balance(token):
+def handle_leave_balance(token, employee_id=None, business_id=None):
     try:
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
-        r = requests.get(LEAVE_BALANCE_URL, headers=headers, timeout=15)
-        print("📡 Leave Balance Status:", r.status_code)
-        print("📡 Leave Balance Body:", r.text)
-
-        data = r.json() if r.content else {}
-        result_items = data.get("result") or []
-
-        if isinstance(result_items, dict):
-            result_items = [result_items]
-
-        if result_items:
-            balances = []
-            for item in result_items:
-                category = (item.get("category_master_detail") or [{}])[0]
-                balances.append({
-                    "name": category.get("name") or "Unknown",
-                    "description": category.get("description") or "",
-                    "total_allotted": item.get("total_alloted_leave") or item.get("total_allotted_leave"),
-                    "total_taken": item.get("total_taken_leave"),
-                    "total_balance": item.get("total_balance_remaining_leave"),
-                    "carried_forward": item.get("total_carried_forward"),
-                })
+        return _leave_balance_reply(leave_balance_cache.get_balance(token, employee_id, business_id))
+    except Exception as e:
+        return f"Error fetching leave balance: {str(e)}"
 
-            return JsonResponse({
-                "reply_type": "leave_balance",
-                "reply": "📊 Leave Balance",
-                "balances": balances,
-            })
 
-        return data.get("message") or "✅ No leave balance data found."
+async def handle_leave_balance_async(token, employee_id=None, business_id=None):
+    try:
+        return _leave_balance_reply(await leave_balance_cache.get_balance_async(token, employee_id, business_id))
     except Exception as e:
         return f"Error fetching leave balance: {str(e)}"
 
 
+def _leave_balance_reply(r):
+    print("📡 Leave Balance Status:", r.status_code)
+    print("📡 Leave Balance Body:", r.text)
+
+    data = r.json() if r.content else {}
+    result_items = data.get("result") or []
+
+    if isinstance(result_items, dict):
+        result_items = [result_items]
+
+    if result_items:
+        balances = []
+        for item in result_items:
+            category = (item.get("category_master_detail") or [{}])[0]
+            balances.append({
+                "name": category.get("name") or "Unknown",
+                "description": category.get("description") or "",
+                "total_allotted": item.get("total_alloted_leave") or item.get("total_allotted_leave"),
+                "total_taken": item.get("total_taken_leave"),
+                "total_balance": item.get("total_balance_remaining_leave"),
+                "carried_forward": item.get("total_carried_forward"),
+            })
+
+        return JsonResponse({
+            "reply_type": "leave_balance",
+            "reply": "📊 Leave Balance",
+            "balances": balances,
+        })
+
+    return data.get("message") or "✅ No leave balance data found."
+
+
 # -------------------------------------------
 # 🆕 ADD THIS ABOVE handle_apply_leave
 # -------------------------------------------
@@ -782,7 +1024,7 @@ def detect_leave_date(message):
 
     # Default (if date not spoken): today
     return today.strftime("%d %b, %Y")
-def apply_leave_nlp(info: dict, token: str, user_id=None, user_message="") -> dict:
+def apply_leave_nlp(info: dict, token: str, user_id=None, user_message="", business_id=None) -> dict:
     """
     Safely apply leave using LLM-decoded info + smart range extraction.
     """
@@ -858,21 +1100,8 @@ def apply_leave_nlp(info: dict, token: str, user_id=None, user_message="") -> di
         "reason": reason,
     }
 
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/x-www-form-urlencoded",
-        "authorization": f"Bearer {token}",
-    }
-
-    # API CALL
-    try:
-        r = requests.post(LEAVE_APPLY_URL, headers=headers, data=payload, timeout=15)
-        try:
-            data = r.json()
-        except:
-            data = {"status": False, "message": r.text}
-    except Exception as e:
-        data = {"status": False, "message": str(e)}
+    # API CALL (queued; core.apply_queue posts it and refreshes the balance)
+    data = apply_queue.submit("leave", payload, token, user_id, business_id)
 
     # ---------------------------------------------------
     # 6) SAVE MEMORY
@@ -890,6 +1119,7 @@ def apply_leave_nlp(info: dict, token: str, user_id=None, user_message="") -> di
     return {
         "ok": bool(data.get("status")),
         "api_raw": data,
+        "job": data.get("job"),
         "date": f"{start_date} → {end_date}",
         "leave_type": leave_type,
         "reason": reason,
@@ -943,149 +1173,235 @@ def normalize_date(date_str: str, user_id=None):
     return dt.strftime("%d %b, %Y")
 
 
-def handle_pending_leaves(token, role_name):
+def handle_pending_leaves(token, role_name, business_id=None):
     try:
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
-        params = {"page": 1, "limit": 10}
-        r = requests.get(LEAVE_LIST_URL, headers=headers, params=params, timeout=15)
-        data = r.json()
-        rows = data.get("result", {}).get("data", [])
-        print("leaves data", data)
-
-        if rows:
-            leave_cards = []
-            for lv in rows:
-                status_info = (lv.get("leave_status") or [{}])[0]
-                leave_cards.append({
-                    "leave_id": lv.get("leave_id"),
-                    "emp_name": lv.get("emp_name"),
-                    "start_date": lv.get("start_date"),
-                    "end_date": lv.get("end_date"),
-                    "reason": lv.get("reason"),
-                    "leave_type": lv.get("leave_category", [{}])[0].get("category", {}).get("name", "Unknown"),
-                    "emp_d_id": lv.get("emp_d_id"),
-                    "module_id": lv.get("leave_am_id"),
-                    "master_module_id": lv.get("leave_module_id"),
-                    "status_name": status_info.get("name"),
-                    "status_color": (status_info.get("other") or [{}])[0].get("color"),
-                })
+        rows, total = fixhr.get_all_pages("leave_list", token=token)
+        employee_directory.observe_rows(business_id, rows)
+        return _pending_leaves_reply(rows, total, role_name, token)
+    except Exception as e:
+        return f"Error fetching pending leaves: {str(e)}"
 
-            return JsonResponse({
-                "reply_type": "leave_cards",
-                "reply": "📋 Leave Requests",
-                "leaves": leave_cards,
-                "can_approve": (role_name or "") != "Employee",
-            })
-        return "✅ No pending leave approvals."
+
+async def handle_pending_leaves_async(token, role_name, business_id=None):
+    try:
+        rows, total = await afixhr.get_all_pages("leave_list", token=token)
+        employee_directory.observe_rows(business_id, rows)
+        return _pending_leaves_reply(rows, total, role_name, token)
     except Exception as e:
         return f"Error fetching pending leaves: {str(e)}"
 
 
-def handle_my_leaves(token, employee_id):
+def _leave_cards(rows):
+    leave_cards = []
+    for lv in rows:
+        status_info = (lv.get("leave_status") or [{}])[0]
+        leave_cards.append({
+            "leave_id": lv.get("leave_id"),
+            "emp_name": lv.get("emp_name"),
+            "start_date": lv.get("start_date"),
+            "end_date": lv.get("end_date"),
+            "reason": lv.get("reason"),
+            "leave_type": lv.get("leave_category", [{}])[0].get("category", {}).get("name", "Unknown"),
+            "emp_d_id": lv.get("emp_d_id"),
+            "module_id": lv.get("leave_am_id"),
+            "master_module_id": lv.get("leave_module_id"),
+            "status_name": status_info.get("name"),
+            "status_color": (status_info.get("other") or [{}])[0].get("color"),
+        })
+    return leave_cards
+
+
+def _pending_leaves_reply(rows, total, role_name, token):
+    print("📡 Pending Leaves:", len(rows), "of", total)
+
+    if rows:
+        leave_cards = _leave_cards(rows)
+
+        return JsonResponse(list_cursor.first_chunk({
+            "reply_type": "leave_cards",
+            "reply": "📋 Leave Requests",
+            "leaves": leave_cards,
+            "total": total,
+            "can_approve": (role_name or "") != "Employee",
+        }, "leaves", token))
+    return "✅ No pending leave approvals."
+
+
+REQUEST_STATE_WORDS = (
+    ("approved", ("approved", "approve hui", "manzoor")),
+    ("rejected", ("rejected", "reject hui", "declined")),
+    ("cancelled", ("cancelled", "canceled")),
+    ("pending", ("pending", "requested", "awaiting")),
+)
+
+
+def _my_requests_filters(msg):
+    """(state, first, last) for "my approved leaves in october", "pending missed punches from 1 oct to 10 oct"..."""
+    t = (msg or "").lower()
+    state = next((name for name, words in REQUEST_STATE_WORDS if any(w in t for w in words)), None)
+    first = last = None
+    if _date_range(msg) or MONTH_NAME_RE.search(t) or QUARTER_RE.search(t) or any(
+        w in t for w in ("month", "week", "mahine", "quarter")
+    ):
+        first, last = _period_dates(determine_attendance_period(msg))
+    return state, first, last
+
+
+def _my_requests(token, employee_id, business_id, kind, msg):
+    return request_store.requests(token, employee_id, business_id, kind, *_my_requests_filters(msg))
+
+
+async def _my_requests_async(token, employee_id, business_id, kind, msg):
+    return await sync_to_async(_my_requests, thread_sensitive=False)(token, employee_id, business_id, kind, msg)
+
+
+def handle_my_leaves(token, employee_id, business_id=None, msg=""):
     try:
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
-        params = {"page": 1, "limit": 20, "emp_id": employee_id, "self": 1}
-        r = requests.get(LEAVE_APPLY_URL, headers=headers, params=params, timeout=15)
-        print("📡 My Leaves Status:", r.status_code)
-        print("📡 My Leaves Body:", r.text)
-
-        data = r.json()
-        rows = []
-        if isinstance(data, list):
-            rows = data
-        elif isinstance(data, dict):
-            result = data.get("result")
-            if isinstance(result, list):
-                rows = result
-            elif isinstance(result, dict):
-                rows = result.get("data", []) or result.get("leaves", [])
-            if not rows:
-                rows = data.get("data", [])
-
-        if rows:
-            my_leaves = []
-            for lv in rows:
-                status_info = (lv.get("leave_status") or [{}])[0]
-                category_name = lv.get("leave_category", [{}])[0].get("category", {}).get("name", "Unknown")
-                my_leaves.append({
-                    "leave_id": lv.get("leave_id"),
-                    "start_date": lv.get("start_date"),
-                    "end_date": lv.get("end_date"),
-                    "reason": lv.get("reason"),
-                    "leave_type": category_name,
-                    "status_name": status_info.get("name") or "Requested",
-                    "status_color": (status_info.get("other") or [{}])[0].get("color"),
-                })
+        cards, total = _my_requests(token, employee_id, business_id, "leave", msg)
+        return _my_leaves_reply(cards, total)
+    except Exception as e:
+        return JsonResponse({"reply": f"Error fetching your leaves: {str(e)}"})
 
-            return JsonResponse({
-                "reply_type": "my_leaves",
-                "reply": "📋 Your Leave Requests",
-                "leaves": my_leaves,
-                "can_approve": False,
-            })
-        return JsonResponse({"reply": "✅ You have no leave requests."})
+
+async def handle_my_leaves_async(token, employee_id, business_id=None, msg=""):
+    try:
+        cards, total = await _my_requests_async(token, employee_id, business_id, "leave", msg)
+        return _my_leaves_reply(cards, total)
     except Exception as e:
         return JsonResponse({"reply": f"Error fetching your leaves: {str(e)}"})
 
 
-def handle_leave_approval(msg, token):
+def _my_leaves_reply(cards, total):
+    print("📡 My Leaves:", total)
+    if cards:
+        return JsonResponse({
+            "reply_type": "my_leaves",
+            "reply": "📋 Your Leave Requests",
+            "leaves": cards,
+            "total": total,
+            "can_approve": False,
+        })
+    return JsonResponse({"reply": "✅ You have no leave requests."})
+
+
+def handle_my_gatepasses(token, employee_id, business_id=None, msg=""):
+    try:
+        cards, total = _my_requests(token, employee_id, business_id, "gatepass", msg)
+        return _my_gatepasses_reply(cards, total, token)
+    except Exception as e:
+        return JsonResponse({"reply": f"Error fetching your gatepasses: {str(e)}"})
+
+
+async def handle_my_gatepasses_async(token, employee_id, business_id=None, msg=""):
+    try:
+        cards, total = await _my_requests_async(token, employee_id, business_id, "gatepass", msg)
+        return _my_gatepasses_reply(cards, total, token)
+    except Exception as e:
+        return JsonResponse({"reply": f"Error fetching your gatepasses: {str(e)}"})
+
+
+def _my_gatepasses_reply(cards, total, token):
+    print("📡 My Gatepasses:", total)
+    if cards:
+        return JsonResponse(list_cursor.first_chunk({
+            "reply_type": "gatepass_cards",
+            "reply": "📋 Your Gatepass Requests",
+            "gatepasses": cards,
+            "total": total,
+            "can_approve": False,
+        }, "gatepasses", token))
+    return JsonResponse({"reply": "✅ You have no gatepass requests."})
+
+
+def _approval_check_params(trp_id, module_id, master_module_id):
+    return {"approval_status": 140, "trp_id": trp_id, "module_id": module_id, "master_module_id": master_module_id}
+
+
+def _approval_step(r1, label):
+    print(f"📡 {label} Check Status:", r1.status_code)
+    print(f"📡 {label} Check Body:", r1.text)
+    check_data = r1.json()
+    if not check_data.get("status") or not check_data.get("result"):
+        return None
+    return check_data["result"][0]
+
+
+def _leave_handler_params(step, approve, leave_id, emp_d_id, master_module_id, note):
+    return {
+        "data[request_id]": leave_id,
+        "data[approval_status]": step["pa_status_id"] if approve else "158",
+        "data[approval_action_type]": step["pa_type"],
+        "data[approval_type]": "1" if approve else "2",
+        "data[approval_sequence]": step["pa_sequence"],
+        "data[lvr_id]": md5_hash(leave_id),
+        "data[module_id]": md5_hash(step["pa_am_id"]),
+        "data[master_module_id]": master_module_id,
+        "data[message]": note,
+        "data[is_last_approval]": step["pa_is_last"],
+        "data[emp_d_id]": emp_d_id,
+        "POST_TYPE": "LEAVE_REQUEST_APPROVAL",
+    }
+
+
+def _mirror_approval(kind, request_id, approve, step, business_id=None):
+    """Show a successful approval step in the requester's local request list (core.request_store)."""
+    final = str(step.get("pa_is_last")).lower() in ("1", "true")
+    request_store.record_approval(kind, request_id, approve, final, business_id)
+
+
+def _leave_approval_reply(r2, leave_id, approve, step, business_id=None):
+    print("📡 Leave Approval Handler Status:", r2.status_code)
+    print("📡 Leave Approval Handler Body:", r2.text)
+    handler_data = r2.json()
+    if handler_data.get("status"):
+        leave_balance_cache.on_leave_approved(business_id)
+        _mirror_approval("leave", leave_id, approve, step, business_id)
+        return f"✅ Leave ID {leave_id} {'approved' if approve else 'rejected'} successfully!"
+    return f"⚠️ Leave approval failed: {handler_data.get('message', 'Unknown error')}"
+
+
+def handle_leave_approval(msg, token, business_id=None):
     try:
         print("approve leave chal rha hai")
         action, leave_id, emp_d_id, module_id, master_module_id, note = msg.split("|")
         approve = action.lower().startswith("approve")
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
-
-        check_params = {
-            "approval_status": 140,
-            "trp_id": leave_id,
-            "module_id": module_id,
-            "master_module_id": master_module_id,
-        }
-        r1 = requests.post(APPROVAL_CHECK_URL, headers=headers, params=check_params, timeout=15)
-        print("📡 Leave Approval Check Status:", r1.status_code)
-        print("📡 Leave Approval Check Body:", r1.text)
 
-        check_data = r1.json()
-        if not check_data.get("status") or not check_data.get("result"):
+        r1 = fixhr.post("approval_check", token=token, params=_approval_check_params(leave_id, module_id, master_module_id))
+        step = _approval_step(r1, "Leave Approval")
+        if step is None:
             return JsonResponse({"reply": "❌ No approver found for this leave."})
 
-        step = check_data["result"][0]
-        approval_status = step["pa_status_id"] if approve else "158"
-        approval_type = "1" if approve else "2"
-
-        handler_params = {
-            "data[request_id]": leave_id,
-            "data[approval_status]": approval_status,
-            "data[approval_action_type]": step["pa_type"],
-            "data[approval_type]": approval_type,
-            "data[approval_sequence]": step["pa_sequence"],
-            "data[lvr_id]": md5_hash(leave_id),
-            "data[module_id]": md5_hash(step["pa_am_id"]),
-            "data[master_module_id]": master_module_id,
-            "data[message]": note,
-            "data[is_last_approval]": step["pa_is_last"],
-            "data[emp_d_id]": emp_d_id,
-            "POST_TYPE": "LEAVE_REQUEST_APPROVAL",
-        }
+        handler_params = _leave_handler_params(step, approve, leave_id, emp_d_id, master_module_id, note)
+        print("📦 Leave Handler Params Sent:", json.dumps(handler_params, indent=2))
+        r2 = fixhr.post("approval_handler", token=token, data=handler_params)
+        return _leave_approval_reply(r2, leave_id, approve, step, business_id)
+    except Exception as e:
+        print("❌ Exception in leave approval:", traceback.format_exc())
+        return f"Error in leave approval: {str(e)}"
 
+
+async def handle_leave_approval_async(msg, token, business_id=None):
+    try:
+        action, leave_id, emp_d_id, module_id, master_module_id, note = msg.split("|")
+        approve = action.lower().startswith("approve")
+
+        r1 = await afixhr.post("approval_check", token=token, params=_approval_check_params(leave_id, module_id, master_module_id))
+        step = _approval_step(r1, "Leave Approval")
+        if step is None:
+            return JsonResponse({"reply": "❌ No approver found for this leave."})
+
+        handler_params = _leave_handler_params(step, approve, leave_id, emp_d_id, master_module_id, note)
         print("📦 Leave Handler Params Sent:", json.dumps(handler_params, indent=2))
-        r2 = requests.post(APPROVAL_HANDLER_URL, headers=headers, data=handler_params, timeout=15)
-        print("📡 Leave Approval Handler Status:", r2.status_code)
-        print("📡 Leave Approval Handler Body:", r2.text)
-
-        handler_data = r2.json()
-        if handler_data.get("status"):
-            return f"✅ Leave ID {leave_id} {'approved' if approve else 'rejected'} successfully!"
-        return f"⚠️ Leave approval failed: {handler_data.get('message', 'Unknown error')}"
+        r2 = await afixhr.post("approval_handler", token=token, data=handler_params)
+        return _leave_approval_reply(r2, leave_id, approve, step, business_id)
     except Exception as e:
         print("❌ Exception in leave approval:", traceback.format_exc())
         return f"Error in leave approval: {str(e)}"
-    
 
 import re
 from datetime import datetime, timedelta
 
-def apply_gatepass_nlp(decision, token, user_id):
+def apply_gatepass_nlp(decision, token, user_id, business_id=None):
     text = decision["user_msg"].lower()
     reason = (decision.get("reason") or "").strip() or "Gatepass"
 
@@ -1159,15 +1475,10 @@ def apply_gatepass_nlp(decision, token, user_id):
         "destination": "Office"
     }
 
-    response = call_fixhr_gatepass_api(payload, token)
+    response = apply_queue.submit("gatepass", payload, token, user_id, business_id)
 
-    success = (
-        response.get("status") in [True, "success"] or
-        response.get("success") in [True, "success"]
-    )
-
-    if success:
-        return {"ok": True, "api_raw": response, "out": out_time, "in": in_time}
+    if apply_queue_accepted(response):
+        return {"ok": True, "api_raw": response, "job": response.get("job"), "out": out_time, "in": in_time}
 
     return {
         "ok": False,
@@ -1200,83 +1511,116 @@ def detect_duration(text):
 
 def handle_pending_gatepass(token, role_name):
     try:
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
-        params = {"page": 1, "limit": 10}
-        r = requests.get(GATEPASS_APPROVAL_LIST, headers=headers, params=params, timeout=15)
-        print("📡 Pending GatePass Status:", r.status_code)
-        print("📡 Pending GatePass Body:", r.text)
-
-        data = r.json()
-        rows = data.get("result", {}).get("data", [])
-        if rows:
-            gatepass_cards = []
-            for g in rows:
-                status_info = (g.get("status") or [{}])[0]
-                gatepass_cards.append({
-                    "id": g.get("id"),
-                    "emp_name": g.get("emp_name"),
-                    "out_time": g.get("out_time"),
-                    "in_time": g.get("in_time"),
-                    "reason": g.get("reason"),
-                    "destination": g.get("destination"),
-                    "emp_d_id": g.get("emp_d_id"),
-                    "module_id": g.get("am_id"),
-                    "master_module_id": g.get("module_id"),
-                    "status_name": status_info.get("name") or "Requested",
-                    "status_color": (status_info.get("other") or [{}])[0].get("color"),
-                })
-
-            return JsonResponse({
-                "reply_type": "gatepass_cards",
-                "reply": "📋 Pending GatePass Approvals",
-                "gatepasses": gatepass_cards,
-                "can_approve": (role_name or "") != "Employee",
-            })
-        return JsonResponse({"reply": "✅ No pending gatepass approvals."})
+        rows, total = fixhr.get_all_pages("gatepass_approval_list", token=token)
+        return _pending_gatepass_reply(rows, total, role_name, token)
     except Exception as e:
         return JsonResponse({"reply": f"Error fetching pending gatepass: {str(e)}"})
 
 
-def handle_gatepass_approval(msg, token):
+async def handle_pending_gatepass_async(token, role_name):
     try:
-        action, gtp_id, emp_d_id, module_id, master_module_id, note = msg.split("|")
-        approve = action.lower().startswith("approve")
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
+        rows, total = await afixhr.get_all_pages("gatepass_approval_list", token=token)
+        return _pending_gatepass_reply(rows, total, role_name, token)
+    except Exception as e:
+        return JsonResponse({"reply": f"Error fetching pending gatepass: {str(e)}"})
 
-        check_params = {"approval_status": 140, "trp_id": gtp_id, "module_id": module_id, "master_module_id": master_module_id}
-        r1 = requests.post(APPROVAL_CHECK_URL, headers=headers, params=check_params, timeout=15)
-        print("📡 Approval Check Status:", r1.status_code)
-        print("📡 Approval Check Body:", r1.text)
 
-        check_data = r1.json()
-        if not check_data.get("status") or not check_data.get("result"):
-            return "❌ Approval check failed (no approver found)."
+def _gatepass_cards(rows):
+    gatepass_cards = []
+    for g in rows:
+        status_info = (g.get("status") or [{}])[0]
+        gatepass_cards.append({
+            "id": g.get("id"),
+            "emp_name": g.get("emp_name"),
+            "date": g.get("date"),
+            "out_time": g.get("out_time"),
+            "in_time": g.get("in_time"),
+            "reason": g.get("reason"),
+            "destination": g.get("destination"),
+            "emp_d_id": g.get("emp_d_id"),
+            "module_id": g.get("am_id"),
+            "master_module_id": g.get("module_id"),
+            "status_name": status_info.get("name") or "Requested",
+            "status_color": (status_info.get("other") or [{}])[0].get("color"),
+        })
+    return gatepass_cards
 
-        step = check_data["result"][0]
-        approval_status = step["pa_status_id"] if approve else "158"
-        approval_type = "1" if approve else "2"
-        handler_params = {
-            "data[request_id]": "",
-            "data[approval_status]": approval_status,
-            "data[approval_action_type]": step["pa_type"],
-            "data[approval_type]": approval_type,
-            "data[approval_sequence]": step["pa_sequence"],
-            "data[gtp_id]": md5_hash(gtp_id),
-            "data[module_id]": md5_hash(step["pa_am_id"]),
-            "data[message]": note,
-            "data[master_module_id]": master_module_id,
-            "data[is_last_approval]": step["pa_is_last"],
-            "data[emp_d_id]": emp_d_id,
-            "POST_TYPE": "GATEPASS_REQUEST_APPROVAL",
-        }
 
+def _pending_gatepass_reply(rows, total, role_name, token):
+    print("📡 Pending GatePass:", len(rows), "of", total)
+
+    if rows:
+        gatepass_cards = _gatepass_cards(rows)
+
+        return JsonResponse(list_cursor.first_chunk({
+            "reply_type": "gatepass_cards",
+            "reply": "📋 Pending GatePass Approvals",
+            "gatepasses": gatepass_cards,
+            "total": total,
+            "can_approve": (role_name or "") != "Employee",
+        }, "gatepasses", token))
+    return JsonResponse({"reply": "✅ No pending gatepass approvals."})
+
+
+def _gatepass_handler_params(step, approve, gtp_id, emp_d_id, master_module_id, note):
+    return {
+        "data[request_id]": "",
+        "data[approval_status]": step["pa_status_id"] if approve else "158",
+        "data[approval_action_type]": step["pa_type"],
+        "data[approval_type]": "1" if approve else "2",
+        "data[approval_sequence]": step["pa_sequence"],
+        "data[gtp_id]": md5_hash(gtp_id),
+        "data[module_id]": md5_hash(step["pa_am_id"]),
+        "data[message]": note,
+        "data[master_module_id]": master_module_id,
+        "data[is_last_approval]": step["pa_is_last"],
+        "data[emp_d_id]": emp_d_id,
+        "POST_TYPE": "GATEPASS_REQUEST_APPROVAL",
+    }
+
+
+def _gatepass_approval_reply(r2, gtp_id, approve, step):
+    print("📡 Approval Handler Status:", r2.status_code)
+    print("📡 Approval Handler Body:", r2.text)
+    handler_data = r2.json()
+    if handler_data.get("status"):
+        _mirror_approval("gatepass", gtp_id, approve, step)
+    return handler_data.get("message", "Approval action done.")
+
+
+def handle_gatepass_approval(msg, token):
+    try:
+        action, gtp_id, emp_d_id, module_id, master_module_id, note = msg.split("|")
+        approve = action.lower().startswith("approve")
+
+        r1 = fixhr.post("approval_check", token=token, params=_approval_check_params(gtp_id, module_id, master_module_id))
+        step = _approval_step(r1, "Approval")
+        if step is None:
+            return "❌ Approval check failed (no approver found)."
+
+        handler_params = _gatepass_handler_params(step, approve, gtp_id, emp_d_id, master_module_id, note)
         print("📦 Handler Params Sent:", json.dumps(handler_params, indent=2))
-        r2 = requests.post(APPROVAL_HANDLER_URL, headers=headers, data=handler_params, timeout=15)
-        print("📡 Approval Handler Status:", r2.status_code)
-        print("📡 Approval Handler Body:", r2.text)
+        r2 = fixhr.post("approval_handler", token=token, data=handler_params)
+        return _gatepass_approval_reply(r2, gtp_id, approve, step)
+    except Exception as e:
+        print("❌ Exception in approval:", traceback.format_exc())
+        return f"Error in approval: {str(e)}"
 
-        handler_data = r2.json()
-        return handler_data.get("message", "Approval action done.")
+
+async def handle_gatepass_approval_async(msg, token):
+    try:
+        action, gtp_id, emp_d_id, module_id, master_module_id, note = msg.split("|")
+        approve = action.lower().startswith("approve")
+
+        r1 = await afixhr.post("approval_check", token=token, params=_approval_check_params(gtp_id, module_id, master_module_id))
+        step = _approval_step(r1, "Approval")
+        if step is None:
+            return "❌ Approval check failed (no approver found)."
+
+        handler_params = _gatepass_handler_params(step, approve, gtp_id, emp_d_id, master_module_id, note)
+        print("📦 Handler Params Sent:", json.dumps(handler_params, indent=2))
+        r2 = await afixhr.post("approval_handler", token=token, data=handler_params)
+        return _gatepass_approval_reply(r2, gtp_id, approve, step)
     except Exception as e:
         print("❌ Exception in approval:", traceback.format_exc())
         return f"Error in approval: {str(e)}"
@@ -1285,142 +1629,372 @@ def handle_gatepass_approval(msg, token):
 
 def handle_pending_missed_punch(token, role_name):
     try:
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
-        params = {"page": 1, "limit": 10}
-        r = requests.get(MISSED_PUNCH_APPROVAL_LIST_URL, headers=headers, params=params, timeout=15)
-        print("📡 Pending Missed Punch Status:", r.status_code)
-        print("📡 Pending Missed Punch Body:", r.text)
-
-        data = r.json()
-        rows = data.get("result", {}).get("data", [])
-        if rows:
-            missed_cards = []
-            for mp in rows:
-                status_info = (mp.get("status") or [{}])[0]
-                reason_info = (mp.get("reason") or [{}])[0]
-                reason_text = mp.get("custom_reason") or reason_info.get("name") or ""
-                missed_cards.append({
-                    "id": mp.get("id"),
-                    "emp_name": mp.get("emp_name"),
-                    "date": mp.get("date"),
-                    "reason": reason_text,
-                    "emp_d_id": mp.get("emp_d_id"),
-                    "module_id": mp.get("am_id"),
-                    "master_module_id": mp.get("module_id"),
-                    "status_name": status_info.get("name") or "Requested",
-                    "status_color": (status_info.get("other") or [{}])[0].get("color"),
-                })
+        rows, total = fixhr.get_all_pages("missed_punch_approval_list", token=token)
+        return _pending_missed_punch_reply(rows, total, role_name, token)
+    except Exception as e:
+        return JsonResponse({"reply": f"Error fetching pending missed punch: {str(e)}"})
 
-            return JsonResponse({
-                "reply_type": "missed_cards",
-                "reply": "📋 Pending Missed Punch Approvals",
-                "missed": missed_cards,
-                "can_approve": (role_name or "") != "Employee",
-            })
 
-        return JsonResponse({"reply": "✅ No pending missed punch approvals."})
+async def handle_pending_missed_punch_async(token, role_name):
+    try:
+        rows, total = await afixhr.get_all_pages("missed_punch_approval_list", token=token)
+        return _pending_missed_punch_reply(rows, total, role_name, token)
     except Exception as e:
         return JsonResponse({"reply": f"Error fetching pending missed punch: {str(e)}"})
 
 
-def handle_my_missed_punch(token):
+def _missed_cards(rows):
+    missed_cards = []
+    for mp in rows:
+        status_info = (mp.get("status") or [{}])[0]
+        reason_info = (mp.get("reason") or [{}])[0]
+        reason_text = mp.get("custom_reason") or reason_info.get("name") or ""
+        missed_cards.append({
+            "id": mp.get("id"),
+            "emp_name": mp.get("emp_name"),
+            "date": mp.get("date"),
+            "reason": reason_text,
+            "emp_d_id": mp.get("emp_d_id"),
+            "module_id": mp.get("am_id"),
+            "master_module_id": mp.get("module_id"),
+            "status_name": status_info.get("name") or "Requested",
+            "status_color": (status_info.get("other") or [{}])[0].get("color"),
+        })
+    return missed_cards
+
+
+def _pending_missed_punch_reply(rows, total, role_name, token):
+    print("📡 Pending Missed Punch:", len(rows), "of", total)
+
+    if rows:
+        missed_cards = _missed_cards(rows)
+
+        return JsonResponse(list_cursor.first_chunk({
+            "reply_type": "missed_cards",
+            "reply": "📋 Pending Missed Punch Approvals",
+            "missed": missed_cards,
+            "total": total,
+            "can_approve": (role_name or "") != "Employee",
+        }, "missed", token))
+
+    return JsonResponse({"reply": "✅ No pending missed punch approvals."})
+
+
+def handle_my_missed_punch(token, employee_id, business_id=None, msg=""):
     try:
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
-        params = {"page": 1, "limit": 10}
-        r = requests.get(MISSED_PUNCH_LIST_URL, headers=headers, params=params, timeout=15)
-        print("📡 My Missed Punch List Status:", r.status_code)
-        print("📡 My Missed Punch List Body:", r.text)
-
-        data = r.json()
-        result = data.get("result", {})
-        rows = result.get("missed_punch_list", [])
-        if rows:
-            my_missed_cards = []
-            for item in rows:
-                status_info = (item.get("status") or [{}])[0]
-                reason_info = (item.get("reason") or [{}])[0]
-                type_info = (item.get("type_id") or [{}])[0]
-                my_missed_cards.append({
-                    "id": item.get("id"),
-                    "date": item.get("date"),
-                    "in_time": item.get("in_time") or "",
-                    "out_time": item.get("out_time") or "",
-                    "reason": item.get("custom_reason") or reason_info.get("name") or "",
-                    "type": type_info.get("name") or "",
-                    "status": status_info.get("name") or "",
-                    "status_color": (status_info.get("other") or [{}])[0].get("color", "#000000"),
-                    "is_request_deletable": item.get("is_request_deletable", False),
-                    "approver_name": item.get("next_approver_details", {}).get("approver_name") or "",
-                    "next_message": item.get("next_approver_details", {}).get("message") or "",
-                })
+        cards, total = _my_requests(token, employee_id, business_id, "missed_punch", msg)
+        return _my_missed_punch_reply(cards, total, token)
+    except Exception as e:
+        return JsonResponse({"reply": f"Error fetching your missed punch list: {str(e)}"})
 
-            return JsonResponse({
-                "reply_type": "my_missed_cards",
-                "reply": "📋 Your Missed Punch Requests",
-                "missed": my_missed_cards
-            })
-        return JsonResponse({"reply": "✅ You have no missed punch entries."})
+
+async def handle_my_missed_punch_async(token, employee_id, business_id=None, msg=""):
+    try:
+        cards, total = await _my_requests_async(token, employee_id, business_id, "missed_punch", msg)
+        return _my_missed_punch_reply(cards, total, token)
     except Exception as e:
         return JsonResponse({"reply": f"Error fetching your missed punch list: {str(e)}"})
 
 
+def _my_missed_punch_reply(cards, total, token):
+    print("📡 My Missed Punch List:", len(cards), "of", total)
+
+    if cards:
+        return JsonResponse(list_cursor.first_chunk({
+            "reply_type": "my_missed_cards",
+            "reply": "📋 Your Missed Punch Requests",
+            "missed": cards,
+            "total": total,
+        }, "missed", token))
+    return JsonResponse({"reply": "✅ You have no missed punch entries."})
+
+
+def _missed_handler_params(step, approve, missed_id, emp_d_id, module_id, master_module_id, note):
+    return {
+        "data[request_id]": missed_id,
+        "data[approval_status]": step["pa_status_id"] if approve else "158",
+        "data[approval_action_type]": step["pa_type"],
+        "data[approval_type]": "1" if approve else "2",
+        "data[approval_sequence]": step["pa_sequence"],
+        "data[ae_id]": md5_hash(missed_id),
+        "data[module_id]": md5_hash(module_id),
+        "data[message]": note or "",
+        "data[master_module_id]": master_module_id,
+        "data[is_last_approval]": step["pa_is_last"],
+        "data[emp_d_id]": emp_d_id,
+        "data[trp_id]": missed_id,
+        "data[tc_id]": "",
+        "data[lvr_id]": "",
+        "data[gtp_id]": "",
+        "data[lnr_id]": "",
+        "data[atd_id]": "",
+        "data[deduction_amount]": "",
+        "data[deduction_info]": "",
+        "data[reimburse_amount]": "",
+        "data[advance_id]": "",
+        "POST_TYPE": "MISPUNCH_REQUEST_APPROVAL",
+    }
+
+
+def _missed_approval_reply(r2, missed_id, approve, step):
+    print("📡 Missed Punch Approval Handler Status:", r2.status_code)
+    print("📡 Missed Punch Approval Handler Body:", r2.text)
+    handler_data = r2.json()
+    if handler_data.get("status"):
+        _mirror_approval("missed_punch", missed_id, approve, step)
+        return f"✅ Missed Punch ID {missed_id} {'approved' if approve else 'rejected'} successfully!"
+    return f"⚠️ Missed punch approval failed: {handler_data.get('message', 'Unknown error')}"
+
+
 def handle_missed_approval(msg, token):
     try:
         action, missed_id, emp_d_id, module_id, master_module_id, note = msg.split("|")
         approve = action.lower().startswith("approve")
-        headers = {"Accept": "application/json", "authorization": f"Bearer {token}"}
-
-        check_params = {"approval_status": 140, "trp_id": missed_id, "module_id": module_id, "master_module_id": master_module_id}
-        r1 = requests.post(APPROVAL_CHECK_URL, headers=headers, params=check_params, timeout=15)
-        print("📡 Missed Punch Approval Check Status:", r1.status_code)
-        print("📡 Missed Punch Approval Check Body:", r1.text)
 
-        check_data = r1.json()
-        if not check_data.get("status") or not check_data.get("result"):
+        r1 = fixhr.post("approval_check", token=token, params=_approval_check_params(missed_id, module_id, master_module_id))
+        step = _approval_step(r1, "Missed Punch Approval")
+        if step is None:
             return "❌ No approver found for this missed punch."
 
-        step = check_data["result"][0]
-        approval_status = step["pa_status_id"] if approve else "158"
-        approval_type = "1" if approve else "2"
-        handler_params = {
-            "data[request_id]": missed_id,
-            "data[approval_status]": approval_status,
-            "data[approval_action_type]": step["pa_type"],
-            "data[approval_type]": approval_type,
-            "data[approval_sequence]": step["pa_sequence"],
-            "data[ae_id]": md5_hash(missed_id),
-            "data[module_id]": md5_hash(module_id),
-            "data[message]": note or "",
-            "data[master_module_id]": master_module_id,
-            "data[is_last_approval]": step["pa_is_last"],
-            "data[emp_d_id]": emp_d_id,
-            "data[trp_id]": missed_id,
-            "data[tc_id]": "",
-            "data[lvr_id]": "",
-            "data[gtp_id]": "",
-            "data[lnr_id]": "",
-            "data[atd_id]": "",
-            "data[deduction_amount]": "",
-            "data[deduction_info]": "",
-            "data[reimburse_amount]": "",
-            "data[advance_id]": "",
-            "POST_TYPE": "MISPUNCH_REQUEST_APPROVAL",
-        }
+        handler_params = _missed_handler_params(step, approve, missed_id, emp_d_id, module_id, master_module_id, note)
+        print("📦 Missed Punch Handler Params Sent:", json.dumps(handler_params, indent=2))
+        r2 = fixhr.post("approval_handler", token=token, params=handler_params)
+        return _missed_approval_reply(r2, missed_id, approve, step)
+    except Exception as e:
+        print("❌ Exception in missed punch approval:", traceback.format_exc())
+        return f"Error in missed punch approval: {str(e)}"
+
 
+async def handle_missed_approval_async(msg, token):
+    try:
+        action, missed_id, emp_d_id, module_id, master_module_id, note = msg.split("|")
+        approve = action.lower().startswith("approve")
+
+        r1 = await afixhr.post("approval_check", token=token, params=_approval_check_params(missed_id, module_id, master_module_id))
+        step = _approval_step(r1, "Missed Punch Approval")
+        if step is None:
+            return "❌ No approver found for this missed punch."
+
+        handler_params = _missed_handler_params(step, approve, missed_id, emp_d_id, module_id, master_module_id, note)
         print("📦 Missed Punch Handler Params Sent:", json.dumps(handler_params, indent=2))
-        r2 = requests.post(APPROVAL_HANDLER_URL, headers=headers, params=handler_params, timeout=15)
-        print("📡 Missed Punch Approval Handler Status:", r2.status_code)
-        print("📡 Missed Punch Approval Handler Body:", r2.text)
-
-        handler_data = r2.json()
-        if handler_data.get("status"):
-            return f"✅ Missed Punch ID {missed_id} {'approved' if approve else 'rejected'} successfully!"
-        return f"⚠️ Missed punch approval failed: {handler_data.get('message', 'Unknown error')}"
+        r2 = await afixhr.post("approval_handler", token=token, params=handler_params)
+        return _missed_approval_reply(r2, missed_id, approve, step)
     except Exception as e:
         print("❌ Exception in missed punch approval:", traceback.format_exc())
         return f"Error in missed punch approval: {str(e)}"
 
 
+# ---------------- BULK APPROVALS ----------------
+# check → handle pipelines in flight at once for a bulk approve/reject
+BULK_APPROVAL_WORKERS = int(os.environ.get("FIXHR_BULK_APPROVAL_WORKERS", "8"))
+BULK_APPROVAL_MAX_ITEMS = 200
+BULK_APPROVAL_EXECUTOR = ThreadPoolExecutor(max_workers=BULK_APPROVAL_WORKERS, thread_name_prefix="bulk-approval")
+
+# "approve leave|<id>|<emp_d_id>|<module_id>|<master_module_id>|<note>" from the card buttons
+APPROVAL_COMMAND_RE = re.compile(r"^\s*(approve|reject)\s+(leave|gatepass|missed)\s*\|", re.I)
+# "approve all pending gatepasses for today"
+BULK_APPROVAL_RE = re.compile(
+    r"^\s*(approve|reject)\s+all\s+(?:the\s+)?(?:pending\s+)?(leave|gate\s*pass|missed(?:\s*punch)?)", re.I
+)
+
+# kind -> (list endpoint, card builder)
+BULK_APPROVAL_KINDS = {
+    "leave": ("leave_list", _leave_cards),
+    "gatepass": ("gatepass_approval_list", _gatepass_cards),
+    "missed": ("missed_punch_approval_list", _missed_cards),
+}
+
+
+def _bulk_item(kind, card):
+    return {
+        "kind": kind,
+        "id": card.get("leave_id") or card.get("id"),
+        "emp_name": card.get("emp_name"),
+        "emp_d_id": card.get("emp_d_id"),
+        "module_id": card.get("module_id"),
+        "master_module_id": card.get("master_module_id"),
+    }
+
+
+def _bulk_handler_args(step, approve, item, note):
+    kind = item["kind"]
+    if kind == "leave":
+        return {"data": _leave_handler_params(step, approve, item["id"], item["emp_d_id"], item["master_module_id"], note)}
+    if kind == "gatepass":
+        return {"data": _gatepass_handler_params(step, approve, item["id"], item["emp_d_id"], item["master_module_id"], note)}
+    return {"params": _missed_handler_params(
+        step, approve, item["id"], item["emp_d_id"], item["module_id"], item["master_module_id"], note
+    )}
+
+
+def _bulk_result(item, ok, message):
+    return {"kind": item["kind"], "id": item["id"], "emp_name": item.get("emp_name"), "ok": ok, "message": message}
+
+
+def _bulk_handler_result(item, r2, approve, step):
+    body = r2.json() if r2.content else {}
+    ok = r2.status_code < 400 and body.get("status", True) not in (False, 0)
+    if ok:
+        _mirror_approval("missed_punch" if item["kind"] == "missed" else item["kind"], item["id"], approve, step)
+    return _bulk_result(item, ok, body.get("message") or ("Done" if ok else f"HTTP {r2.status_code}"))
+
+
+def _approve_one(item, approve, token, note):
+    try:
+        r1 = fixhr.post("approval_check", token=token,
+                        params=_approval_check_params(item["id"], item["module_id"], item["master_module_id"]))
+        step = _approval_step(r1, f"Bulk {item['kind']}")
+        if step is None:
+            return _bulk_result(item, False, "No approver found")
+        r2 = fixhr.post("approval_handler", token=token, **_bulk_handler_args(step, approve, item, note))
+        return _bulk_handler_result(item, r2, approve, step)
+    except Exception as e:
+        logger.warning("Bulk approval of %s %s failed: %s", item["kind"], item["id"], e)
+        return _bulk_result(item, False, str(e))
+
+
+async def _approve_one_async(item, approve, token, note):
+    try:
+        r1 = await afixhr.post("approval_check", token=token,
+                               params=_approval_check_params(item["id"], item["module_id"], item["master_module_id"]))
+        step = _approval_step(r1, f"Bulk {item['kind']}")
+        if step is None:
+            return _bulk_result(item, False, "No approver found")
+        r2 = await afixhr.post("approval_handler", token=token, **_bulk_handler_args(step, approve, item, note))
+        return _bulk_handler_result(item, r2, approve, step)
+    except Exception as e:
+        logger.warning("Bulk approval of %s %s failed: %s", item["kind"], item["id"], e)
+        return _bulk_result(item, False, str(e))
+
+
+def _after_bulk(results, business_id):
+    if any(r["ok"] and r["kind"] == "leave" for r in results):
+        leave_balance_cache.on_leave_approved(business_id)
+
+
+def bulk_approve(items, approve, token, business_id=None, note="ok"):
+    """
+    Approve/reject many requests, BULK_APPROVAL_WORKERS check → handle
+    pipelines at a time. One result per item, in order; a failed item
+    never stops the rest.
+    """
+    results = list(BULK_APPROVAL_EXECUTOR.map(inherit_budget(lambda item: _approve_one(item, approve, token, note)), items))
+    _after_bulk(results, business_id)
+    return results
+
+
+async def bulk_approve_async(items, approve, token, business_id=None, note="ok"):
+    limit = asyncio.Semaphore(BULK_APPROVAL_WORKERS)
+
+    async def run(item):
+        async with limit:
+            return await _approve_one_async(item, approve, token, note)
+
+    results = list(await asyncio.gather(*(run(item) for item in items)))
+    _after_bulk(results, business_id)
+    return results
+
+
+def _bulk_approval_reply(results, approve, unread=0):
+    done = sum(1 for r in results if r["ok"])
+    failed = len(results) - done
+    reply = f"✅ {done} of {len(results)} {'approved' if approve else 'rejected'}."
+    if failed:
+        reply += f" ⚠️ {failed} failed."
+    if unread:
+        reply += f" ⚠️ {unread} more pending requests were not read, run the command again for them."
+    return JsonResponse({
+        "reply_type": "bulk_approval",
+        "reply": reply,
+        "succeeded": done,
+        "failed": failed,
+        "results": results,
+    })
+
+
+def _bulk_command(msg):
+    """(approve, kind, only_today) for "approve all pending ... [today]", else None."""
+    match = BULK_APPROVAL_RE.match(msg or "")
+    if not match:
+        return None
+    target = match.group(2).lower()
+    kind = "leave" if target == "leave" else "missed" if target.startswith("missed") else "gatepass"
+    t = msg.lower()
+    return match.group(1).lower() == "approve", kind, "today" in t or " aaj" in t
+
+
+def _bulk_pending_items(kind, cards, only_today):
+    today = datetime.now().date()
+    items = []
+    for card in cards:
+        if "request" not in (card.get("status_name") or "requested").lower():
+            continue
+        if only_today:
+            if kind == "leave":
+                first, last = parse_day(card.get("start_date")), parse_day(card.get("end_date"))
+                if not first or not (first <= today <= (last or first)):
+                    continue
+            elif parse_day(card.get("date")) != today:
+                continue
+        items.append(_bulk_item(kind, card))
+    return items[:BULK_APPROVAL_MAX_ITEMS]
+
+
+def handle_bulk_approval_command(msg, token, business_id=None):
+    approve, kind, only_today = _bulk_command(msg)
+    endpoint, to_cards = BULK_APPROVAL_KINDS[kind]
+    try:
+        rows, total = fixhr.get_all_pages(endpoint, token=token)
+    except Exception as e:
+        return JsonResponse({"reply": f"Error fetching pending {kind} requests: {str(e)}"})
+    items = _bulk_pending_items(kind, to_cards(rows), only_today)
+    if not items:
+        return JsonResponse({"reply": f"✅ No pending {kind} requests{' for today' if only_today else ''}."})
+    return _bulk_approval_reply(bulk_approve(items, approve, token, business_id), approve, total - len(rows))
+
+
+async def handle_bulk_approval_command_async(msg, token, business_id=None):
+    approve, kind, only_today = _bulk_command(msg)
+    endpoint, to_cards = BULK_APPROVAL_KINDS[kind]
+    try:
+        rows, total = await afixhr.get_all_pages(endpoint, token=token)
+    except Exception as e:
+        return JsonResponse({"reply": f"Error fetching pending {kind} requests: {str(e)}"})
+    items = _bulk_pending_items(kind, to_cards(rows), only_today)
+    if not items:
+        return JsonResponse({"reply": f"✅ No pending {kind} requests{' for today' if only_today else ''}."})
+    return _bulk_approval_reply(await bulk_approve_async(items, approve, token, business_id), approve, total - len(rows))
+
+
+def _approval_command(msg, token, business_id=None):
+    """Card button commands and "approve all ..." messages; None for anything else."""
+    if _bulk_command(msg):
+        return handle_bulk_approval_command(msg, token, business_id)
+    match = APPROVAL_COMMAND_RE.match(msg)
+    if not match:
+        return None
+    kind = match.group(2).lower()
+    if kind == "leave":
+        return _with_meta(handle_leave_approval(msg, token, business_id), {})
+    if kind == "gatepass":
+        return _with_meta(handle_gatepass_approval(msg, token), {})
+    return _with_meta(handle_missed_approval(msg, token), {})
+
+
+async def _approval_command_async(msg, token, business_id=None):
+    if _bulk_command(msg):
+        return await handle_bulk_approval_command_async(msg, token, business_id)
+    match = APPROVAL_COMMAND_RE.match(msg)
+    if not match:
+        return None
+    kind = match.group(2).lower()
+    if kind == "leave":
+        return _with_meta(await handle_leave_approval_async(msg, token, business_id), {})
+    if kind == "gatepass":
+        return _with_meta(await handle_gatepass_approval_async(msg, token), {})
+    return _with_meta(await handle_missed_approval_async(msg, token), {})
+
+
 # ---------------- LOGIN ----------------
 @require_POST
 @csrf_protect
@@ -1435,7 +2009,7 @@ def login_api(request):
             return HttpResponseBadRequest("Email/Password required")
 
         payload = {"email": email, "password": password, "notification_key": "web"}
-        r = requests.post(FIXHR_LOGIN_URL, data=payload, timeout=15)
+        r = fixhr.post("login", data=payload)
         print("📡 Login API Status:", r.status_code)
         print("📡 Login API Body:", r.text)
 
@@ -1462,6 +2036,15 @@ def login_api(request):
             request.session.set_expiry(60 * 60 * 24 * 14 if remember else 0)
             print("🟢 LOGIN USER OBJECT:", json.dumps(user, indent=2))
 
+            role_name = request.session["role_name"]
+            login_prefetch.prefetch_after_login(
+                token,
+                request.session["employee_id"],
+                request.session["business_id"],
+                approver=role_name != "Employee",
+                attendance_view=None if user_can_view_all(role_name) else attendance_view(request),
+            )
+
             return JsonResponse({"status": "success", "next": reverse("chat")})
         else:
             msg = data.get("message") or "Login failed"
@@ -1554,12 +2137,205 @@ def model_status_api(request):
         "model_available": True,
         "model_loaded": True,
         "model_path_exists": os.path.exists(model_dir),
-        "data_file_exists": os.path.exists(dataset_path)
+        "data_file_exists": os.path.exists(dataset_path),
+        "cpu_threading": get_cpu_config(),
     }
     
     return JsonResponse(status)
 
 
+@csrf_exempt
+def inference_stats_api(request):
+    """API endpoint with rolling token/latency histograms per model and intent"""
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    if request.method == "POST" and request.GET.get("reset") == "1":
+        inference_telemetry.reset()
+
+    return JsonResponse(inference_telemetry.snapshot())
+
+
+@csrf_exempt
+def fixhr_stats_api(request):
+    """API endpoint with FixHR response-cache hit rates, breaker states and latencies per endpoint"""
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    if request.method == "POST" and request.GET.get("reset") == "1":
+        response_cache.reset_stats()
+
+    return JsonResponse({
+        "cache": response_cache.stats(),
+        "endpoints": resilience.stats(),
+        "login_prefetch": login_prefetch.stats(),
+        "speculation": speculative_prefetch.stats(),
+    })
+
+
+@csrf_protect
+def bulk_approval_api(request):
+    """
+    Approve/reject several pending requests at once.
+    Body: {"action": "approve"|"reject", "note": "...",
+           "items": [{"kind": "leave"|"gatepass"|"missed", "id", "emp_d_id", "module_id", "master_module_id"}]}
+    """
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=405)
+
+    try:
+        body = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    if not isinstance(body, dict):
+        return JsonResponse({"error": "Body must be a JSON object"}, status=400)
+    raw_items = body.get("items") or []
+    if not isinstance(raw_items, list) or not all(isinstance(item, dict) for item in raw_items):
+        return JsonResponse({"error": "items must be a list of objects"}, status=400)
+
+    action = str(body.get("action") or "").lower()
+    items = [_bulk_item(item.get("kind"), item) for item in raw_items
+             if isinstance(item.get("kind"), str) and item["kind"] in BULK_APPROVAL_KINDS]
+    if action not in ("approve", "reject") or not items:
+        return JsonResponse({"error": "action (approve/reject) and items are required"}, status=400)
+    if len(items) > BULK_APPROVAL_MAX_ITEMS:
+        return JsonResponse({"error": f"At most {BULK_APPROVAL_MAX_ITEMS} items per request"}, status=400)
+
+    results = bulk_approve(
+        items, action == "approve", request.session.get("fixhr_token"),
+        request.session.get("business_id"), body.get("note") or "ok",
+    )
+    return _bulk_approval_reply(results, action == "approve")
+
+
+def list_page_api(request):
+    """Next chunk of a long card list (pending leaves / gatepasses / missed punches) by cursor"""
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    chunk = list_cursor.next_chunk(request.GET.get("cursor"), request.session.get("fixhr_token"))
+    if chunk is None:
+        return JsonResponse({"reply": "⚠️ This list has expired, please ask again."}, status=410)
+    return JsonResponse(chunk)
+
+
+def attendance_page_api(request):
+    """Next page of an attendance register by cursor, fetched as the register is scrolled"""
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    page = attendance_cursor.next_page(request.GET.get("cursor"), request.session.get("fixhr_token"), _page_rows(request))
+    if page is None:
+        return JsonResponse({"reply": "⚠️ This register has expired, please ask again."}, status=410)
+    return _attendance_page(page, request)
+
+
+def attendance_details_api(request):
+    """One employee's attendance rows for a compact register, fetched when the user opens them"""
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    emp_id = (request.GET.get("emp_id") or "").strip()
+    try:
+        first = datetime.fromisoformat(request.GET.get("start", "")).date()
+        last = datetime.fromisoformat(request.GET.get("end", "")).date()
+    except ValueError:
+        return JsonResponse({"error": "start and end must be YYYY-MM-DD dates"}, status=400)
+    if not emp_id or first > last:
+        return JsonResponse({"error": "emp_id and a valid start/end range are required"}, status=400)
+    if (last - first).days >= EXPORT_MAX_DAYS:
+        return JsonResponse({"error": f"The period may cover at most {EXPORT_MAX_DAYS} days"}, status=400)
+    if not user_can_view_all(request.session.get("role_name")) and emp_id != str(request.session.get("employee_id")):
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    try:
+        # months of the register that was just shown, so normally served from the store
+        grids = attendance_store.grids(request.session.get("fixhr_token"), request.session.get("business_id"),
+                                       attendance_view(request), first, last)
+    except Exception as e:
+        logger.error("Attendance details error: %s", e)
+        return JsonResponse({"error": "Could not fetch attendance"}, status=502)
+    rows = attendance_store.rows_of(grids, first, last, ids={emp_id})
+    return FastJsonResponse(request, {
+        "emp_id": emp_id,
+        "emp_name": rows[0]["employee_name"] if rows else "",
+        "rows": [_detail_row(r) for r in rows],
+    })
+
+
+def attendance_export_api(request):
+    """
+    Whole attendance register as a streamed CSV or XLSX download.
+    ?format=csv|xlsx, the period as start/end dates or free text (?period=last quarter),
+    and optionally emp_id or name. Users who cannot see everyone get their own rows.
+    """
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    fmt = request.GET.get("format", "csv")
+    if fmt not in attendance_export.WRITERS:
+        return JsonResponse({"error": "format must be csv or xlsx"}, status=400)
+    if request.GET.get("start") or request.GET.get("end"):
+        try:
+            first = datetime.fromisoformat(request.GET.get("start", "")).date()
+            last = datetime.fromisoformat(request.GET.get("end", "")).date()
+        except ValueError:
+            return JsonResponse({"error": "start and end must be YYYY-MM-DD dates"}, status=400)
+    else:
+        first, last = _period_dates(determine_attendance_period(request.GET.get("period", "")))
+    if first > last or (last - first).days >= EXPORT_MAX_DAYS:
+        return JsonResponse({"error": f"The period must run forwards and cover at most {EXPORT_MAX_DAYS} days"},
+                            status=400)
+
+    employee_id = request.session.get("employee_id")
+    if not user_can_view_all(request.session.get("role_name")):
+        filter_info = {"type": "self", "emp_id": str(employee_id), "label": request.session.get("name") or ""}
+    elif request.GET.get("emp_id"):
+        filter_info = {"type": "emp_id", "value": request.GET["emp_id"].strip(), "label": f"Emp #{request.GET['emp_id']}"}
+    elif request.GET.get("name"):
+        filter_info = {"type": "name", "value": request.GET["name"].strip().lower(), "label": request.GET["name"]}
+    else:
+        filter_info = {"type": "all", "label": "All Employees"}
+
+    token = request.session.get("fixhr_token")
+    business_id = request.session.get("business_id")
+    view = attendance_view(request)
+    try:
+        # The first month is loaded before the response starts, so FixHR errors are a 502 rather than a cut-off file;
+        # it also fills the employee directory the name filter is resolved against
+        attendance_store.month(token, business_id, view, first.year, first.month)
+    except Exception as e:
+        logger.error("Attendance export error: %s", e)
+        return JsonResponse({"error": "Could not fetch attendance"}, status=502)
+    filter_info = resolve_employee_filter(filter_info, business_id)
+    if filter_info.get("resolution") == "none":
+        return JsonResponse({"error": f"No employee named '{filter_info['label']}' found"}, status=404)
+
+    if "emp_ids" in filter_info:
+        rows = attendance_store.iter_rows(token, business_id, view, first, last, ids=filter_info["emp_ids"])
+    else:
+        rows = attendance_store.iter_rows(token, business_id, view, first, last, attendance_filter(filter_info))
+    response = StreamingHttpResponse(attendance_export.WRITERS[fmt](rows),
+                                     content_type=attendance_export.CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="attendance_{first.isoformat()}_{last.isoformat()}.{fmt}"'
+    return response
+
+
+def apply_job_status_api(request, job_id):
+    """Status of a queued apply (core.apply_queue), polled by the chat page"""
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    job = apply_queue.status(job_id, request.session.get("employee_id"))
+    if job is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+    return JsonResponse(job)
+
+
 @csrf_exempt
 def load_model_api(request):
     """API endpoint to load the model"""
@@ -1791,121 +2567,48 @@ def handle_general_chat(msg, lang="en"):
     return "Sure, I'm here. How can I help you?"
   
 
-def call_fixhr_gatepass_api(payload, token):
-    try:
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/x-www-form-urlencoded",
-            "authorization": f"Bearer {token}",
-        }
-
-        res = requests.post(
-            GATEPASS_URL,
-            headers=headers,
-            data=payload,  # Use 'data' instead of 'json' for form-encoded
-            timeout=15
-        )
-
-        print("🔍 RAW GATEPASS API RESPONSE STATUS:", res.status_code)
-        print("🔍 RAW GATEPASS API RESPONSE HEADERS:", dict(res.headers))
-        print("🔍 RAW GATEPASS API RESPONSE TEXT:", res.text[:500])  # First 500 chars
-
-        # If response is not JSON → handle safely
-        try:
-            data = res.json()
-            print("🔍 PARSED GATEPASS API RESPONSE:", data)
-            return data
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON DECODE ERROR: {e}")
-            # Try to extract error message from HTML/text response
-            error_msg = "Invalid FixHR response"
-            if res.text:
-                # Look for common error patterns
-                if "error" in res.text.lower():
-                    error_msg = "API returned an error"
-                elif "unauthorized" in res.text.lower() or "401" in res.text:
-                    error_msg = "Unauthorized - check token"
-                elif "forbidden" in res.text.lower() or "403" in res.text:
-                    error_msg = "Forbidden - insufficient permissions"
-            
-            return {
-                "status": False,
-                "success": False,
-                "message": error_msg,
-                "raw": res.text[:200],  # First 200 chars of raw response
-                "status_code": res.status_code
-            }
-
-    except requests.exceptions.RequestException as e:
-        print(f"❌ REQUEST EXCEPTION: {e}")
-        return {
-            "status": False,
-            "success": False,
-            "message": f"Network error: {str(e)}"
-        }
-    except Exception as e:
-        print(f"❌ UNEXPECTED EXCEPTION: {e}")
-        import traceback
-        traceback.print_exc()
-        return {
-            "status": False,
-            "success": False,
-            "message": str(e)
-        }
-
-
+# ---------------- CHAT API ----------------
+def _with_meta(response, meta):
+    if isinstance(response, JsonResponse):
+        return response
+    payload = {"reply": response}
+    payload.update(meta)
+    return JsonResponse(payload)
 
 
-# ---------------- CHAT API ----------------
-@csrf_exempt
-def chat_api(request):
-    if not check_authentication(request):
-        return JsonResponse({"error": "Unauthorized"}, status=401)
-    
-    if request.method != "POST":
-        return JsonResponse({"error": "Invalid method"}, status=405)
-    
+def _parse_chat_body(request):
+    """Return (message, None) or (None, error JsonResponse)."""
     try:
         body = json.loads(request.body.decode())
     except json.JSONDecodeError:
-        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+        return None, JsonResponse({"error": "Invalid JSON body"}, status=400)
 
     msg = (body.get("message") or "").strip()
     if not msg:
-        return JsonResponse({"error": "Message text is required"}, status=400)
+        return None, JsonResponse({"error": "Message text is required"}, status=400)
+    return msg, None
 
-    token = request.session.get("fixhr_token")
-    user_id = request.session.get("employee_id") or "default_user"
-    
-    SESSION_MEMORY.setdefault(user_id, {"date": None, "leave_type": None, "reason": None})
-    chat_memory = SESSION_MEMORY[user_id]
-    
-    print("💬 User Message:", msg)
-    
-    classification = classify_message(msg)
-    print(f"classification =============== : {classification}")
-    intent = classification.get("intent") or "general"
+
+def _general_reply(reply, intent, confidence):
+    return JsonResponse({
+        "reply": reply,
+        "intent": intent,
+        "confidence": confidence,
+        "datetime_info": None,
+    })
+
+
+def _chat_decision(msg, classification, chat_memory):
+    """Slots, task and response meta for a non-general message."""
     lang = classification.get("language", "en")
-    confidence = classification.get("confidence", 0.0)
-    
-    print("🤖 Phi-3 Intent →", classification)
-    
-    if intent == "general":
-        reply = model_response(msg) or handle_general_chat(msg, lang)
-        return JsonResponse({
-            "reply": reply,
-            "intent": intent,
-            "confidence": confidence,
-            "datetime_info": None,
-        })
-    
-    datetime_info = extract_datetime_info(msg)
+    with stage_timing.stage("datetime"):
+        datetime_info = extract_datetime_info(msg)
     decision = build_decision_context(msg, classification, datetime_info)
     task = decision.get("task") or "general"
     lang = decision.get("language", lang)
-    
+
     print("📅 DateTime Extract →", datetime_info)
-    
+
     # Continuation mode: reuse previous slots if user says "also", "again", etc.
     if any(w in msg.lower() for w in ["bhi", "also", "same", "phir", "again", "next day", "uske baad"]):
         if chat_memory.get("date"):
@@ -1914,93 +2617,238 @@ def chat_api(request):
             decision["leave_type"] = chat_memory["leave_type"]
         if chat_memory.get("reason"):
             decision["reason"] = chat_memory["reason"]
-    
+
     meta = {
         "intent": task,
-        "confidence": confidence,
+        "confidence": classification.get("confidence", 0.0),
         "datetime_info": datetime_info,
     }
-    
-    # ------------------------------------------------------------
-    # 6) ACTIONS
-    # ------------------------------------------------------------
+    return decision, task, lang, meta, datetime_info
+
+
+def _queued_apply_reply(result, meta):
+    """
+    Reply for an apply handed to core.apply_queue (queued, or a duplicate of
+    an earlier one), carrying ``apply_job`` for the page to poll. None when
+    it was submitted inline.
+    """
+    data = result.get("api_raw") or {}
+    job = result.get("job")
+    if not job or not (data.get("queued") or data.get("duplicate")):
+        return None
+    reply = data.get("message", "")
+    if data.get("duplicate"):
+        reply = "ℹ️ You already sent this request. " + reply
+    return JsonResponse({"reply": reply, "apply_job": job, **meta})
+
+
+def _run_apply_task(task, decision, msg, lang, meta, datetime_info, token, user_id, session):
+    """
+    The three apply actions. Returns a JsonResponse, or None when `task`
+    is not an apply. Blocking (sync FixHR client); the async view runs
+    it in an executor.
+    """
     if task == "apply_leave":
         print("entering apply leave")
-        result = apply_leave_nlp(decision, token, user_id=user_id, user_message=msg)
+        result = apply_leave_nlp(
+            decision, token, user_id=user_id, user_message=msg, business_id=session.get("business_id")
+        )
         print("✅ RESULT:", result)
-        
-        if result["ok"]:
+
+        queued = _queued_apply_reply(result, meta)
+        if queued:
+            reply = queued
+        elif result["ok"]:
             reply = "✅ Leave apply ho gayi." if lang == "hi" else "✅ Leave applied."
         else:
             reply = "⚠️ Leave apply nahi hui. " + result["api_raw"].get("message", "")
-        
+
         SESSION_MEMORY[user_id] = {
             "date": decision.get("date"),
             "leave_type": decision.get("leave_type"),
             "reason": decision.get("reason")
         }
-        payload = {"reply": reply}
-        payload.update(meta)
-        return JsonResponse(payload)
-    
+        return _with_meta(reply, meta)
+
     if task == "apply_gatepass":
         print("entering apply gatepass")
         decision["user_msg"] = msg
-        result = apply_gatepass_nlp(decision, token, user_id)
+        result = apply_gatepass_nlp(decision, token, user_id, session.get("business_id"))
         print("✅ GATEPASS RESULT:", result)
-        
+
+        queued = _queued_apply_reply(result, meta)
+        if queued:
+            return queued
         if result.get("ok"):
             reply = f"✅ Gatepass apply ho gaya. {result.get('out', '')} → {result.get('in', '')}." if lang == "hi" else f"✅ Gatepass submitted. {result.get('out', '')} → {result.get('in', '')}."
         elif result.get("need_more_info"):
             reply = result.get("message", "Please provide more information.")
         else:
             reply = "⚠️ Gatepass apply nahi hua. " + result.get("message", "") if lang == "hi" else "⚠️ Gatepass failed. " + result.get("message", "")
-        
-        payload = {"reply": reply}
-        payload.update(meta)
-        return JsonResponse(payload)
-    
+        return _with_meta(reply, meta)
+
     if task == "apply_missed_punch":
         print("entering apply missed punch")
         missed_punch_date = decision.get("date") or datetime_info.get("start_date") or datetime_info.get("original")
-        
+
         info = {
             "user_message": msg,
             "date": missed_punch_date,
             "in_time": decision.get("in_time"),
             "out_time": decision.get("out_time"),
             "reason": decision.get("reason"),
-            "business_id": request.session.get("business_id"),
-            "branch_id": request.session.get("branch_id"),
+            "business_id": session.get("business_id"),
+            "branch_id": session.get("branch_id"),
         }
 
         print(f"📅 MISSED PUNCH INFO: {info}")
         result = apply_missed_punch_nlp(info, token, user_id=user_id)
 
         print("🟢 MISSED PUNCH RESULT:", result)
-        
+
+        queued = _queued_apply_reply(result, meta)
+        if queued:
+            return queued
         if result["ok"]:
             reply = f"✅ Missed punch apply ho gaya. {result.get('date', '')} ({result.get('type', '')})." if lang == "hi" else f"✅ Missed punch submitted. {result.get('date', '')} ({result.get('type', '')})."
         else:
             reply = "⚠️ Missed punch apply nahi hua. " + result.get("message", "") if lang == "hi" else "⚠️ Missed punch failed. " + result.get("message", "")
-        
-        payload = {"reply": reply}
-        payload.update(meta)
-        return JsonResponse(payload)
+        return _with_meta(reply, meta)
+
+    return None
+
+
+def _speculative_reads(msg, token, request):
+    """task -> the blocking read its handler will make (see core.speculative_prefetch)."""
+    employee_id = request.session.get("employee_id")
+    business_id = request.session.get("business_id")
+
+    def attendance():
+        period = determine_attendance_period(msg)
+        attendance_store.grids(token, business_id, attendance_view(request), *_period_dates(period))
+
+    return {
+        "leave_balance": lambda: leave_balance_cache.get_balance(token, employee_id, business_id),
+        "pending_leave": lambda: fixhr.get_all_pages("leave_list", token=token),
+        "pending_gatepass": lambda: fixhr.get_all_pages("gatepass_approval_list", token=token),
+        "pending_missed_punch": lambda: fixhr.get_all_pages("missed_punch_approval_list", token=token),
+        "my_missed_punch": lambda: request_store.ensure_synced(token, employee_id, business_id, "missed_punch"),
+        "attendance_report": attendance,
+    }
+
+
+def _speculative_reads_async(msg, token, request):
+    employee_id = request.session.get("employee_id")
+    business_id = request.session.get("business_id")
+
+    async def attendance():
+        period = determine_attendance_period(msg)
+        await attendance_store.agrids(token, business_id, attendance_view(request), *_period_dates(period))
+
+    return {
+        "leave_balance": lambda: leave_balance_cache.get_balance_async(token, employee_id, business_id),
+        "pending_leave": lambda: afixhr.get_all_pages("leave_list", token=token),
+        "pending_gatepass": lambda: afixhr.get_all_pages("gatepass_approval_list", token=token),
+        "pending_missed_punch": lambda: afixhr.get_all_pages("missed_punch_approval_list", token=token),
+        "my_missed_punch": lambda: sync_to_async(request_store.ensure_synced, thread_sensitive=False)(
+            token, employee_id, business_id, "missed_punch"
+        ),
+        "attendance_report": attendance,
+    }
+
+
+def _with_latency_budget(view):
+    """Run a chat view under one CHAT_LATENCY_BUDGET for all of its FixHR calls."""
+    def unavailable(e):
+        logger.warning("FixHR %s failed fast: %s", e.endpoint, e.reason)
+        return JsonResponse({"reply": f"⚠️ {e}"}, status=503)
+
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def run_async(request, *args, **kwargs):
+            with latency_budget(CHAT_LATENCY_BUDGET):
+                try:
+                    return await view(request, *args, **kwargs)
+                except FixHRUnavailable as e:
+                    return unavailable(e)
+        return run_async
+
+    @functools.wraps(view)
+    def run(request, *args, **kwargs):
+        with latency_budget(CHAT_LATENCY_BUDGET):
+            try:
+                return view(request, *args, **kwargs)
+            except FixHRUnavailable as e:
+                return unavailable(e)
+    return run
+
+
+@csrf_exempt
+@_with_latency_budget
+def chat_api(request):
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+    
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=405)
+    
+    msg, error = _parse_chat_body(request)
+    if error:
+        return error
+
+    token = request.session.get("fixhr_token")
+    user_id = request.session.get("employee_id") or "default_user"
+    
+    SESSION_MEMORY.setdefault(user_id, {"date": None, "leave_type": None, "reason": None})
+    chat_memory = SESSION_MEMORY[user_id]
+    
+    print("💬 User Message:", msg)
+    
+    approval = _approval_command(msg, token, request.session.get("business_id"))
+    if approval is not None:
+        return approval
+    
+    # Start the likely FixHR read now, overlapping the Phi-3 call
+    speculation = speculative_prefetch.start(msg, _speculative_reads(msg, token, request))
+    with stage_timing.stage("intent"):
+        classification = classify_message(msg)
+    print(f"classification =============== : {classification}")
+    intent = classification.get("intent") or "general"
+    lang = classification.get("language", "en")
+    confidence = classification.get("confidence", 0.0)
+    
+    print("🤖 Phi-3 Intent →", classification)
+    
+    if intent in HOLIDAY_TASKS or (intent == "general" and is_holiday_intent(msg)):
+        speculation.settle("holiday")
+        return handle_holiday_query(msg, token, request.session.get("business_id"), lang)
+    
+    if intent == "general":
+        speculation.settle("general")
+        with stage_timing.stage("chat_model"):
+            reply = model_response(msg)
+        return _general_reply(reply or handle_general_chat(msg, lang), intent, confidence)
+    
+    decision, task, lang, meta, datetime_info = _chat_decision(msg, classification, chat_memory)
+    speculation.settle(task)
+    
+    # ------------------------------------------------------------
+    # 6) ACTIONS
+    # ------------------------------------------------------------
+    applied = _run_apply_task(task, decision, msg, lang, meta, datetime_info, token, user_id, request.session)
+    if applied is not None:
+        return applied
     
     if task == "leave_balance":
-        response = handle_leave_balance(token)
-        if isinstance(response, JsonResponse):
-            return response
-        payload = {"reply": response}
-        payload.update(meta)
-        return JsonResponse(payload)
+        return _with_meta(
+            handle_leave_balance(token, request.session.get("employee_id"), request.session.get("business_id")), meta
+        )
     
     if task == "attendance_report":
         return handle_attendance_report(decision, token, request, msg)
     
     if task == "pending_leave":
-        return handle_pending_leaves(token, request.session.get("role_name"))
+        return _with_meta(handle_pending_leaves(token, request.session.get("role_name"), request.session.get("business_id")), meta)
     
     if task == "pending_gatepass":
         return handle_pending_gatepass(token, request.session.get("role_name"))
@@ -2009,12 +2857,114 @@ def chat_api(request):
         return handle_pending_missed_punch(token, request.session.get("role_name"))
     
     if task == "my_missed_punch":
-        return handle_my_missed_punch(token)
+        return handle_my_missed_punch(token, user_id, request.session.get("business_id"), msg)
+
+    if task == "my_leaves":
+        return handle_my_leaves(token, user_id, request.session.get("business_id"), msg)
+
+    if task == "my_gatepass":
+        return handle_my_gatepasses(token, user_id, request.session.get("business_id"), msg)
     
-    fallback_reply = model_response(msg) or handle_general_chat(msg, lang)
-    payload = {"reply": fallback_reply}
-    payload.update(meta)
-    return JsonResponse(payload)
+    with stage_timing.stage("chat_model"):
+        fallback_reply = model_response(msg, intent=task)
+    return _with_meta(fallback_reply or handle_general_chat(msg, lang), meta)
+
+
+@csrf_exempt
+@_with_latency_budget
+async def chat_api_async(request):
+    """
+    chat_api for the ASGI stack. FixHR reads and approvals await the async
+    client, so a waiting request holds no thread; Phi-3 inference runs on
+    INFERENCE_EXECUTOR and the (rare) apply calls on the loop's default
+    executor.
+    """
+    # Loads the session once; later request.session.get() reads the cache
+    token = await request.session.aget("fixhr_token")
+    if not token:
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid method"}, status=405)
+
+    msg, error = _parse_chat_body(request)
+    if error:
+        return error
+
+    user_id = request.session.get("employee_id") or "default_user"
+    role_name = request.session.get("role_name")
+
+    SESSION_MEMORY.setdefault(user_id, {"date": None, "leave_type": None, "reason": None})
+    chat_memory = SESSION_MEMORY[user_id]
+
+    print("💬 User Message:", msg)
+
+    approval = await _approval_command_async(msg, token, request.session.get("business_id"))
+    if approval is not None:
+        return approval
+
+    loop = asyncio.get_running_loop()
+    speculation = speculative_prefetch.start_async(msg, _speculative_reads_async(msg, token, request))
+    with stage_timing.stage("intent"):
+        classification = await loop.run_in_executor(INFERENCE_EXECUTOR, inference_telemetry.queued(classify_message), msg)
+    intent = classification.get("intent") or "general"
+    lang = classification.get("language", "en")
+    confidence = classification.get("confidence", 0.0)
+
+    print("🤖 Phi-3 Intent →", classification)
+
+    if intent in HOLIDAY_TASKS or (intent == "general" and is_holiday_intent(msg)):
+        await speculation.asettle("holiday")
+        # A calendar hit is a dict lookup; the daily refetch uses the sync client
+        return await loop.run_in_executor(
+            None, inherit_budget(handle_holiday_query), msg, token, request.session.get("business_id"), lang
+        )
+
+    if intent == "general":
+        await speculation.asettle("general")
+        with stage_timing.stage("chat_model"):
+            reply = await loop.run_in_executor(INFERENCE_EXECUTOR, inference_telemetry.queued(model_response), msg)
+        return _general_reply(reply or handle_general_chat(msg, lang), intent, confidence)
+
+    decision, task, lang, meta, datetime_info = _chat_decision(msg, classification, chat_memory)
+    await speculation.asettle(task)
+
+    applied = await loop.run_in_executor(
+        None, inherit_budget(_run_apply_task), task, decision, msg, lang, meta, datetime_info, token, user_id, request.session
+    )
+    if applied is not None:
+        return applied
+
+    if task == "leave_balance":
+        return _with_meta(
+            await handle_leave_balance_async(token, request.session.get("employee_id"), request.session.get("business_id")),
+            meta,
+        )
+
+    if task == "attendance_report":
+        return await handle_attendance_report_async(decision, token, request, msg)
+
+    if task == "pending_leave":
+        return _with_meta(await handle_pending_leaves_async(token, role_name, request.session.get("business_id")), meta)
+
+    if task == "pending_gatepass":
+        return await handle_pending_gatepass_async(token, role_name)
+
+    if task == "pending_missed_punch":
+        return await handle_pending_missed_punch_async(token, role_name)
+
+    if task == "my_missed_punch":
+        return await handle_my_missed_punch_async(token, user_id, request.session.get("business_id"), msg)
+
+    if task == "my_leaves":
+        return await handle_my_leaves_async(token, user_id, request.session.get("business_id"), msg)
+
+    if task == "my_gatepass":
+        return await handle_my_gatepasses_async(token, user_id, request.session.get("business_id"), msg)
+
+    with stage_timing.stage("chat_model"):
+        fallback_reply = await loop.run_in_executor(INFERENCE_EXECUTOR, inference_telemetry.queued(model_response), msg, task)
+    return _with_meta(fallback_reply or handle_general_chat(msg, lang), meta)
 
 
 # ---------------- INTENT TEST API ----------------
@@ -2038,14 +2988,58 @@ def get_intent_api(request):
             text = data.get("message", "")
             if not text:
                 return JsonResponse({"error": "Message text is required"}, status=400)
-            
+
+            classifier = get_bert_classifier()
+            if classifier is None:
+                return JsonResponse({"error": "BERT model not available"}, status=503)
+
             # Run prediction
-            intent, confidence = predict_intent(text)
+            intent, confidence = predict_intent(text, *classifier)
             return JsonResponse({
                 "intent": intent,
                 "confidence": round(confidence, 3)
             })
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
-    
-    return JsonResponse({"error": "Invalid request method"}, status=405)
\ No newline at end of file
+
+    return JsonResponse({"error": "Method not allowed"}, status=405)
+
+
+@csrf_exempt
+def get_intent_batch_api(request):
+    """Bulk BERT classification, e.g. re-labelling a day of chat logs"""
+    if not check_authentication(request):
+        return JsonResponse({"error": "Unauthorized"}, status=401)
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    try:
+        data = json.loads(request.body.decode())
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Body must be a JSON object"}, status=400)
+
+    messages = data.get("messages")
+    if not isinstance(messages, list) or not messages:
+        return JsonResponse({"error": "messages must be a non-empty list"}, status=400)
+    if len(messages) > BERT_MAX_BATCH_MESSAGES:
+        return JsonResponse({"error": f"At most {BERT_MAX_BATCH_MESSAGES} messages per request"}, status=400)
+    if any(len(str(m or "")) > BERT_MAX_MESSAGE_CHARS for m in messages):
+        return JsonResponse({"error": f"Messages may be at most {BERT_MAX_MESSAGE_CHARS} characters"}, status=400)
+
+    batch_size = data.get("batch_size", BERT_BATCH_SIZE)
+    if isinstance(batch_size, bool) or not isinstance(batch_size, int) or not 1 <= batch_size <= BERT_MAX_BATCH_SIZE:
+        return JsonResponse({"error": f"batch_size must be an integer from 1 to {BERT_MAX_BATCH_SIZE}"}, status=400)
+
+    classifier = get_bert_classifier()
+    if classifier is None:
+        return JsonResponse({"error": "BERT model not available"}, status=503)
+
+    try:
+        results = predict_intents_batch([str(m or "") for m in messages], *classifier, batch_size=batch_size)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    return JsonResponse({"count": len(results), "results": results})